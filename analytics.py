@@ -0,0 +1,38 @@
+import pandas as pd
+
+# Spending trends for the Analytics page. Month-level views are built from the monthly_spending
+# rollups, one row per member per month however long the history is. Anything finer or over
+# an arbitrary date range resamples the raw expenses of that range instead.
+
+
+def monthly_totals(rollups):
+    """Dollars paid per month (rows, 'YYYY-MM') by each member (columns); empty months are zero."""
+    if rollups.empty:
+        return pd.DataFrame()
+    table = rollups.pivot_table(index="month", columns="name", values="total_cents", aggfunc="sum", fill_value=0)
+    months = pd.period_range(table.index[0], table.index[-1], freq="M").strftime("%Y-%m")
+    return table.reindex(months, fill_value=0) / 100
+
+
+def top_spenders(rollups, since=None):
+    """Members by amount paid since month `since` (inclusive), with expense counts and share of the total."""
+    if since is not None:
+        rollups = rollups[rollups["month"] >= since]
+    top = (rollups.groupby(["user_id", "name"], as_index=False)[["total_cents", "count"]].sum()
+           .sort_values("total_cents", ascending=False, ignore_index=True))
+    total = top["total_cents"].sum()
+    top["share"] = top["total_cents"] / total if total else 0.0
+    return top
+
+
+def resample_spending(expenses, freq="W", by_payer=False):
+    """Dollars spent per `freq` period (a pandas offset alias) over a date-indexed frame of expenses.
+
+    One "total" column, or one column per payer_id with `by_payer`.
+    """
+    frame = expenses.set_index(pd.to_datetime(expenses["date"], format="ISO8601"))
+    if by_payer:
+        table = frame.groupby("payer_id")["amount_cents"].resample(freq).sum().unstack(0, fill_value=0)
+    else:
+        table = frame["amount_cents"].resample(freq).sum().to_frame("total")
+    return table / 100
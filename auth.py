@@ -1,26 +1,51 @@
 import sqlite3
-import streamlit as st
-from database import DB_FILE
+import passwords
+from connection import connection
+from instrument import traced
+from migrations import init_db
+from passwords import Busy
+from writer import submit
 
+# No database import here: the login page should not pay for pandas before its first paint
+init_db()
+
+# Hashing runs on the passwords worker pool; both functions raise Busy when it is saturated.
+
+def _insert_user(conn, username, name, email, password_hash):
+    conn.execute("INSERT INTO users (username, name, email, password) VALUES (?, ?, ?, ?)",
+                 (username, name, email, password_hash))
+
+def _set_password(conn, user_id, old_hash, new_hash):
+    # Skipped if the password changed since it was read
+    conn.execute("UPDATE users SET password = ? WHERE id = ? AND password = ?", (new_hash, user_id, old_hash))
+
+def _rehash(user_id, old_hash, password):
+    submit(_set_password, user_id, old_hash, passwords.hash_password(password))
+
+@traced("auth")
 def register(username, name, email, password):
-    conn = sqlite3.connect(DB_FILE)
+    password_hash = passwords.submit(passwords.hash_password, password).result()
     try:
-        conn.execute("INSERT INTO users (username, name, email, password) VALUES (?, ?, ?, ?)",
-                     (username, name, email, password))
-        conn.commit()
+        submit(_insert_user, username, name, email, password_hash).result()
         return True
     except sqlite3.IntegrityError:
         return False  # Username or email already taken
-    finally:
-        conn.close()
 
+@traced("auth")
 def login(username, password):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT id, name FROM users WHERE username=? AND password=?", (username, password))
-    user = c.fetchone()
-    conn.close()
-    if user:
-        return (user[0], user[1])  # Return (id, name)
-    else:
-        return None
\ No newline at end of file
+    with connection() as conn:
+        user = conn.execute("SELECT id, name, password FROM users WHERE username = ?", (username,)).fetchone()
+    if user is None:
+        passwords.submit(passwords.dummy_verify, password).result()  # same cost as a wrong password
+        return None
+    user_id, name, stored = user
+    matches, needs_rehash = passwords.submit(passwords.verify_password, password, stored or "").result()
+    if not matches:
+        return None
+    if needs_rehash:
+        # Legacy plaintext or outdated cost: upgrade in the background, the login does not wait
+        try:
+            passwords.submit(_rehash, user_id, stored, password)
+        except Busy:
+            pass  # upgraded on a later login
+    return (user_id, name)  # Return (id, name)
@@ -0,0 +1,313 @@
+"""Online backups of the database: take, list, verify and restore compressed snapshots.
+
+    python backup.py take --dir backups --keep 14
+    python backup.py list --dir backups
+    python backup.py verify backups/users-20250630-120000.db.gz
+    python backup.py restore backups/users-20250630-120000.db.gz --db users.db
+"""
+import argparse
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from connection import connect, get_pool, shards
+
+# A snapshot is copied with SQLite's online backup API, a few hundred pages per step, sleeping
+# between steps so the copy only ever takes a slice of the disk and CPU. The source connection
+# holds one read transaction for the whole copy: under WAL that is a consistent snapshot that
+# writers never wait on, and the backup does not restart when they commit (it would, step
+# after step, under steady writes without it).
+#
+# The copy is switched out of WAL mode so it is a single self-contained file, its row count
+# per table is recorded in a JSON manifest next to it, and it is gzipped. Only the newest
+# `keep` snapshots of a database are kept.
+#
+# Scheduled backups are opt-in: with SPLITFREE_BACKUP_DIR set, init_db() starts a daemon
+# thread that takes one every SPLITFREE_BACKUP_INTERVAL seconds, counted from the newest
+# snapshot already in the directory, so restarting the app does not trigger one. When the
+# database is sharded each shard file gets its own snapshot, right after the main file's;
+# together they are not one point in time, but each group's rows are all in a single file.
+
+BACKUP_DIR = os.environ.get("SPLITFREE_BACKUP_DIR")  # None: no scheduled backups
+INTERVAL = float(os.environ.get("SPLITFREE_BACKUP_INTERVAL", 6 * 3600))
+KEEP = int(os.environ.get("SPLITFREE_BACKUP_KEEP", 14))
+STEP_PAGES = 256   # 1 MB with 4 KB pages
+STEP_SLEEP = 0.02  # seconds between steps
+
+SUFFIX = ".db.gz"
+
+
+def _stem(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def snapshots(directory, source=None):
+    """Snapshot files in `directory` (of `source` only, if given), oldest first."""
+    if not os.path.isdir(directory):
+        return []
+    prefix = _stem(source) + "-" if source else ""
+    names = sorted(name for name in os.listdir(directory) if name.endswith(SUFFIX) and name.startswith(prefix))
+    return [os.path.join(directory, name) for name in names]
+
+
+def row_counts(conn):
+    """Rows per table, virtual tables aside (their shadow tables are counted)."""
+    tables = [name for name, sql in conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name")
+        if not sql.upper().startswith("CREATE VIRTUAL")]
+    return {table: conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0] for table in tables}
+
+
+def copy(source, dest, pages=STEP_PAGES, sleep=STEP_SLEEP):
+    """Copy the live database `source` to the new file `dest` without blocking writers; returns the steps taken."""
+    steps = 0
+
+    def pause(status, remaining, total):
+        nonlocal steps
+        steps += 1
+        if remaining:
+            time.sleep(sleep)
+
+    src = connect(source)
+    dst = sqlite3.connect(dest)
+    try:
+        src.execute("BEGIN")
+        src.execute("SELECT 1 FROM sqlite_master LIMIT 1")  # starts the read transaction
+        src.backup(dst, pages=pages, progress=pause)
+        src.execute("COMMIT")
+        dst.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        dst.close()
+        src.close()
+    return steps
+
+
+def take(directory, source=None, keep=KEEP, pages=STEP_PAGES, sleep=STEP_SLEEP):
+    """Snapshot `source` (default: the pool's database) into `directory`; returns the snapshot's manifest."""
+    source = source or get_pool().path
+    os.makedirs(directory, exist_ok=True)
+    start = time.perf_counter()
+    now = time.localtime()
+    name = f"{_stem(source)}-{time.strftime('%Y%m%d-%H%M%S', now)}"
+    path = os.path.join(directory, name + SUFFIX)
+    raw = os.path.join(directory, name + ".partial")
+    try:
+        steps = copy(source, raw, pages, sleep)
+        conn = sqlite3.connect(raw)
+        try:
+            counts = row_counts(conn)
+        finally:
+            conn.close()
+        copied = time.perf_counter()
+        with open(raw, "rb") as f, gzip.open(path + ".partial", "wb", compresslevel=6) as out:
+            shutil.copyfileobj(f, out, 1 << 20)
+        manifest = {
+            "snapshot": os.path.basename(path),
+            "source": os.path.abspath(source),
+            "taken_at": time.strftime("%Y-%m-%dT%H:%M:%S", now),
+            "bytes": os.path.getsize(raw),
+            "compressed_bytes": os.path.getsize(path + ".partial"),
+            "steps": steps,
+            "copy_seconds": round(copied - start, 3),
+            "seconds": round(time.perf_counter() - start, 3),
+            "rows": counts,
+        }
+        with open(path + ".json", "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(path + ".partial", path)  # only complete snapshots carry the suffix
+    finally:
+        for leftover in (raw, path + ".partial"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    rotate(directory, source, keep)
+    return manifest
+
+
+def rotate(directory, source, keep=KEEP):
+    """Delete all but the newest `keep` snapshots of `source`; returns the deleted paths."""
+    old = snapshots(directory, source)[:-keep] if keep > 0 else []
+    for path in old:
+        os.remove(path)
+        if os.path.exists(path + ".json"):
+            os.remove(path + ".json")
+    return old
+
+
+def _unpacked(snapshot):
+    # Decompressed into a temporary file; the caller removes it
+    fd, path = tempfile.mkstemp(suffix=".db")
+    with os.fdopen(fd, "wb") as out, gzip.open(snapshot, "rb") as f:
+        shutil.copyfileobj(f, out, 1 << 20)
+    return path
+
+
+def _check(path, snapshot):
+    conn = sqlite3.connect(path)
+    try:
+        integrity = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+        counts = row_counts(conn)
+    except sqlite3.DatabaseError as e:  # too damaged to even check
+        integrity, counts = [str(e)], {}
+    finally:
+        conn.close()
+    manifest_path = snapshot + ".json"
+    expected = None
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            expected = json.load(f)["rows"]
+    mismatched = {table: (expected.get(table), counts.get(table))
+                  for table in sorted(set(expected) | set(counts))
+                  if expected.get(table) != counts.get(table)} if expected is not None else {}
+    return {
+        "snapshot": snapshot,
+        "ok": integrity == ["ok"] and expected is not None and not mismatched,
+        "integrity": integrity,
+        "rows": counts,
+        "manifest": expected is not None,
+        "mismatched": mismatched,  # table: (manifest, snapshot)
+    }
+
+
+def verify(snapshot):
+    """Decompress `snapshot`, run PRAGMA integrity_check and compare its row counts with the manifest."""
+    path = _unpacked(snapshot)
+    try:
+        return _check(path, snapshot)
+    finally:
+        os.remove(path)
+
+
+def restore(snapshot, dest=None, force=False):
+    """Verify `snapshot` and copy it over `dest` (default: the pool's database); returns the verify report.
+
+    The copy goes through the backup API, so the live file's WAL is dealt with correctly, but
+    running sessions keep their cached reads: stop the app first.
+    """
+    dest = dest or get_pool().path
+    path = _unpacked(snapshot)
+    try:
+        report = _check(path, snapshot)
+        if not report["ok"] and not force:
+            return report
+        src = sqlite3.connect(path)
+        dst = connect(dest)
+        try:
+            src.backup(dst)
+            dst.execute("PRAGMA journal_mode = WAL")
+        finally:
+            dst.close()
+            src.close()
+        return report
+    finally:
+        os.remove(path)
+
+
+class Scheduler(threading.Thread):
+    """Daemon thread taking a snapshot of the pool's database (and its shards) every `interval` seconds."""
+
+    def __init__(self, directory, interval=INTERVAL, keep=KEEP):
+        super().__init__(name="sqlite-backup", daemon=True)
+        self.directory = directory
+        self.interval = interval
+        self.keep = keep
+        self.last = None      # manifest of the last snapshot taken
+        self.last_error = None
+        self._done = threading.Event()
+
+    def _due_in(self):
+        existing = snapshots(self.directory, get_pool().path)
+        if not existing:
+            return 0.0
+        return max(0.0, os.path.getmtime(existing[-1]) + self.interval - time.time())
+
+    def run(self):
+        while not self._done.wait(self._due_in()):
+            try:
+                for source in [get_pool().path, *shards()]:
+                    self.last = take(self.directory, source, keep=self.keep)
+                self.last_error = None
+            except Exception as e:  # keep the schedule; the next attempt may succeed
+                self.last_error = e
+                self._done.wait(min(self.interval, 300))
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def schedule(directory=None, interval=INTERVAL, keep=KEEP):
+    """Start the process's backup thread (once); returns it, or None when no directory is configured."""
+    global _scheduler
+    directory = directory or BACKUP_DIR
+    if not directory:
+        return None
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler(directory, interval, keep)
+            _scheduler.start()
+    return _scheduler
+
+
+def _print_report(report):
+    status = "OK" if report["ok"] else "FAILED"
+    print(f"{status}: {report['snapshot']}")
+    if report["integrity"] != ["ok"]:
+        print("  integrity_check: " + "; ".join(report["integrity"][:10]))
+    if not report["manifest"]:
+        print("  no manifest to compare row counts with")
+    for table, (expected, found) in report["mismatched"].items():
+        print(f"  {table}: manifest {expected}, snapshot {found}")
+    print(f"  {sum(report['rows'].values()):,} rows in {len(report['rows'])} tables")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    take_cmd = commands.add_parser("take", help="snapshot the database now")
+    take_cmd.add_argument("--dir", default=BACKUP_DIR or "backups")
+    take_cmd.add_argument("--keep", type=int, default=KEEP)
+    take_cmd.add_argument("--pages", type=int, default=STEP_PAGES, help="pages copied per step")
+    take_cmd.add_argument("--sleep", type=float, default=STEP_SLEEP, help="seconds between steps")
+    list_cmd = commands.add_parser("list", help="list snapshots, oldest first")
+    list_cmd.add_argument("--dir", default=BACKUP_DIR or "backups")
+    verify_cmd = commands.add_parser("verify", help="integrity_check a snapshot and compare its row counts")
+    verify_cmd.add_argument("snapshot")
+    restore_cmd = commands.add_parser("restore", help="verify a snapshot and copy it over the database")
+    restore_cmd.add_argument("snapshot")
+    restore_cmd.add_argument("--force", action="store_true", help="restore even if verification fails")
+    for command in (take_cmd, list_cmd, restore_cmd):
+        command.add_argument("--db", help="database file (default: connection.DB_FILE)")
+    args = parser.parse_args()
+
+    source = getattr(args, "db", None) or get_pool().path
+    if args.command == "take":
+        manifest = take(args.dir, source, args.keep, args.pages, args.sleep)
+        print(f"{manifest['snapshot']}: {manifest['bytes'] / 2**20:,.1f} MB -> "
+              f"{manifest['compressed_bytes'] / 2**20:,.1f} MB in {manifest['seconds']:.1f}s "
+              f"({manifest['steps']} steps, copy {manifest['copy_seconds']:.1f}s)")
+    elif args.command == "list":
+        for path in snapshots(args.dir):
+            print(f"{os.path.basename(path)}  {os.path.getsize(path) / 2**20:,.1f} MB")
+    elif args.command == "verify":
+        report = verify(args.snapshot)
+        _print_report(report)
+        raise SystemExit(0 if report["ok"] else 1)
+    else:
+        report = restore(args.snapshot, source, args.force)
+        _print_report(report)
+        if not report["ok"] and not args.force:
+            raise SystemExit("not restored; pass --force to restore anyway")
+        print(f"restored over {source}")
+
+
+if __name__ == "__main__":
+    main()
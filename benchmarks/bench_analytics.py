@@ -0,0 +1,87 @@
+"""Monthly spending per member from the rollup table versus recomputing it from the full history.
+
+    python benchmarks/bench_analytics.py --sizes 1000 10000 100000 1000000
+
+Also reports what keeping the rollups costs on writes: bulk-import time with and without
+the monthly_spending triggers.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import connection
+from migrations import _spending_triggers
+
+
+def median_ms(fn, repeat=9):
+    samples = []
+    for _ in range(repeat):
+        database._cache.clear()
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def from_history(group_id):
+    # What a page would have to do without rollups: parse every date, then group
+    expenses = database.get_group_expenses(group_id)
+    month = pd.to_datetime(expenses["date"]).dt.strftime("%Y-%m")
+    return expenses.groupby([month, "payer_id"])["amount_cents"].agg(["sum", "count"])
+
+
+def expenses(size, members):
+    return pd.DataFrame({
+        "date": [f"{2015 + i % 10}-{i % 12 + 1:02d}-{i % 28 + 1:02d}" for i in range(size)],
+        "description": [f"Expense {i}" for i in range(size)],
+        "amount_cents": [100 + i % 5000 for i in range(size)],
+        "payer_id": [i % members + 1 for i in range(size)],
+    })
+
+
+def main():
+    global database
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--members", type=int, default=4)
+    args = parser.parse_args()
+
+    connection.configure(os.path.join(tempfile.mkdtemp(), "bench.db"))
+    import database
+    with connection.transaction() as conn:
+        conn.executemany("INSERT INTO users (username, name, email, password) VALUES (?, ?, ?, ?)",
+                         ((f"m{i}", f"Member {i}", f"m{i}@example.com", "pw") for i in range(args.members)))
+
+    print(f"{'expenses':>9} {'rollup ms':>10} {'history ms':>11} {'import s':>9} {'no rollup s':>12}")
+    for group, size in enumerate(args.sizes, start=1):
+        timings = []
+        for with_rollups in (False, True):
+            group_id = database.create_group(f"Group {group}{'' if with_rollups else ' (plain)'}", 1)
+            for user_id in range(2, args.members + 1):
+                database.join_group(group_id, user_id)
+            with connection.transaction() as conn:  # the triggers end up back in place after each size
+                for (name,) in conn.execute("SELECT name FROM sqlite_master "
+                                            "WHERE type = 'trigger' AND name LIKE '%_spending'").fetchall():
+                    conn.execute(f"DROP TRIGGER {name}")
+                if with_rollups:
+                    for trigger in _spending_triggers():
+                        conn.execute(trigger)
+            frame = expenses(size, args.members)
+            start = time.perf_counter()
+            database.add_expenses_bulk(group_id, [frame])
+            timings.append(time.perf_counter() - start)
+
+        rollup = median_ms(lambda: database.get_monthly_spending(group_id))
+        history = median_ms(lambda: from_history(group_id), repeat=3)
+        print(f"{size:>9} {rollup:>10.2f} {history:>11.2f} {timings[1]:>9.2f} {timings[0]:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Write latency while backup.py copies the database: no backup, one-shot copy, stepped copy.
+
+    python benchmarks/bench_backup.py --expenses 1000000 --writers 4
+
+Writer threads add expenses through database.py (the writer thread, as the app does) for
+--seconds while the backup runs in a loop. "one step" copies the whole file in a single
+backup step; "stepped" uses backup.py's defaults (STEP_PAGES per step, STEP_SLEEP between).
+Both hold a read snapshot, so neither restarts; the difference is how the I/O is spread.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import backup
+import connection
+
+
+def run(mode, directory, writers, seconds):
+    import database
+    latencies, backups = [], []
+    done = threading.Event()
+
+    def write(worker):
+        i = 0
+        while not done.is_set():
+            start = time.perf_counter()
+            database.add_expense(1 + worker % 2, f"Backup bench {i}", 100 + i, 1, "2025-01-01")
+            latencies.append((time.perf_counter() - start) * 1000)
+            i += 1
+
+    def copy():
+        while not done.is_set():
+            dest = os.path.join(directory, f"{mode}.db")
+            start = time.perf_counter()
+            if mode == "one step":
+                backup.copy(connection.get_pool().path, dest, pages=-1, sleep=0)
+            else:
+                backup.copy(connection.get_pool().path, dest)
+            backups.append(time.perf_counter() - start)
+            os.remove(dest)
+
+    threads = [threading.Thread(target=write, args=(w,)) for w in range(writers)]
+    if mode != "none":
+        threads.append(threading.Thread(target=copy))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    done.set()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return {
+        "writes/s": len(latencies) / seconds,
+        "p50 ms": statistics.median(latencies),
+        "p99 ms": latencies[int(len(latencies) * 0.99)],
+        "max ms": latencies[-1],
+        "backup s": statistics.median(backups) if backups else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--expenses", type=int, default=200_000)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "bench.db")
+    subprocess.run([sys.executable, os.path.join(ROOT, "benchmarks", "seed.py"), path, "--expenses",
+                    str(args.expenses), "--verify", "0"], check=True, stdout=subprocess.DEVNULL)
+    connection.configure(path)
+    print(f"{os.path.getsize(path) / 2**20:,.0f} MB database, {args.writers} writers, {args.seconds:g}s per mode")
+    print(f"{'mode':<10} {'writes/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'backup s':>9}")
+    for mode in ("none", "one step", "stepped"):
+        row = run(mode, directory, args.writers, args.seconds)
+        took = f"{row['backup s']:>9.2f}" if row["backup s"] is not None else f"{'-':>9}"
+        print(f"{mode:<10} {row['writes/s']:>9.0f} {row['p50 ms']:>8.2f} {row['p99 ms']:>8.2f} {row['max ms']:>8.1f} {took}")
+
+
+if __name__ == "__main__":
+    main()
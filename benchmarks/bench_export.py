@@ -0,0 +1,78 @@
+"""Peak memory and speed of the streaming export against building a DataFrame and calling to_csv.
+
+    python benchmarks/bench_export.py --expenses 10000 100000 1000000
+
+Each size is seeded into a scratch database (or pass --db for an existing one) and the
+largest group is exported once per format, each run in a fresh interpreter so its peak
+RSS is its own. "dataframe" is get_group_expenses(...).to_csv(), what a page would do
+without export.py. Peak RSS includes the interpreter and its imports (the "baseline" row)
+and the database pages SQLite has memory-mapped (PRAGMA mmap_size), which are shared page
+cache; "heap" is the peak of Python allocations, from a second run under tracemalloc.
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+METHODS = ["baseline", "csv", "jsonl", "parquet", "dataframe"]
+
+
+def child(path, method, heap):
+    sys.path.insert(0, ROOT)
+    import connection
+    connection.configure(path)
+    import database
+    import export
+    with connection.connection() as conn:
+        group_id = conn.execute("SELECT group_id FROM expenses GROUP BY group_id ORDER BY COUNT(*) DESC LIMIT 1").fetchone()[0]
+    if heap == "heap":
+        tracemalloc.start()
+    start = time.perf_counter()
+    with open(os.devnull, "wb") as out:
+        if method == "dataframe":
+            written = len(database.get_group_expenses(group_id).to_csv(index=False).encode())
+        elif method != "baseline":
+            written = export.write(out, "group", group_id, method)
+        else:
+            written = 0
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 2**20 if tracemalloc.is_tracing() else 0.0
+    print(f"{seconds}\t{written}\t{resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}\t{peak}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--expenses", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--db", help="use this seeded database instead of seeding")
+    parser.add_argument("--child", nargs=3, metavar=("DB", "METHOD", "HEAP"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(*args.child)
+
+    datasets = [(None, args.db)] if args.db else []
+    for expenses in [] if args.db else args.expenses:
+        path = os.path.join(tempfile.mkdtemp(), "bench.db")
+        # One group, so the export covers every expense
+        subprocess.run([sys.executable, os.path.join(ROOT, "benchmarks", "seed.py"), path, "--expenses",
+                        str(expenses), "--groups", "1", "--verify", "0"], check=True, stdout=subprocess.DEVNULL)
+        datasets.append((expenses, path))
+
+    print(f"{'expenses':>10} {'method':<10} {'seconds':>8} {'MB out':>8} {'MB/s':>7} {'peak RSS MB':>12} {'heap MB':>8}")
+    for expenses, path in datasets:
+        for method in METHODS:
+            runs = [subprocess.run([sys.executable, __file__, "--child", path, method, mode],
+                                   check=True, capture_output=True, text=True).stdout for mode in ("time", "heap")]
+            seconds, written, rss, _ = map(float, runs[0].split("\t"))
+            heap = float(runs[1].split("\t")[3])
+            mb = written / 2**20
+            rate = f"{mb / seconds:>7.0f}" if written else f"{'':>7}"
+            print(f"{expenses or '-':>10} {method:<10} {seconds:>8.2f} {mb:>8.1f} {rate} {rss:>12.0f} {heap:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Groups page cost as the total number of groups grows, for a user in a handful of them.
+
+    python benchmarks/bench_groups.py --sizes 1000 100000 1000000
+
+Compares the old unscoped invite-code query (every group, merged in pandas) with the
+codes returned by get_user_groups, and times a full render of the Groups page.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pandas as pd
+
+import connection
+
+
+def median_ms(fn, repeat=7):
+    samples = []
+    for _ in range(repeat):
+        database._cache.clear()
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    global database
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100_000, 1_000_000])
+    parser.add_argument("--user-groups", type=int, default=5, help="groups the measured user is in")
+    args = parser.parse_args()
+
+    connection.configure(os.path.join(tempfile.mkdtemp(), "bench.db"))
+    import database
+    from streamlit.testing.v1 import AppTest
+
+    with connection.transaction() as conn:
+        conn.executemany("INSERT INTO users (username, name, email, password) VALUES (?, ?, ?, ?)",
+                         ((f"u{i}", f"User {i}", f"u{i}@example.com", "pw") for i in range(1000)))
+    for _ in range(args.user_groups):
+        database.create_group("Mine", 1)
+
+    def old_query():
+        groups = database.get_user_groups(1)
+        with connection.connection() as conn:
+            codes = pd.read_sql("SELECT id, invite_code FROM groups", conn)
+        return groups.drop(columns="invite_code").merge(codes, on="id", how="left")
+
+    page = AppTest.from_file(os.path.join(ROOT, "pages/2_👥_Groups.py"), default_timeout=120)
+    page.session_state["user_id"] = 1
+    page.session_state["name"] = "User 0"
+
+    print(f"{'groups':>9} {'unscoped ms':>12} {'scoped ms':>10} {'page ms':>8}")
+    total = args.user_groups
+    for size in args.sizes:
+        with connection.transaction() as conn:
+            first = conn.execute("SELECT MAX(id) FROM groups").fetchone()[0] + 1
+            ids = range(first, first + size - total)
+            conn.executemany("INSERT INTO groups (id, name, creator_id, invite_code) VALUES (?, ?, ?, ?)",
+                             ((g, f"Group {g}", 2 + g % 999, f"G{g:07d}") for g in ids))
+            conn.executemany("INSERT INTO group_members (group_id, user_id) VALUES (?, ?)",
+                             ((g, 2 + g % 999) for g in ids))
+        total = size
+        unscoped = median_ms(old_query)
+        scoped = median_ms(lambda: database.get_user_groups(1))
+        render = median_ms(lambda: page.run(), repeat=5)
+        print(f"{size:>9,} {unscoped:>12.2f} {scoped:>10.2f} {render:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Cost of one page of expense history versus loading the whole history, as a group grows.
+
+    python benchmarks/bench_history.py --sizes 1000 10000 100000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import connection
+
+
+def median_ms(fn, repeat=15):
+    samples = []
+    for _ in range(repeat):
+        database._cache.clear()
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    global database
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--members", type=int, default=4)
+    args = parser.parse_args()
+
+    connection.configure(os.path.join(tempfile.mkdtemp(), "bench.db"))
+    import database
+    with connection.transaction() as conn:
+        conn.executemany("INSERT INTO users (username, name, email, password) VALUES (?, ?, ?, ?)",
+                         ((f"m{i}", f"Member {i}", f"m{i}@example.com", "pw") for i in range(args.members)))
+
+    print(f"{'expenses':>9} {'full ms':>9} {'page 1 ms':>10} {'last page ms':>13}")
+    for group, size in enumerate(args.sizes, start=1):
+        group_id = database.create_group(f"Group {group}", 1, f"HIST{group:04d}")
+        for user_id in range(2, args.members + 1):
+            database.join_group(group_id, user_id)
+        database.add_expenses_bulk(group_id, [pd.DataFrame({
+            "date": [f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}" for i in range(size)],
+            "description": [f"Expense {i}" for i in range(size)],
+            "amount_cents": [100 + i % 5000 for i in range(size)],
+            "payer_id": [i % args.members + 1 for i in range(size)],
+        })])
+
+        with connection.connection() as conn:
+            last = conn.execute("""SELECT date, id FROM expenses WHERE group_id = ?
+                                   ORDER BY date, id LIMIT 1 OFFSET ?""",
+                                (group_id, database.EXPENSE_PAGE_SIZE)).fetchone()
+        full = median_ms(lambda: database.get_group_expenses(group_id))
+        first = median_ms(lambda: database.get_expense_page(group_id, 1))
+        deep = median_ms(lambda: database.get_expense_page(group_id, 1, tuple(last)))
+        print(f"{size:>9} {full:>9.2f} {first:>10.2f} {deep:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Throughput of the CSV expense import (validation + batched single-transaction insert).
+
+    python benchmarks/bench_import.py --rows 100000
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import connection
+
+
+def write_csv(path, rows, payers, rng):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Date", "Description", "Amount", "Paid By"])
+        for i in range(rows):
+            writer.writerow([f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}", f"Expense {i}",
+                             f"{rng.uniform(1, 500):.2f}", rng.choice(payers)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--members", type=int, default=6)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    connection.configure(os.path.join(workdir, "bench.db"))
+    import database
+    import importer
+
+    names = [f"Member {i}" for i in range(args.members)]
+    with connection.transaction() as conn:
+        conn.executemany("INSERT INTO users (username, name, email, password) VALUES (?, ?, ?, ?)",
+                         ((f"m{i}", name, f"m{i}@example.com", "pw") for i, name in enumerate(names)))
+    group_id = database.create_group("Import", 1, "IMPORT01")
+    for user_id in range(2, args.members + 1):
+        database.join_group(group_id, user_id)
+
+    path = os.path.join(workdir, "expenses.csv")
+    write_csv(path, args.rows, names, random.Random(1))
+
+    start = time.perf_counter()
+    preview = importer.preview_import(path, group_id, default_payer_id=1)
+    dry = time.perf_counter() - start
+    print(f"dry run:  {preview.rows:,} rows, {preview.valid:,} valid in {dry:.2f}s ({preview.rows / dry:,.0f} rows/s)")
+
+    result = importer.import_csv(path, group_id, default_payer_id=1)
+    print(f"import:   {result.imported:,} rows in {result.seconds:.2f}s ({result.imported / result.seconds:,.0f} rows/s, "
+          f"{result.imported * args.members:,} splits)")
+    print("ledger consistent:", database.rebuild_balances(group_id, repair=False).empty)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Per-query latency of the database.py read helpers before and after the read-path indexes.
+
+    python benchmarks/bench_indexes.py --expenses 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import connection
+
+READ_PATH_INDEXES = ("idx_group_members_user", "idx_expenses_group", "idx_settlements_pair")
+
+
+def seed(conn, n_users, n_groups, n_expenses, group_size, rng):
+    conn.execute("BEGIN")
+    conn.executemany("INSERT INTO users (username, name, email, password) VALUES (?, ?, ?, ?)",
+                     ((f"user{i}", f"User {i}", f"user{i}@example.com", "pw") for i in range(n_users)))
+    conn.executemany("INSERT INTO groups (name, creator_id, invite_code) VALUES (?, ?, ?)",
+                     ((f"Group {g}", 1, f"CODE{g:08d}") for g in range(n_groups)))
+    members = {g: rng.sample(range(1, n_users + 1), group_size) for g in range(1, n_groups + 1)}
+    conn.executemany("INSERT INTO group_members (group_id, user_id) VALUES (?, ?)",
+                     ((g, u) for g, users in members.items() for u in users))
+
+    def expenses():
+        for _ in range(n_expenses):
+            g = rng.randint(1, n_groups)
+            yield g, "Dinner", rng.randint(100, 20000), rng.choice(members[g]), "2024-01-01"
+    conn.executemany("INSERT INTO expenses (group_id, description, amount_cents, payer_id, date) VALUES (?, ?, ?, ?, ?)",
+                     expenses())
+    conn.execute("""
+        INSERT INTO splits (expense_id, user_id, owed_cents)
+        SELECT e.id, gm.user_id, e.amount_cents / ?
+        FROM expenses e JOIN group_members gm ON gm.group_id = e.group_id
+    """, (group_size,))
+    conn.execute("COMMIT")
+    return members
+
+
+def time_calls(fn, args, repeat):
+    samples = []
+    for arg in args[:repeat]:
+        start = time.perf_counter()
+        fn(arg)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--expenses", type=int, default=1_000_000)
+    parser.add_argument("--groups", type=int, default=20_000)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--group-size", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=25)
+    parser.add_argument("--db", help="scratch database file (default: a temp file)")
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), "bench.db")
+    connection.configure(path)
+    import database
+
+    rng = random.Random(42)
+    start = time.perf_counter()
+    with connection.connection() as conn:
+        members = seed(conn, args.users, args.groups, args.expenses, args.group_size, rng)
+    print(f"seeded {args.expenses:,} expenses in {time.perf_counter() - start:.1f}s ({path})")
+
+    group_ids = rng.sample(sorted(members), min(args.repeat, len(members)))
+    user_ids = [members[g][0] for g in group_ids]
+    queries = {
+        "get_user_groups": (database.get_user_groups, user_ids),
+        "get_group_members": (database.get_group_members, group_ids),
+        "get_group_expenses": (database.get_group_expenses, group_ids),
+        "get_group_settlements": (database.get_group_settlements, group_ids),
+    }
+
+    with connection.connection() as conn:
+        indexes = [sql for (sql,) in conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'index' AND name IN (?, ?, ?)", READ_PATH_INDEXES)]
+        for index in READ_PATH_INDEXES:
+            conn.execute(f"DROP INDEX {index}")
+    database._cache.clear()
+    before = {name: time_calls(fn, ids, args.repeat) for name, (fn, ids) in queries.items()}
+
+    with connection.connection() as conn:
+        for sql in indexes:
+            conn.execute(sql)
+        conn.execute("ANALYZE")
+    database._cache.clear()
+    after = {name: time_calls(fn, ids, args.repeat) for name, (fn, ids) in queries.items()}
+
+    print(f"{'query':<24}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+    for name in queries:
+        print(f"{name:<24}{before[name]:>12.2f}{after[name]:>12.2f}{before[name] / after[name]:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
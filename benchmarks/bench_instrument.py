@@ -0,0 +1,79 @@
+"""Cost of the profiling instrumentation: the same reads and writes with it off and on.
+
+    python benchmarks/bench_instrument.py --expenses 2000 --calls 2000
+
+Instrumentation is fixed at import time, so each mode runs in its own interpreter. "on"
+records a rerun around every call, as a profiled page would.
+"""
+import argparse
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def child(path, calls):
+    sys.path.insert(0, ROOT)
+    import connection
+    connection.configure(path)
+    import database
+    import instrument
+    import utils
+
+    logging.getLogger("streamlit").setLevel(logging.ERROR)  # session state outside `streamlit run`
+
+    def timed(fn):
+        rounds = []
+        for _ in range(3):  # best of three medians, to ride out noise from other processes
+            samples = []
+            for i in range(calls // 3):
+                instrument.start_page("bench")
+                start = time.perf_counter()
+                fn(i)
+                samples.append((time.perf_counter() - start) * 1e6)
+                instrument.finish_page()
+            rounds.append(statistics.median(samples))
+        return min(rounds)
+
+    rows = {
+        "cached read": lambda i: database.get_group_balances(1),
+        "uncached read": lambda i: (database._cache.clear(), database.get_expense_page(1, 1)),
+        "compute": lambda i: utils.calculate_balances(1),
+        "write": lambda i: database.add_expense(1, f"Bench {i}", 100 + i, 1, "2024-01-01"),
+    }
+    for name, fn in rows.items():
+        print(f"{name}\t{timed(fn):.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--expenses", type=int, default=2000)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--child", metavar="DB", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.child, args.calls)
+
+    results = {}
+    for mode in ("off", "on"):
+        path = os.path.join(tempfile.mkdtemp(), "bench.db")
+        subprocess.run([sys.executable, os.path.join(ROOT, "benchmarks", "seed.py"), path, "--expenses",
+                        str(args.expenses), "--verify", "0"], check=True, stdout=subprocess.DEVNULL)
+        env = dict(os.environ, SPLITFREE_PROFILE="1" if mode == "on" else "0", SPLITFREE_PROFILE_LOG="")
+        out = subprocess.run([sys.executable, __file__, "--child", path, "--calls", str(args.calls)],
+                             env=env, check=True, capture_output=True, text=True).stdout
+        results[mode] = dict(line.split("\t") for line in out.splitlines())
+
+    print(f"{'call':<14} {'off µs':>9} {'on µs':>9} {'overhead':>9}")
+    for name, off in results["off"].items():
+        off, on = float(off), float(results["on"][name])
+        print(f"{name:<14} {off:>9.1f} {on:>9.1f} {on / off - 1:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Login throughput per password-hash cost setting, and how much a login burst stalls
+other work in the process.
+
+    python benchmarks/bench_passwords.py --clients 32 --logins 128
+
+For each setting in passwords.COST_SETTINGS, `clients` threads log in `logins` times in
+total through auth.login (hashes on the bounded worker pool). A ticker thread meanwhile
+wakes every 5 ms, standing in for other sessions' script threads; its worst lateness is
+how long the burst held everyone else up.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import connection
+
+
+class Ticker(threading.Thread):
+    def __init__(self, interval=0.005):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.worst = 0.0
+        self.running = True
+
+    def run(self):
+        while self.running:
+            due = time.perf_counter() + self.interval
+            time.sleep(self.interval)
+            self.worst = max(self.worst, time.perf_counter() - due)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--logins", type=int, default=128)
+    parser.add_argument("--users", type=int, default=16)
+    args = parser.parse_args()
+
+    connection.configure(os.path.join(tempfile.mkdtemp(), "bench.db"))
+    import auth
+    import passwords
+
+    print(f"{passwords.WORKERS} hash workers, queue limit {passwords.MAX_PENDING}, {args.clients} clients")
+    print(f"{'setting':>9} {'hash ms':>8} {'logins/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'busy':>5} {'stall ms':>9}")
+    for setting, params in passwords.COST_SETTINGS.items():
+        passwords.configure(params)
+        for i in range(args.users):
+            auth.register(f"{setting}{i}", f"User {i}", f"{setting}{i}@example.com", f"password{i}")
+
+        start = time.perf_counter()
+        passwords.hash_password("x")
+        single = (time.perf_counter() - start) * 1000
+
+        latencies, busy = [], 0
+        lock = threading.Lock()
+
+        def client(n):
+            nonlocal busy
+            i = n % args.users
+            start = time.perf_counter()
+            try:
+                assert auth.login(f"{setting}{i}", f"password{i}")
+            except passwords.Busy:
+                with lock:
+                    busy += 1
+                return
+            with lock:
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        ticker = Ticker()
+        ticker.start()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.clients) as pool:
+            list(pool.map(client, range(args.logins)))
+        seconds = time.perf_counter() - start
+        ticker.running = False
+        ticker.join()
+
+        latencies.sort()
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(f"{setting:>9} {single:>8.1f} {len(latencies) / seconds:>9.1f} {statistics.median(latencies):>8.1f} "
+              f"{p99:>8.1f} {busy:>5} {ticker.worst * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
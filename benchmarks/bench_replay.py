@@ -0,0 +1,75 @@
+"""Rebuilding a group's ledger: replay from the latest snapshot versus recomputing from all history.
+
+    python benchmarks/bench_replay.py --sizes 1000 10000 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+import connection
+
+
+def median_ms(fn, repeat=9):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--members", type=int, default=4)
+    parser.add_argument("--tail", type=int, default=200, help="writes after the last snapshot")
+    args = parser.parse_args()
+
+    connection.configure(os.path.join(tempfile.mkdtemp(), "bench.db"))
+    import database
+    import events
+    with connection.transaction() as conn:
+        conn.executemany("INSERT INTO users (username, name, email, password) VALUES (?, ?, ?, ?)",
+                         ((f"m{i}", f"Member {i}", f"m{i}@example.com", "pw") for i in range(args.members)))
+
+    rng = random.Random(5)
+    print(f"{'history':>9} {'tail':>6} {'recompute ms':>13} {'replay ms':>10} {'match':>6}")
+    for group, size in enumerate(args.sizes, start=1):
+        group_id = database.create_group(f"Group {group}", 1, f"REPLAY{group:02d}")
+        for user_id in range(2, args.members + 1):
+            database.join_group(group_id, user_id)
+        database.add_expenses_bulk(group_id, [pd.DataFrame({
+            "date": ["2024-01-01"] * size,
+            "description": [f"Expense {i}" for i in range(size)],
+            "amount_cents": [rng.randint(100, 20000) for _ in range(size)],
+            "payer_id": [rng.randint(1, args.members) for _ in range(size)],
+        })])
+        with connection.transaction() as conn:
+            events.take_snapshot(conn, group_id)
+        ids = [database.add_expense(group_id, "Tail", rng.randint(100, 20000), 1, "2024-02-01")
+               for _ in range(args.tail // 2)]
+        for expense_id in ids[:args.tail // 4]:
+            database.update_expense(group_id, expense_id, "Tail (edited)", rng.randint(100, 20000), 2, "2024-02-02")
+        database.record_settlements([(group_id, 2, 1, rng.randint(1, 5000)) for _ in range(args.tail // 4)], "2024-02-03")
+
+        with connection.connection() as conn:
+            tail = conn.execute("""SELECT COUNT(*) FROM events WHERE group_id = ?
+                                   AND id > (SELECT MAX(event_id) FROM balance_snapshots WHERE group_id = ?)""",
+                                (group_id, group_id)).fetchone()[0]
+        recompute = median_ms(lambda: database.rebuild_balances(group_id, repair=False))
+        replay = median_ms(lambda: events.replay(group_id))
+        ledger = database.get_group_balances(group_id).sort_values("id")
+        match = ledger["balance_cents"].tolist() == events.replay(group_id)["balance_cents"].tolist()
+        print(f"{size:>9} {tail:>6} {recompute:>13.2f} {replay:>10.2f} {str(match):>6}")
+
+
+if __name__ == "__main__":
+    main()
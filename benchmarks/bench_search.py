@@ -0,0 +1,94 @@
+"""Latency of database.search_expenses versus a plain LIKE '%...%' scan of the group.
+
+    python benchmarks/bench_search.py --sizes 10000 100000 1000000
+
+Each size gets its own group, so the LIKE scan only has to read one group's rows, as it
+would in the app. Common words favour the scan, which walks the history index newest first
+and stops after one page; rare and missing words make it read the whole group. The search
+should be close to the scan in the first case and far ahead in the second: it walks the
+history itself for words that are common in the group and uses the FTS index otherwise.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import connection
+
+WORDS = ["uber", "lyft", "groceries", "rent", "coffee", "dinner", "lunch", "pizza", "taxi",
+         "cinema", "electricity", "internet", "gas", "flights", "hotel", "museum", "bakery",
+         "pharmacy", "concert", "parking"]
+RARE = "zanzibar"   # in about one description in 5,000
+QUERIES = ["uber", "coff", "pizza dinner", RARE, "xylophone"]
+BATCH = 100_000
+
+
+def median_ms(fn, repeat=9):
+    samples = []
+    for _ in range(repeat):
+        database._cache.clear()
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def like_search(group_id, text):
+    clauses = " AND ".join("description LIKE ?" for _ in text.split())
+    with connection.connection() as conn:
+        return pd.read_sql(f"""
+            SELECT id, description, amount_cents, payer_id, date FROM expenses
+            WHERE group_id = ? AND {clauses}
+            ORDER BY date DESC, id DESC LIMIT ?
+        """, conn, params=(group_id, *(f"%{word}%" for word in text.split()), database.EXPENSE_PAGE_SIZE))
+
+
+def main():
+    global database
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--members", type=int, default=4)
+    args = parser.parse_args()
+
+    connection.configure(os.path.join(tempfile.mkdtemp(), "bench.db"))
+    import database
+    with connection.transaction() as conn:
+        conn.executemany("INSERT INTO users (username, name, email, password) VALUES (?, ?, ?, ?)",
+                         ((f"m{i}", f"Member {i}", f"m{i}@example.com", "pw") for i in range(args.members)))
+
+    rng = random.Random(11)
+    print(f"{'expenses':>9} {'query':>14} {'matches':>8} {'search ms':>9} {'like ms':>8}")
+    for group, size in enumerate(args.sizes, start=1):
+        group_id = database.create_group(f"Group {group}", 1, f"FTS{group:05d}")
+        for user_id in range(2, args.members + 1):
+            database.join_group(group_id, user_id)
+        for first in range(0, size, BATCH):
+            count = min(BATCH, size - first)
+            database.add_expenses_bulk(group_id, [pd.DataFrame({
+                "date": [f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}" for i in range(first, first + count)],
+                "description": [" ".join(rng.sample(WORDS, 2)) + (f" {RARE}" if rng.random() < 0.0002 else "")
+                                for _ in range(count)],
+                "amount_cents": [100 + i % 5000 for i in range(first, first + count)],
+                "payer_id": [i % args.members + 1 for i in range(first, first + count)],
+            })])
+
+        for text in QUERIES:
+            with connection.connection() as conn:
+                matches = conn.execute(
+                    "SELECT COUNT(*) FROM expenses_fts JOIN expenses e ON e.id = expenses_fts.rowid "
+                    "WHERE expenses_fts MATCH ? AND e.group_id = ?",
+                    (database._match_query(text), group_id)).fetchone()[0]
+            search = median_ms(lambda: database.search_expenses(group_id, 1, text))
+            like = median_ms(lambda: like_search(group_id, text))
+            print(f"{size:>9} {text:>14} {matches:>8} {search:>9.2f} {like:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
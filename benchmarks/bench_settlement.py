@@ -0,0 +1,62 @@
+"""Transfer count and solve time of each settlement strategy across group sizes.
+
+    python benchmarks/bench_settlement.py --sizes 4 8 12 16 20 50 200 1000
+
+Balances are built from small clusters of members that owe each other (as happens when
+sub-groups share costs), so there is structure for the smarter strategies to find.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import settlement
+
+
+def clustered_balances(n, rng):
+    balances = {}
+    member = 0
+    while member < n:
+        size = min(rng.randint(2, 4), n - member)
+        if size == 1:
+            balances[member] = 0
+            member += 1
+            continue
+        values = [rng.randint(-20_000, 20_000) for _ in range(size - 1)]
+        values.append(-sum(values))
+        for value in values:
+            balances[member] = value
+            member += 1
+    members = list(balances)
+    rng.shuffle(members)
+    return {m: balances[m] for m in members}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[4, 8, 12, 16, 20, 50, 200, 1000])
+    parser.add_argument("--trials", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    print(f"{'members':>8} {'strategy':>10} {'transfers':>10} {'ms':>10}")
+    for n in args.sizes:
+        cases = [clustered_balances(n, rng) for _ in range(args.trials)]
+        for name, solve in settlement.STRATEGIES.items():
+            if name == "exact" and n > settlement.EXACT_LIMIT:
+                continue
+            counts, times = [], []
+            for balances in cases:
+                start = time.perf_counter()
+                transfers = solve(balances)
+                times.append((time.perf_counter() - start) * 1000)
+                counts.append(len(transfers))
+            print(f"{n:>8} {name:>10} {statistics.mean(counts):>10.1f} {statistics.median(times):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Write throughput across groups and cross-group read latency, one file against N shards.
+
+    python benchmarks/bench_shards.py --expenses 200000 --shards 4 8 --writers 8
+
+One database is seeded, then copied and resharded (reshard.py) for each layout, and every
+layout runs in a fresh interpreter: --writers threads add expenses to random groups through
+database.py for --seconds (one writer thread per file, so shards commit in parallel), then
+the user with the most groups has get_user_group_balances (the Dashboard's cross-group read,
+a fan-out when sharded) and its cache version check timed, uncached.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def child(path, writers, seconds, reads):
+    sys.path.insert(0, ROOT)
+    import connection
+    connection.configure(path)
+    import database
+    with connection.connection() as conn:
+        members = {}
+        for group_id, user_id in conn.execute("SELECT group_id, user_id FROM group_members"):
+            members.setdefault(group_id, []).append(user_id)
+        user = conn.execute("SELECT user_id FROM group_members GROUP BY user_id "
+                            "ORDER BY COUNT(*) DESC LIMIT 1").fetchone()[0]
+    groups = list(members)
+    latencies = []
+    done = threading.Event()
+
+    def write(worker):
+        rng = random.Random(worker)
+        while not done.is_set():
+            group_id = rng.choice(groups)
+            start = time.perf_counter()
+            database.add_expense(group_id, "Shard bench", rng.randint(100, 20000), rng.choice(members[group_id]),
+                                 "2025-01-01")
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=write, args=(w,)) for w in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    done.set()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+
+    def timed(fn):
+        fn(user)  # warm the pools and the fan-out threads
+        runs = []
+        for _ in range(reads):
+            start = time.perf_counter()
+            fn(user)
+            runs.append((time.perf_counter() - start) * 1000)
+        return statistics.median(runs)
+
+    print(json.dumps({
+        "writes/s": len(latencies) / seconds,
+        "p50 ms": statistics.median(latencies),
+        "p99 ms": latencies[int(len(latencies) * 0.99)],
+        "balances ms": timed(database.get_user_group_balances.__wrapped__),
+        "version ms": timed(database._user_version),
+        "user groups": len(database.get_user_groups(user)),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--expenses", type=int, default=200_000)
+    parser.add_argument("--groups", type=int, help="passed to seed.py")
+    parser.add_argument("--shards", type=int, nargs="+", default=[2, 4, 8])
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--reads", type=int, default=50)
+    parser.add_argument("--child", metavar="DB", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.child, args.writers, args.seconds, args.reads)
+
+    directory = tempfile.mkdtemp()
+    seeded = os.path.join(directory, "seeded.db")
+    seed = [sys.executable, os.path.join(ROOT, "benchmarks", "seed.py"), seeded, "--expenses", str(args.expenses),
+            "--verify", "0"]
+    subprocess.run(seed + (["--groups", str(args.groups)] if args.groups else []), check=True, stdout=subprocess.DEVNULL)
+    print(f"{os.path.getsize(seeded) / 2**20:,.0f} MB database, {args.writers} writers, {args.seconds:g}s per layout")
+    print(f"{'layout':<10} {'writes/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'balances ms':>12} {'version ms':>11}")
+    for count in [0, *args.shards]:
+        layout = os.path.join(directory, str(count))
+        os.makedirs(layout)
+        path = os.path.join(layout, "bench.db")
+        shutil.copy(seeded, path)
+        if count:
+            subprocess.run([sys.executable, os.path.join(ROOT, "reshard.py"), "--shards", str(count), "--db", path,
+                            "--no-backup"], check=True, stdout=subprocess.DEVNULL)
+        out = subprocess.run([sys.executable, __file__, "--child", path, "--writers", str(args.writers),
+                              "--seconds", str(args.seconds), "--reads", str(args.reads)],
+                             check=True, capture_output=True, text=True).stdout
+        row = json.loads(out.strip().splitlines()[-1])
+        name = f"{count} shards" if count else "one file"
+        print(f"{name:<10} {row['writes/s']:>9.0f} {row['p50 ms']:>8.2f} {row['p99 ms']:>8.2f} "
+              f"{row['balances ms']:>12.2f} {row['version ms']:>11.2f}")
+        shutil.rmtree(layout)
+    print(f"(cross-group reads for a user in {row['user groups']} groups)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Cold-start time to first render of login.py and each page, one fresh interpreter per run.
+
+    python benchmarks/bench_startup.py                 # seeds a small scratch database
+    python benchmarks/bench_startup.py scratch.db --repeat 5 --json startup.json
+
+Each run starts `python -X importtime`, imports Streamlit's AppTest ("streamlit", paid by
+every page alike) and then renders the page once ("first render"), with a logged-in user
+for everything but login.py. "imports" is the part of the first render spent importing the
+page's modules, as reported by -X importtime; the slowest of them are listed, and the
+"pandas" and "numpy" columns say whether the page needed them at all. login.py is also
+measured against a database that does not exist yet ("new database"), as on the very first
+start, where the render includes creating and migrating the file.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = ["login.py", "pages/1_📊_Dashboard.py", "pages/2_👥_Groups.py", "pages/3_➕_Add_Expense.py",
+         "pages/4_⚖️_Balances.py", "pages/5_💰_Settle_Up.py", "pages/6_📈_Analytics.py"]
+MARKER = "-- first render --"
+
+
+def child(path, page, user):
+    start = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    at = AppTest.from_file(os.path.join(ROOT, page), default_timeout=120)
+    if page != "login.py":
+        at.session_state["user_id"] = user
+        at.session_state["name"] = f"User {user}"
+        at.session_state["username"] = f"user{user}"
+    ready = time.perf_counter()
+    print(MARKER, file=sys.stderr, flush=True)
+    import connection  # stdlib only, so it does not skew the page's own imports
+    connection.configure(path)
+    at.run()
+    done = time.perf_counter()
+    if at.exception:
+        raise SystemExit(f"{page} raised: {at.exception[0].value}")
+    print(json.dumps({"streamlit_ms": (ready - start) * 1000, "render_ms": (done - ready) * 1000,
+                      "pandas": "pandas" in sys.modules, "numpy": "numpy" in sys.modules}))
+
+
+def _imports(stderr):
+    # Top-level imports (-X importtime nests children two spaces deeper) after the marker
+    seen, imports = False, {}
+    for line in stderr.splitlines():
+        if line == MARKER:
+            seen = True
+        elif seen and line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit() and not name.startswith("  "):
+                imports[name.strip()] = int(cumulative) / 1000
+    return imports
+
+
+def measure(path, page, user, repeat, fresh=False):
+    runs = []
+    for _ in range(repeat):
+        if fresh:
+            path = os.path.join(tempfile.mkdtemp(), "new.db")  # created by the page itself
+        proc = subprocess.run([sys.executable, "-X", "importtime", __file__, path, "--child", page, "--user", str(user)],
+                              capture_output=True, text=True, encoding="utf-8")
+        if proc.returncode:
+            raise SystemExit(proc.stderr.strip().splitlines()[-1])
+        run = json.loads(proc.stdout.strip().splitlines()[-1])
+        run["imports"] = _imports(proc.stderr)
+        runs.append(run)
+    best = min(runs, key=lambda r: r["render_ms"])
+    return {
+        "streamlit_ms": statistics.median(r["streamlit_ms"] for r in runs),
+        "render_ms": statistics.median(r["render_ms"] for r in runs),
+        "imports_ms": statistics.median(sum(r["imports"].values()) for r in runs),
+        "pandas": best["pandas"],
+        "numpy": best["numpy"],
+        "slowest_imports": dict(sorted(best["imports"].items(), key=lambda kv: -kv[1])[:3]),
+    }
+
+
+def _user(path):
+    import sqlite3
+    with sqlite3.connect(path) as conn:
+        row = conn.execute("SELECT user_id FROM group_members GROUP BY user_id ORDER BY COUNT(*) DESC LIMIT 1").fetchone()
+    if row is None:
+        raise SystemExit("the database has no group members; seed it with benchmarks/seed.py first")
+    return row[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", nargs="?", help="database seeded by benchmarks/seed.py (default: a small scratch one)")
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters per page")
+    parser.add_argument("--json", metavar="FILE", help="write the results here")
+    parser.add_argument("--child", metavar="PAGE", help=argparse.SUPPRESS)
+    parser.add_argument("--user", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.path, args.child, args.user)
+
+    path = args.path
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(), "bench.db")
+        subprocess.run([sys.executable, os.path.join(ROOT, "benchmarks", "seed.py"), path, "--expenses", "5000",
+                        "--verify", "0"], check=True, stdout=subprocess.DEVNULL)
+    user = _user(path)
+
+    results = {}
+    print(f"{'page':<28} {'streamlit ms':>12} {'first render':>12} {'imports':>8} {'pandas':>6} {'numpy':>6}"
+          f"  slowest imports")
+    runs = [(page, page, False) for page in PAGES] + [("login.py (new database)", "login.py", True)]
+    for label, page, fresh in runs:
+        row = results[label] = measure(path, page, user, args.repeat, fresh)
+        slowest = ", ".join(f"{name} {ms:.0f}" for name, ms in row["slowest_imports"].items())
+        print(f"{label:<28} {row['streamlit_ms']:>12.0f} {row['render_ms']:>12.0f} {row['imports_ms']:>8.0f} "
+              f"{'yes' if row['pandas'] else 'no':>6} {'yes' if row['numpy'] else 'no':>6}  {slowest}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
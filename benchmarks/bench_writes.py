@@ -0,0 +1,97 @@
+"""Write throughput and latency with many concurrent sessions: one transaction per write
+on its own connection (the old path) versus the group-committing writer thread.
+
+    python benchmarks/bench_writes.py --sessions 50 --writes 40
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import connection
+
+
+def run_sessions(sessions, writes, write, rng_seed, groups):
+    latencies, errors = [], []
+    lock = threading.Lock()
+    start_line = threading.Barrier(sessions)
+
+    def session(n):
+        rng = random.Random(rng_seed + n)
+        group_id, members = groups[n % len(groups)]
+        start_line.wait()
+        for i in range(writes):
+            start = time.perf_counter()
+            try:
+                write(group_id, f"Session {n} #{i}", rng.randint(100, 20000), rng.choice(members), "2024-03-01")
+            except sqlite3.OperationalError as e:
+                with lock:
+                    errors.append(str(e))
+                continue
+            with lock:
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=session, args=(n,)) for n in range(sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--writes", type=int, default=40, help="expenses added per session")
+    parser.add_argument("--groups", type=int, default=10)
+    parser.add_argument("--members", type=int, default=5)
+    args = parser.parse_args()
+
+    # One connection per session for the direct path, like every session opening its own
+    connection.configure(os.path.join(tempfile.mkdtemp(), "bench.db"), max_size=args.sessions + 1)
+    import database
+    import writer
+    with connection.transaction() as conn:
+        conn.executemany("INSERT INTO users (username, name, email, password) VALUES (?, ?, ?, ?)",
+                         ((f"u{i}", f"User {i}", f"u{i}@example.com", "pw") for i in range(args.groups * args.members)))
+    groups = []
+    for g in range(args.groups):
+        members = list(range(g * args.members + 1, (g + 1) * args.members + 1))
+        group_id = database.create_group(f"Group {g}", members[0], f"LOAD{g:04d}")
+        for user_id in members[1:]:
+            database.join_group(group_id, user_id)
+        groups.append((group_id, members))
+
+    def direct(*args):
+        with connection.transaction() as conn:
+            return database.add_expense.__wrapped__(conn, *args)
+
+    print(f"{args.sessions} sessions x {args.writes} writes")
+    print(f"{'path':>8} {'writes/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'errors':>7}")
+    for name, write in (("direct", direct), ("queued", database.add_expense)):
+        before = writer.writer_stats()
+        seconds, latencies, errors = run_sessions(args.sessions, args.writes, write, 11, groups)
+        latencies.sort()
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else float("nan")
+        print(f"{name:>8} {len(latencies) / seconds:>9.0f} {statistics.median(latencies):>8.1f} "
+              f"{p99:>8.1f} {latencies[-1]:>8.1f} {len(errors):>7}")
+        if name == "queued":
+            after = writer.writer_stats()
+            batches = after["batches"] - before["batches"]
+            print(f"writer: {after['jobs'] - before['jobs']} jobs in {batches} commits, "
+                  f"largest batch {after['largest_batch']}")
+
+    for group_id, _ in groups:
+        assert database.rebuild_balances(group_id, repair=False).empty
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""SQL statements issued by one render of each page, cold and warm cache.
+
+    python benchmarks/count_statements.py
+
+Renders every page with Streamlit's AppTest against a scratch database and counts what
+reaches SQLite. Page views must not write, so the script exits non-zero if any render
+issues a write statement (run it in CI to catch regressions).
+"""
+import argparse
+import collections
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import connection
+
+WRITE_VERBS = {"INSERT", "UPDATE", "DELETE", "REPLACE", "CREATE", "DROP", "ALTER"}
+PAGES = ["login.py", "pages/1_📊_Dashboard.py", "pages/2_👥_Groups.py", "pages/3_➕_Add_Expense.py",
+         "pages/4_⚖️_Balances.py", "pages/5_💰_Settle_Up.py", "pages/6_📈_Analytics.py"]
+
+
+class StatementCounter:
+    def __init__(self):
+        self.statements = collections.Counter()
+        self.writes = []
+
+    def __call__(self, sql):
+        if sql.startswith("--"):  # statements run inside triggers
+            return
+        words = sql.split(None, 2)
+        verb = words[0].upper() if words else ""
+        self.statements[verb] += 1
+        if verb in WRITE_VERBS or (verb == "BEGIN" and len(words) > 1 and words[1].upper() != "DEFERRED"):
+            self.writes.append(" ".join(sql.split())[:100])
+
+    def reset(self):
+        self.statements.clear()
+        self.writes.clear()
+
+
+def seed(database, expenses):
+    from auth import register
+    for username, name in (("alice", "Alice"), ("bob", "Bob"), ("cara", "Cara")):
+        register(username, name, f"{username}@example.com", "pw")
+    group_id = database.create_group("Trip", 1, "TRIP0001")
+    database.join_group(group_id, 2)
+    database.join_group(group_id, 3)
+    for i in range(expenses):
+        database.add_expense(group_id, f"Expense {i}", 1000 + i, i % 3 + 1, "2024-05-01")
+    database.record_settlements([(group_id, 2, 1, 500)], "2024-05-02")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--expenses", type=int, default=30)
+    parser.add_argument("--verbose", action="store_true", help="print every write statement")
+    args = parser.parse_args()
+
+    counter = StatementCounter()
+    connection.add_tracer(counter)  # before any connection is opened, so all of them are traced
+    connection.configure(os.path.join(tempfile.mkdtemp(), "count.db"))
+    import database
+    seed(database, args.expenses)
+
+    from streamlit.testing.v1 import AppTest
+    os.chdir(ROOT)
+    failed = False
+    print(f"{'page':<28} {'cold':>6} {'warm':>6} {'writes':>7}")
+    for page in PAGES:
+        at = AppTest.from_file(os.path.join(ROOT, page), default_timeout=60)
+        if page != "login.py":
+            at.session_state["user_id"] = 1
+            at.session_state["name"] = "Alice"
+            at.session_state["username"] = "alice"
+        totals, writes = [], []
+        for _ in range(2):
+            counter.reset()
+            at.run()
+            if at.exception:
+                raise SystemExit(f"{page} raised: {at.exception[0].value}")
+            totals.append(sum(counter.statements.values()))
+            writes.extend(counter.writes)
+        print(f"{page:<28} {totals[0]:>6} {totals[1]:>6} {len(writes):>7}")
+        if writes:
+            failed = True
+            for sql in writes if args.verbose else writes[:3]:
+                print(f"    {sql}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
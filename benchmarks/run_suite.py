@@ -0,0 +1,198 @@
+"""Time every data-layer function and every page against a seeded database, as JSON.
+
+    python benchmarks/seed.py scratch.db --expenses 1000000
+    python benchmarks/run_suite.py scratch.db --json results.json
+    python benchmarks/run_suite.py scratch.db --compare results.json   # after a change
+
+Functions run against the group with the longest history, plus a typical (median) group
+for the "/median" rows. The user is the most active member of the large group. Each row
+has a cold time (query cache cleared first) and a warm time (cache as the previous call
+left it), as medians over --repeat runs. Pages are rendered with Streamlit's AppTest with
+the large group selected.
+
+Write rows add and then delete one expense, so the scratch database is modified; use
+--no-writes to leave it untouched. The JSON carries the commit, dataset row counts and
+versions, so results from different commits on the same dataset can be compared.
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import connection
+
+PAGES = ["login.py", "pages/1_📊_Dashboard.py", "pages/2_👥_Groups.py", "pages/3_➕_Add_Expense.py",
+         "pages/4_⚖️_Balances.py", "pages/5_💰_Settle_Up.py", "pages/6_📈_Analytics.py"]
+TABLES = ["users", "groups", "group_members", "expenses", "splits", "settlements"]  # not events: writes add some
+
+
+def _median_ms(fn, repeat, cold):
+    samples = []
+    for _ in range(repeat):
+        if cold:
+            database._cache.clear()
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def _subjects(conn):
+    sizes = conn.execute("SELECT group_id, COUNT(*) FROM expenses GROUP BY group_id ORDER BY 2 DESC").fetchall()
+    if not sizes:
+        raise SystemExit("the database has no expenses; seed it with benchmarks/seed.py first")
+    big, median = sizes[0][0], sizes[len(sizes) // 2][0]
+    user = conn.execute("""SELECT payer_id FROM expenses WHERE group_id = ?
+                           GROUP BY payer_id ORDER BY COUNT(*) DESC LIMIT 1""", (big,)).fetchone()[0]
+    other = conn.execute("SELECT user_id FROM group_members WHERE group_id = ? AND user_id != ? LIMIT 1",
+                         (big, user)).fetchone()
+    month = conn.execute("SELECT MAX(month) FROM monthly_spending WHERE group_id = ?", (big,)).fetchone()[0]
+    return big, median, user, other[0] if other else user, month
+
+
+def functions(big, median, user, other, month, writes):
+    import events
+    import settlement
+    import utils
+    after = tuple(database.get_expense_page(big, user).iloc[-1][["date", "id"]])
+
+    def settle_up():
+        ledger = database.get_group_balances(big)
+        return settlement.settle(dict(zip(ledger["id"], ledger["balance_cents"])))
+
+    def add_and_delete():
+        database.delete_expense(median, database.add_expense(median, "Benchmark expense", 1234, user_in_median, "2025-01-01"))
+
+    user_in_median = int(database.get_group_members(median)["id"].iloc[0])
+    rows = {
+        "get_user_groups": lambda: database.get_user_groups(user),
+        "get_group_members": lambda: database.get_group_members(big),
+        "get_group_expenses": lambda: database.get_group_expenses(big),
+        "get_group_expenses/median": lambda: database.get_group_expenses(median),
+        "get_expense_page": lambda: database.get_expense_page(big, user),
+        "get_expense_page/next": lambda: database.get_expense_page(big, user, after),
+        "search_expenses/text": lambda: database.search_expenses(big, user, "coffee"),
+        "search_expenses/filters": lambda: database.search_expenses(big, user, payer_id=other, min_cents=5000),
+        "get_group_paid_totals": lambda: database.get_group_paid_totals(big),
+        "get_group_owed_totals": lambda: database.get_group_owed_totals(big),
+        "get_group_balances": lambda: database.get_group_balances(big),
+        "get_user_group_balances": lambda: database.get_user_group_balances(user),
+        "get_group_settlements": lambda: database.get_group_settlements(big),
+        "get_settled_between": lambda: database.get_settled_between(big, user, other),
+        "get_monthly_spending": lambda: database.get_monthly_spending(big),
+        "get_expenses_between": lambda: database.get_expenses_between(big, f"{month}-01", f"{month}-31"),
+        "utils.calculate_balances": lambda: utils.calculate_balances(big),
+        "utils.calculate_balances_for_user": lambda: utils.calculate_balances_for_user(user),
+        "utils.cross_group_plan": lambda: utils.cross_group_plan(user),
+        "settlement.settle": settle_up,
+        "events.replay": lambda: events.replay(big),
+        "rebuild_balances/check": lambda: database.rebuild_balances(big, repair=False),
+    }
+    if writes:
+        rows["add_expense+delete_expense"] = add_and_delete
+    return rows
+
+
+def run_pages(big_name, user, repeat):
+    from streamlit.testing.v1 import AppTest
+    os.chdir(ROOT)
+    results = {}
+    for page in PAGES:
+        at = AppTest.from_file(os.path.join(ROOT, page), default_timeout=600)
+        if page != "login.py":
+            at.session_state["user_id"] = user
+            at.session_state["name"] = f"User {user}"
+            at.session_state["username"] = f"user{user}"
+        at.run()
+        for box in at.selectbox:
+            if box.label == "Select Group" and big_name in box.options:
+                box.set_value(big_name)
+        row = {}
+        for label, cold in (("cold_ms", True), ("warm_ms", False)):
+            row[label] = _median_ms(at.run, repeat, cold)
+            if at.exception:
+                raise SystemExit(f"{page} raised: {at.exception[0].value}")
+        results[f"page:{page}"] = row
+    return results
+
+
+def meta(path):
+    with sqlite3.connect(path) as conn:
+        counts = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in TABLES}
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "database": os.path.abspath(path),
+        "rows": counts,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "machine": platform.machine(),
+    }
+
+
+def compare(results, baseline):
+    print(f"\n{'vs ' + (baseline['meta'].get('commit') or 'baseline'):<42} {'cold':>8} {'warm':>8}")
+    if baseline["meta"].get("rows") != results["meta"]["rows"]:
+        print("  (datasets differ, ratios are not comparable)")
+    for name, row in results["results"].items():
+        old = baseline["results"].get(name)
+        if old:
+            ratios = [row[k] / old[k] if old[k] else float("nan") for k in ("cold_ms", "warm_ms")]
+            print(f"{name:<42} {ratios[0]:>7.2f}x {ratios[1]:>7.2f}x")
+
+
+def main():
+    global database
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="database seeded by benchmarks/seed.py")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--page-repeat", type=int, default=3)
+    parser.add_argument("--no-pages", action="store_true")
+    parser.add_argument("--no-writes", action="store_true")
+    parser.add_argument("--json", metavar="FILE", help="write the results here")
+    parser.add_argument("--compare", metavar="FILE", help="print ratios against an earlier --json file")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        raise SystemExit(f"{args.path} does not exist")
+    connection.configure(args.path)
+    import database
+    with connection.connection() as conn:
+        big, median, user, other, month = _subjects(conn)
+        big_name = conn.execute("SELECT name FROM groups WHERE id = ?", (big,)).fetchone()[0]
+
+    results = {"meta": meta(args.path), "results": {}}
+    results["meta"]["subjects"] = {"group": big, "median_group": median, "user": user}
+    print(f"{'name':<42} {'cold ms':>10} {'warm ms':>10}")
+    for name, fn in functions(big, median, user, other, month, not args.no_writes).items():
+        row = {"cold_ms": _median_ms(fn, args.repeat, True), "warm_ms": _median_ms(fn, args.repeat, False)}
+        results["results"][name] = row
+        print(f"{name:<42} {row['cold_ms']:>10.2f} {row['warm_ms']:>10.2f}")
+    if not args.no_pages:
+        for name, row in run_pages(big_name, user, args.page_repeat).items():
+            results["results"][name] = row
+            print(f"{name:<42} {row['cold_ms']:>10.2f} {row['warm_ms']:>10.2f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
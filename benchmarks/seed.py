@@ -0,0 +1,201 @@
+"""Generate a realistic synthetic dataset into a scratch database file.
+
+    python benchmarks/seed.py scratch.db --expenses 1000000
+    python benchmarks/seed.py scratch.db --expenses 10000000 --users 200000 --groups 50000 --force
+
+Group sizes follow a Zipf distribution (most groups are a handful of people, a few are
+large) and expenses are spread over groups with a Pareto tail, so some groups have long
+histories. Every expense is split equally among all members of its group, the way the app
+does, and a small fraction of activity is settlements.
+
+Rows are written with the triggers and indexes dropped, and the ledger, monthly rollups,
+search index and snapshots are then recomputed in bulk. Going through database.py would
+fire several triggers per row and take hours at 10M expenses. --verify checks the
+recomputed ledger of a sample of groups against database.rebuild_balances.
+"""
+import argparse
+import os
+import secrets
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import connection
+from migrations import migrate
+from passwords import hash_password
+from splitting import split_equally_many
+
+PASSWORD = "password"  # every seeded user's password
+CHUNK = 100_000
+WORDS = np.array(["Groceries", "Dinner", "Lunch", "Coffee", "Uber", "Lyft", "Taxi", "Rent", "Electricity",
+                  "Internet", "Gas", "Flights", "Hotel", "Airbnb", "Museum", "Cinema", "Concert", "Pizza",
+                  "Bakery", "Pharmacy", "Parking", "Train tickets", "Bar", "Brunch", "Cleaning supplies"])
+PLACES = np.array(["", "", "", " downtown", " at the airport", " for the trip", " (split)", " - weekend",
+                   " Café", " & drinks"])
+
+
+def _dates(rng, n, end, days):
+    return (np.datetime64(end) - rng.integers(0, days, n)).astype(str).tolist()
+
+
+def _cents(rng, n, median_cents):
+    return np.maximum(50, rng.lognormal(np.log(median_cents), 1.0, n).round()).astype(np.int64)
+
+
+def seed(conn, rng, users, groups, expenses, max_group_size, settle_rate, end, days):
+    counts = {}
+    password = hash_password(PASSWORD)
+    conn.executemany("INSERT INTO users (id, username, name, email, password) VALUES (?, ?, ?, ?, ?)",
+                     ((i, f"user{i}", f"User {i}", f"user{i}@example.com", password) for i in range(1, users + 1)))
+    counts["users"] = users
+
+    sizes = np.minimum(1 + rng.zipf(1.8, groups), min(max_group_size, users))
+    sizes = np.maximum(sizes, min(2, users))
+    weights = rng.pareto(1.2, groups) + 1
+    per_group = rng.multinomial(expenses, weights / weights.sum())
+    codes = set()
+    while len(codes) < groups:
+        codes.add("".join(secrets.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789") for _ in range(8)))
+
+    expense_id = settlement_id = 1
+    counts.update(groups=groups, group_members=0, expenses=0, splits=0, settlements=0)
+    for group_id, (size, count, code) in enumerate(zip(sizes.tolist(), per_group.tolist(), codes), start=1):
+        members = np.sort(rng.choice(users, size, replace=False) + 1)
+        creator = int(rng.choice(members))
+        conn.execute("INSERT INTO groups (id, name, creator_id, invite_code) VALUES (?, ?, ?, ?)",
+                     (group_id, f"Group {group_id}", creator, code))
+        conn.executemany("INSERT INTO group_members (group_id, user_id) VALUES (?, ?)",
+                         ((group_id, int(m)) for m in members))
+        counts["group_members"] += size
+
+        for first in range(0, count, CHUNK):
+            n = min(CHUNK, count - first)
+            ids = np.arange(expense_id, expense_id + n, dtype=np.int64)
+            amounts = _cents(rng, n, 2000)
+            payers = rng.choice(members, n)
+            descriptions = np.char.add(rng.choice(WORDS, n), rng.choice(PLACES, n))
+            conn.executemany("INSERT INTO expenses (id, group_id, description, amount_cents, payer_id, date) "
+                             "VALUES (?, ?, ?, ?, ?, ?)",
+                             zip(ids.tolist(), [group_id] * n, descriptions.tolist(), amounts.tolist(),
+                                 payers.tolist(), _dates(rng, n, end, days)))
+            # Same rotation of leftover pennies as database._insert_splits
+            shares = split_equally_many(amounts, size, offsets=ids)
+            conn.executemany("INSERT INTO splits (expense_id, user_id, owed_cents) VALUES (?, ?, ?)",
+                             zip(np.repeat(ids, size).tolist(), np.tile(members, n).tolist(), shares.ravel().tolist()))
+            expense_id += n
+            counts["expenses"] += n
+            counts["splits"] += n * size
+
+        payments = int(rng.binomial(count, settle_rate)) if size > 1 else 0
+        if payments:
+            pairs = np.array([rng.choice(members, 2, replace=False) for _ in range(payments)])
+            conn.executemany("INSERT INTO settlements (id, group_id, payer_id, receiver_id, amount_cents, date) "
+                             "VALUES (?, ?, ?, ?, ?, ?)",
+                             zip(range(settlement_id, settlement_id + payments), [group_id] * payments,
+                                 pairs[:, 0].tolist(), pairs[:, 1].tolist(), _cents(rng, payments, 5000).tolist(),
+                                 _dates(rng, payments, end, days)))
+            settlement_id += payments
+            counts["settlements"] += payments
+    return counts
+
+
+def recompute_derived(conn):
+    """Fill the tables the triggers would have maintained, from the raw rows."""
+    conn.execute("DELETE FROM member_balances")
+    conn.execute("""
+        INSERT INTO member_balances (group_id, user_id, paid_cents, share_cents)
+        SELECT group_id, user_id, SUM(paid), SUM(share) FROM (
+            SELECT group_id, user_id, 0 AS paid, 0 AS share FROM group_members
+            UNION ALL
+            SELECT group_id, payer_id, amount_cents, 0 FROM expenses
+            UNION ALL
+            SELECT e.group_id, s.user_id, 0, s.owed_cents FROM splits s JOIN expenses e ON e.id = s.expense_id
+            UNION ALL
+            SELECT group_id, payer_id, amount_cents, 0 FROM settlements
+            UNION ALL
+            SELECT group_id, receiver_id, 0, amount_cents FROM settlements
+        )
+        GROUP BY group_id, user_id
+    """)
+    conn.execute("DELETE FROM monthly_spending")
+    conn.execute("""
+        INSERT INTO monthly_spending (group_id, user_id, month, total_cents, count)
+        SELECT group_id, payer_id, substr(date, 1, 7), SUM(amount_cents), COUNT(*)
+        FROM expenses
+        GROUP BY group_id, payer_id, substr(date, 1, 7)
+    """)
+    conn.execute("INSERT INTO expenses_fts (expenses_fts) VALUES ('rebuild')")
+    # No events were logged, so every group's history starts from a snapshot at event 0
+    conn.execute("DELETE FROM balance_snapshots")
+    conn.execute("""
+        INSERT INTO balance_snapshots (group_id, event_id, user_id, paid_cents, share_cents, is_member)
+        SELECT mb.group_id, 0, mb.user_id, mb.paid_cents, mb.share_cents, gm.user_id IS NOT NULL
+        FROM member_balances mb
+        LEFT JOIN group_members gm ON gm.group_id = mb.group_id AND gm.user_id = mb.user_id
+    """)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="database file to create")
+    parser.add_argument("--expenses", type=int, default=100_000)
+    parser.add_argument("--users", type=int, help="default: expenses / 50, at least 10")
+    parser.add_argument("--groups", type=int, help="default: expenses / 200, at least 2")
+    parser.add_argument("--max-group-size", type=int, default=50)
+    parser.add_argument("--settle-rate", type=float, default=0.02, help="settlements per expense")
+    parser.add_argument("--end", default="2025-06-30", help="latest expense date")
+    parser.add_argument("--days", type=int, default=3 * 365, help="how far back expense dates go")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verify", type=int, default=5, metavar="N", help="groups to check against the ledger")
+    parser.add_argument("--force", action="store_true", help="overwrite an existing file")
+    args = parser.parse_args()
+    users = args.users or max(10, args.expenses // 50)
+    groups = args.groups or max(2, args.expenses // 200)
+
+    if os.path.exists(args.path):
+        if not args.force:
+            raise SystemExit(f"{args.path} exists; pass --force to overwrite it")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.path + suffix):
+                os.remove(args.path + suffix)
+
+    start = time.perf_counter()
+    conn = connection.connect(args.path)
+    migrate(conn)
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("BEGIN IMMEDIATE")
+    schema = conn.execute("SELECT type, name, sql FROM sqlite_master "
+                          "WHERE type IN ('trigger', 'index') AND sql IS NOT NULL").fetchall()
+    for kind, name, _ in schema:
+        conn.execute(f"DROP {kind.upper()} {name}")
+    counts = seed(conn, np.random.default_rng(args.seed), users, groups, args.expenses,
+                  args.max_group_size, args.settle_rate, args.end, args.days)
+    loaded = time.perf_counter()
+    for _, _, sql in schema:
+        conn.execute(sql)
+    recompute_derived(conn)
+    conn.execute("COMMIT")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+    done = time.perf_counter()
+
+    print(", ".join(f"{count:,} {table}" for table, count in counts.items()))
+    print(f"rows {loaded - start:.1f}s, indexes and derived tables {done - loaded:.1f}s, "
+          f"{os.path.getsize(args.path) / 2**20:,.0f} MB")
+
+    if args.verify:
+        connection.configure(args.path)
+        import database
+        rng = np.random.default_rng(args.seed + 1)
+        for group_id in rng.choice(groups, min(args.verify, groups), replace=False) + 1:
+            diff = database.rebuild_balances(int(group_id), repair=False)
+            if not diff.empty:
+                raise SystemExit(f"group {group_id}: ledger does not match the raw rows\n{diff}")
+        print(f"ledger verified on {min(args.verify, groups)} groups")
+
+
+if __name__ == "__main__":
+    main()
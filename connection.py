@@ -0,0 +1,234 @@
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+DB_FILE = "users.db"
+
+# Applied to every new connection. WAL lets readers run alongside the single writer,
+# busy_timeout makes writers wait for the lock instead of failing straight away.
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA mmap_size = 268435456",   # 256 MB
+    "PRAGMA cache_size = -16000",     # ~16 MB per connection
+    "PRAGMA temp_store = MEMORY",
+)
+
+
+def connect(path, timeout=30.0):
+    conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False, factory=_connection_class,
+                           isolation_level=None)  # autocommit; transactions are explicit
+    if _tracers:
+        conn.set_trace_callback(_trace)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+# Statement tracers (e.g. benchmarks/count_statements.py). Only connections opened while
+# one is registered are traced, so there is no per-statement cost otherwise.
+_tracers = []
+
+
+def add_tracer(callback):
+    """Call `callback(sql)` for every statement run on connections opened from now on."""
+    _tracers.append(callback)
+
+
+def remove_tracer(callback):
+    _tracers.remove(callback)
+
+
+def _trace(sql):
+    for callback in list(_tracers):
+        callback(sql)
+
+
+# Class of new connections; instrument.py swaps in a subclass that times every statement.
+_connection_class = sqlite3.Connection
+
+
+def set_connection_class(cls):
+    """Open connections from now on as `cls`, a sqlite3.Connection subclass."""
+    global _connection_class
+    _connection_class = cls
+
+
+class ConnectionPool:
+    """Thread-safe pool of SQLite connections to one database file."""
+
+    def __init__(self, path, max_size=8, timeout=30.0):
+        self.path = path
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle = []
+        self._created = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._stats = {"checkouts": 0, "waits": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+
+    def acquire(self):
+        start = time.perf_counter()
+        waited = False
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("connection pool is closed")
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._created < self.max_size:
+                    self._created += 1
+                    conn = None
+                    break
+                waited = True
+                remaining = self.timeout - (time.perf_counter() - start)
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    if not self._idle:
+                        raise TimeoutError(f"no connection available after {self.timeout}s")
+
+            elapsed = time.perf_counter() - start
+            self._stats["checkouts"] += 1
+            if waited:
+                self._stats["waits"] += 1
+                self._stats["wait_seconds"] += elapsed
+                self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], elapsed)
+
+        if conn is None:
+            try:
+                conn = connect(self.path, self.timeout)
+            except Exception:
+                with self._cond:
+                    self._created -= 1
+                    self._cond.notify()
+                raise
+        return conn
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._cond:
+            if self._closed:
+                conn.close()
+                self._created -= 1
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            for conn in self._idle:
+                conn.close()
+            self._created -= len(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "path": self.path,
+                "max_size": self.max_size,
+                "open": self._created,
+                "idle": len(self._idle),
+                "in_use": self._created - len(self._idle),
+                **self._stats,
+            }
+
+
+_pool = None
+_pool_options = {}
+_shard_pools = {}  # path: pool, with the main pool's options
+_pool_lock = threading.Lock()
+
+
+def configure(path=DB_FILE, **pool_options):
+    """Point the process-wide pool at `path`, closing any previous pools and forgetting the shards."""
+    global _pool, _pool_options, _shards
+    with _pool_lock:
+        for pool in [_pool, *_shard_pools.values()]:
+            if pool is not None:
+                pool.close()
+        _shard_pools.clear()
+        _shards = []
+        _pool = ConnectionPool(path, **pool_options)
+        _pool_options = pool_options
+    return _pool
+
+
+def get_pool(path=None):
+    """The pool for `path`, by default the main database file."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_FILE)
+    if path is None or path == _pool.path:
+        return _pool
+    pool = _shard_pools.get(path)
+    if pool is None:
+        with _pool_lock:
+            pool = _shard_pools.get(path)
+            if pool is None:
+                pool = _shard_pools[path] = ConnectionPool(path, **_pool_options)
+    return pool
+
+
+def pool_stats():
+    return get_pool().stats()
+
+
+# --- Shards ---
+# In sharded mode (see reshard.py) a group's expenses, settlements and ledger live in one of
+# several shard files, picked by hashing the group id; users and the group directory stay in
+# the main file. The shard list is kept in the main file's `shards` table and loaded by
+# migrations.init_db(). With no shards every group maps to the main file.
+_shards = []
+
+
+def set_shards(paths):
+    global _shards
+    _shards = list(paths)
+
+
+def shards():
+    return list(_shards)
+
+
+def shard_index(group_id, count):
+    """Shard of `group_id` among `count`: a stable hash, the same in every process."""
+    return zlib.crc32(str(int(group_id)).encode()) % count
+
+
+def group_path(group_id):
+    """The file holding a group's rows: its shard, or the main file when not sharded."""
+    paths = _shards
+    return paths[shard_index(group_id, len(paths))] if paths else get_pool().path
+
+
+@contextmanager
+def connection(path=None):
+    """Borrow a pooled connection for reads (autocommit), to `path` or the main file."""
+    pool = get_pool(path)
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+@contextmanager
+def transaction(path=None):
+    """Borrow a pooled connection inside BEGIN IMMEDIATE ... COMMIT, rolling back on error."""
+    with connection(path) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
@@ -1,92 +1,580 @@
+import functools
+import secrets
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, repeat
+import numpy as np
 import pandas as pd
+from cache import QueryCache
+from connection import connection, get_pool, group_path, shards
+from events import maybe_snapshot, take_snapshot
+from instrument import bind, traced
+from migrations import init_db
+from settlement import Transfer, settle
+from splitting import split_equally_many
+from writer import submit_to
 
-DB_FILE = "users.db"
-
-def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS users
-             (id INTEGER PRIMARY KEY AUTOINCREMENT,
-              username TEXT UNIQUE,
-              name TEXT,
-              email TEXT UNIQUE,   -- Added email, unique for invites
-              password TEXT)''')
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS groups
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  name TEXT,
-                  creator_id INTEGER,
-                  invite_code TEXT UNIQUE)''')
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS group_members
-                 (group_id INTEGER,
-                  user_id INTEGER,
-                  PRIMARY KEY (group_id, user_id))''')
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS expenses
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  group_id INTEGER,
-                  description TEXT,
-                  amount REAL,
-                  payer_id INTEGER,
-                  date TEXT)''')
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS splits
-                 (expense_id INTEGER,
-                  user_id INTEGER,
-                  owed REAL,
-                  PRIMARY KEY (expense_id, user_id))''')
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS settlements
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  group_id INTEGER,
-                  payer_id INTEGER,
-                  receiver_id INTEGER,
-                  amount REAL,
-                  date TEXT)''')
-    
-    conn.commit()
-    conn.close()
-
-init_db()  # Run every time
+init_db()  # Migrations run once per process; later calls are a no-op
 
+# --- Routing ---
+# In single-file mode every query below runs on the main file. In sharded mode (reshard.py)
+# group-scoped reads and writes go to group_path(group_id), while users, the group directory
+# and memberships stay in the main file. Each shard keeps its own copy of the groups, members
+# and users its rows refer to, so the schema's triggers, foreign keys and joins work there
+# unchanged. Reads spanning a user's groups fan out to their shards on a thread pool.
+
+SHARD_READERS = 8
+_readers = ThreadPoolExecutor(SHARD_READERS, thread_name_prefix="shard-read")  # threads start on first use
+
+def _shards_of(user_id):
+    # {shard path: [group ids]} for the user's groups
+    with connection() as conn:
+        group_ids = [row[0] for row in conn.execute(
+            "SELECT group_id FROM group_members WHERE user_id = ? ORDER BY group_id", (user_id,))]
+    by_path = {}
+    for group_id in group_ids:
+        by_path.setdefault(group_path(group_id), []).append(group_id)
+    return by_path
+
+def _fan_out(fn, by_path):
+    """fn(conn, group_ids) on every shard of `by_path` in parallel; returns the results in order."""
+    def run(path, group_ids):
+        with connection(path) as conn:
+            return fn(conn, group_ids)
+    return list(_readers.map(bind(run), by_path, by_path.values()))
+
+# --- Read cache ---
+# Results are cached under the data version they were read at: groups.version (bumped by
+# triggers on every group write) for group reads, and the (group id, version) pairs of a
+# user's memberships for user reads. A write therefore shows up on the very next read.
+
+_cache = QueryCache()
+
+def cache_stats():
+    return _cache.stats()
+
+def _group_version(group_id):
+    with connection(group_path(group_id)) as conn:
+        row = conn.execute("SELECT version FROM groups WHERE id = ?", (group_id,)).fetchone()
+    return row[0] if row else None
+
+def _user_version(user_id):
+    if not shards():
+        with connection() as conn:
+            return tuple(conn.execute("""
+                SELECT g.id, g.version
+                FROM group_members gm JOIN groups g ON g.id = gm.group_id
+                WHERE gm.user_id = ?
+                ORDER BY g.id
+            """, (user_id,)))
+    # The versions are bumped in the shards; memberships come from the main file
+    versions = _fan_out(lambda conn, group_ids: conn.execute(
+        f"SELECT id, version FROM groups WHERE id IN ({', '.join('?' * len(group_ids))})", group_ids).fetchall(),
+        _shards_of(user_id))
+    return tuple(sorted(chain.from_iterable(versions)))
+
+def _cached(version_of):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(key, *args, **kwargs):
+            version = version_of(key)
+            cache_key = (fn.__name__, get_pool().path, key, args, tuple(sorted(kwargs.items())), version)
+            df = _cache.get_or_load(cache_key, lambda: fn(key, *args, **kwargs))
+            return df.copy()  # callers are free to modify what they get back
+        return traced("read")(wrapper)
+    return decorator
+
+@_cached(_user_version)
 def get_user_groups(user_id):
-    conn = sqlite3.connect(DB_FILE)
-    df = pd.read_sql("""
-        SELECT g.id, g.name 
-        FROM groups g
-        JOIN group_members gm ON g.id = gm.group_id
-        WHERE gm.user_id = ?
-    """, conn, params=(user_id,))
-    conn.close()
-    return df
+    with connection() as conn:
+        return pd.read_sql("""
+            SELECT g.id, g.name, g.invite_code
+            FROM groups g
+            JOIN group_members gm ON g.id = gm.group_id
+            WHERE gm.user_id = ?
+        """, conn, params=(user_id,))
 
+@_cached(_group_version)
 def get_group_members(group_id):
-    conn = sqlite3.connect(DB_FILE)
-    df = pd.read_sql("""
-        SELECT u.id, u.name 
-        FROM users u
-        JOIN group_members gm ON u.id = gm.user_id
-        WHERE gm.group_id = ?
-    """, conn, params=(group_id,))
-    conn.close()
-    return df
+    with connection(group_path(group_id)) as conn:
+        return pd.read_sql("""
+            SELECT u.id, u.name 
+            FROM users u
+            JOIN group_members gm ON u.id = gm.user_id
+            WHERE gm.group_id = ?
+        """, conn, params=(group_id,))
+
+# Money is integer cents in the database and in every frame returned here.
+
+# Per-member aggregates, grouped inside SQLite. Both take the group id as :g.
+_PAID_TOTALS_SQL = """
+    SELECT payer_id AS user_id, SUM(amount_cents) AS paid_cents, COUNT(*) AS expense_count
+    FROM expenses WHERE group_id = :g
+    GROUP BY payer_id
+"""
+_OWED_TOTALS_SQL = """
+    SELECT s.user_id, SUM(s.owed_cents) AS owed_cents
+    FROM expenses e JOIN splits s ON s.expense_id = e.id
+    WHERE e.group_id = :g
+    GROUP BY s.user_id
+"""
 
+@_cached(_group_version)
 def get_group_expenses(group_id):
-    conn = sqlite3.connect(DB_FILE)
-    df = pd.read_sql("""
-        SELECT e.*, s.user_id, s.owed
-        FROM expenses e
-        LEFT JOIN splits s ON e.id = s.expense_id
-        WHERE e.group_id = ?
-    """, conn, params=(group_id,))
-    conn.close()
-    return df
+    """Expense headers only, one row per expense (splits are not joined in)."""
+    with connection(group_path(group_id)) as conn:
+        return pd.read_sql("""
+            SELECT id, group_id, description, amount_cents, payer_id, date
+            FROM expenses
+            WHERE group_id = ?
+        """, conn, params=(group_id,))
+
+EXPENSE_PAGE_SIZE = 25
+
+@_cached(_group_version)
+def get_expense_page(group_id, user_id, after=None, limit=EXPENSE_PAGE_SIZE):
+    """One page of a group's expenses, newest first, with `user_id`'s share of each.
+
+    Keyset pagination: `after` is the (date, id) of the last row of the previous page, so
+    every page costs the same index range scan however deep into the history it is.
+    """
+    where = "e.group_id = :g" if after is None else "e.group_id = :g AND (e.date, e.id) < (:d, :i)"
+    d, i = after if after is not None else (None, None)
+    with connection(group_path(group_id)) as conn:
+        return pd.read_sql(f"""
+            SELECT e.id, e.description, e.amount_cents, e.payer_id, e.date,
+                   COALESCE(s.owed_cents, 0) AS share_cents
+            FROM expenses e
+            LEFT JOIN splits s ON s.expense_id = e.id AND s.user_id = :u
+            WHERE {where}
+            ORDER BY e.date DESC, e.id DESC
+            LIMIT :n
+        """, conn, params={"g": group_id, "u": user_id, "d": d, "i": i, "n": limit})
 
+def _match_query(text):
+    # Every word must appear, as a prefix ("ub" finds "Uber"); quoting keeps FTS syntax out
+    words = ['"' + word.replace('"', '""') + '"*' for word in text.split()]
+    return "description : (" + " ".join(words) + ")" if words else None
+
+# A text search either looks the words up in the FTS index, which reads every posting of
+# every word in every group, or walks the group's history newest first and stops after a
+# page, which reads about page / (share of rows matching) rows. Words that fill a page from
+# the newest SEARCH_WINDOW rows are common in the group and always walk; otherwise the
+# cheaper of the two estimates wins. The walk matches words at the start of a space-separated
+# word, case-insensitively for ASCII, so it is only considered for ASCII search text.
+SEARCH_WINDOW = 500
+
+def _like_filters(words, params):
+    # One "starts a word" LIKE per word, bound as :w0, :w1, ...; wildcards in the words are escaped
+    filters = []
+    for i, word in enumerate(words):
+        params[f"w{i}"] = "% " + word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        filters.append(f"(' ' || e.description) LIKE :w{i} ESCAPE '\\'")
+    return filters
+
+def _walk_is_cheaper(conn, words, where, likes, params):
+    recent = conn.execute(f"""
+        SELECT 1 FROM (SELECT e.description FROM expenses e WHERE {where}
+                       ORDER BY e.date DESC, e.id DESC LIMIT {SEARCH_WINDOW}) e
+        WHERE {" AND ".join(likes)}
+        LIMIT {EXPENSE_PAGE_SIZE}
+    """, params).fetchall()
+    if len(recent) == EXPENSE_PAGE_SIZE:
+        return True
+    group_rows = conn.execute("SELECT COALESCE(SUM(count), 0) FROM monthly_spending WHERE group_id = ?",
+                              (params["g"],)).fetchone()[0]
+    walk = min(group_rows, EXPENSE_PAGE_SIZE * SEARCH_WINDOW // len(recent)) if recent else group_rows
+    postings = 0
+    for word in words:
+        postings += conn.execute("SELECT COALESCE(SUM(doc), 0) FROM expenses_fts_vocab WHERE term >= ? AND term < ?",
+                                 (word.lower(), word.lower() + "\U0010ffff")).fetchone()[0]
+        if postings > walk:
+            return True
+    return False
+
+@_cached(_group_version)
+def search_expenses(group_id, user_id, text="", start=None, end=None, payer_id=None,
+                    min_cents=None, max_cents=None, limit=EXPENSE_PAGE_SIZE, offset=0):
+    """Filter a group's expenses, newest first or, for index lookups, best text matches first.
+
+    `text` is matched word by word against the start of words in descriptions; the other
+    filters are optional and combine with it. Columns match get_expense_page, plus `rank`.
+    Which way a text search runs depends only on the words and the data, not on the page
+    asked for, so paging through one search keeps a single order.
+    """
+    params = {"g": group_id, "u": user_id, "start": start, "end": end, "payer": payer_id,
+              "min": min_cents, "max": max_cents, "n": limit, "o": offset}
+    filters = [f"e.{column} {op} :{param}" for column, op, param in (
+        ("date", ">=", "start"), ("date", "<=", "end"), ("payer_id", "=", "payer"),
+        ("amount_cents", ">=", "min"), ("amount_cents", "<=", "max")) if params[param] is not None]
+    filters.insert(0, "e.group_id = :g")
+    words = text.split()
+    source = "expenses e"
+    rank = "0.0"
+    order = ""   # a constant rank would cost a sort instead of walking idx_expenses_history
+    with connection(group_path(group_id)) as conn:
+        if words and text.isascii():
+            likes = _like_filters(words, params)
+            if _walk_is_cheaper(conn, words, " AND ".join(filters), likes, params):
+                filters += likes
+                words = []
+        if words:
+            # Matches come from the index and are joined to this group's rows by rowid
+            params["q"] = _match_query(text)
+            source = "expenses_fts CROSS JOIN expenses e ON e.id = expenses_fts.rowid"  # CROSS: index first
+            filters.insert(0, "expenses_fts MATCH :q")
+            rank = "bm25(expenses_fts)"
+            order = "rank, "
+        return pd.read_sql(f"""
+            SELECT e.id, e.description, e.amount_cents, e.payer_id, e.date,
+                   COALESCE(s.owed_cents, 0) AS share_cents, {rank} AS rank
+            FROM {source}
+            LEFT JOIN splits s ON s.expense_id = e.id AND s.user_id = :u
+            WHERE {" AND ".join(filters)}
+            ORDER BY {order}e.date DESC, e.id DESC
+            LIMIT :n OFFSET :o
+        """, conn, params=params)
+
+@_cached(_group_version)
+def get_group_paid_totals(group_id):
+    """Total paid and number of expenses per payer."""
+    with connection(group_path(group_id)) as conn:
+        return pd.read_sql(_PAID_TOTALS_SQL, conn, params={"g": group_id})
+
+@_cached(_group_version)
+def get_group_owed_totals(group_id):
+    """Total share of the group's expenses owed by each member."""
+    with connection(group_path(group_id)) as conn:
+        return pd.read_sql(_OWED_TOTALS_SQL, conn, params={"g": group_id})
+
+@_cached(_group_version)
+def get_monthly_spending(group_id):
+    """Amount paid and number of expenses per member per month ('YYYY-MM'), from the rollups."""
+    with connection(group_path(group_id)) as conn:
+        return pd.read_sql("""
+            SELECT ms.month, ms.user_id, u.name, ms.total_cents, ms.count
+            FROM monthly_spending ms
+            JOIN users u ON u.id = ms.user_id
+            WHERE ms.group_id = ?
+            ORDER BY ms.month, ms.user_id
+        """, conn, params=(group_id,))
+
+@_cached(_group_version)
+def get_expenses_between(group_id, start, end):
+    """Date, payer and amount of the group's expenses dated `start` to `end` (ISO dates, inclusive)."""
+    with connection(group_path(group_id)) as conn:
+        return pd.read_sql("""
+            SELECT date, payer_id, amount_cents FROM expenses
+            WHERE group_id = ? AND date BETWEEN ? AND ?
+            ORDER BY date
+        """, conn, params=(group_id, start, end))
+
+@_cached(_group_version)
 def get_group_settlements(group_id):
-    conn = sqlite3.connect(DB_FILE)
-    df = pd.read_sql("SELECT * FROM settlements WHERE group_id = ?", conn, params=(group_id,))
-    conn.close()
-    return df
\ No newline at end of file
+    with connection(group_path(group_id)) as conn:
+        return pd.read_sql("SELECT * FROM settlements WHERE group_id = ? ORDER BY id DESC", conn, params=(group_id,))
+
+@_cached(_group_version)
+def get_settled_between(group_id, payer_id, receiver_id):
+    """Total and count of the payments `payer_id` has made to `receiver_id` in the group."""
+    with connection(group_path(group_id)) as conn:
+        return pd.read_sql("""
+            SELECT COALESCE(SUM(amount_cents), 0) AS amount_cents, COUNT(*) AS payments
+            FROM settlements
+            WHERE group_id = ? AND payer_id = ? AND receiver_id = ?
+        """, conn, params=(group_id, payer_id, receiver_id))
+
+@_cached(_group_version)
+def get_group_balances(group_id):
+    """One row per member from the balance ledger: id, name, paid_cents, share_cents, balance_cents."""
+    with connection(group_path(group_id)) as conn:
+        return pd.read_sql("""
+            SELECT u.id, u.name,
+                   COALESCE(mb.paid_cents, 0) AS paid_cents,
+                   COALESCE(mb.share_cents, 0) AS share_cents,
+                   COALESCE(mb.paid_cents, 0) - COALESCE(mb.share_cents, 0) AS balance_cents
+            FROM group_members gm
+            JOIN users u ON u.id = gm.user_id
+            LEFT JOIN member_balances mb ON mb.group_id = gm.group_id AND mb.user_id = gm.user_id
+            WHERE gm.group_id = ?
+        """, conn, params=(group_id,))
+
+@_cached(_group_version)
+def get_settlement_plan(group_id):
+    """Suggested payments (payer, receiver, cents) that settle the group's current balances.
+
+    Solving can take milliseconds for larger groups, so the plan is cached with the reads
+    and only recomputed when the group changes, not on every rerun.
+    """
+    ledger = get_group_balances(group_id)
+    return pd.DataFrame(settle(dict(zip(ledger["id"].tolist(), ledger["balance_cents"].tolist()))),
+                        columns=list(Transfer._fields))
+
+_USER_GROUP_BALANCES_SQL = """
+    SELECT g.id AS group_id, g.name AS group_name, u.id AS user_id, u.name AS member,
+           COALESCE(mb.paid_cents, 0) - COALESCE(mb.share_cents, 0) AS balance_cents
+    FROM group_members mine
+    JOIN groups g ON g.id = mine.group_id
+    JOIN group_members gm ON gm.group_id = mine.group_id
+    JOIN users u ON u.id = gm.user_id
+    LEFT JOIN member_balances mb ON mb.group_id = gm.group_id AND mb.user_id = gm.user_id
+    WHERE mine.user_id = ?
+    ORDER BY g.id, u.id
+"""
+
+@_cached(_user_version)
+def get_user_group_balances(user_id):
+    """Ledger rows for every member of every group `user_id` belongs to, in one query per file."""
+    by_path = _shards_of(user_id) if shards() else {}
+    if not by_path:
+        with connection() as conn:
+            return pd.read_sql(_USER_GROUP_BALANCES_SQL, conn, params=(user_id,))
+    frames = _fan_out(lambda conn, group_ids: pd.read_sql(_USER_GROUP_BALANCES_SQL, conn, params=(user_id,)),
+                      by_path)
+    return pd.concat(frames, ignore_index=True).sort_values(["group_id", "user_id"], ignore_index=True)
+
+# --- Writes ---
+# Every write runs as a job on a writer thread (writer.py, one per database file), which
+# group-commits whatever is queued. Each helper below takes the writer's connection as its
+# first argument; callers leave it out and block until the job's batch commits, or use
+# `.submit(...)` to get the Future instead. Group writes (_group_queued) take the group id
+# next and run on the writer of the group's file.
+
+def _queued(fn, by_group=False):
+    def send(*args, **kwargs):
+        return submit_to(group_path(args[0]) if by_group else None, fn, *args, **kwargs)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return send(*args, **kwargs).result()
+    wrapper.submit = send
+    traced_wrapper = traced("write")(wrapper)
+    traced_wrapper.__wrapped__ = fn  # the raw fn(conn, ...), whether or not profiling wrapped it
+    return traced_wrapper
+
+def _group_queued(fn):
+    return _queued(fn, by_group=True)
+
+@_group_queued
+def rebuild_balances(conn, group_id, repair=True):
+    """Recompute a group's ledger rows from expenses, splits and settlements.
+
+    Returns the rows where the stored ledger disagreed with the raw data (empty when
+    consistent). With `repair`, the ledger is overwritten with the recomputed values.
+    """
+    actual = pd.read_sql(f"""
+        SELECT user_id, SUM(paid) AS paid_cents, SUM(share) AS share_cents FROM (
+            SELECT user_id, 0 AS paid, 0 AS share FROM group_members WHERE group_id = :g
+            UNION ALL
+            SELECT user_id, paid_cents, 0 FROM ({_PAID_TOTALS_SQL})
+            UNION ALL
+            SELECT user_id, 0, owed_cents FROM ({_OWED_TOTALS_SQL})
+            UNION ALL
+            SELECT payer_id, amount_cents, 0 FROM settlements WHERE group_id = :g
+            UNION ALL
+            SELECT receiver_id, 0, amount_cents FROM settlements WHERE group_id = :g
+        )
+        GROUP BY user_id
+    """, conn, params={"g": group_id})
+    stored = pd.read_sql("SELECT user_id, paid_cents, share_cents FROM member_balances WHERE group_id = ?",
+                         conn, params=(group_id,))
+    diff = actual.merge(stored, on="user_id", how="outer", suffixes=("_actual", "_stored")).fillna(0)
+    diff = diff[(diff["paid_cents_actual"] != diff["paid_cents_stored"]) |
+                (diff["share_cents_actual"] != diff["share_cents_stored"])]
+    if repair and not diff.empty:
+        conn.execute("DELETE FROM member_balances WHERE group_id = ?", (group_id,))
+        conn.execute("UPDATE groups SET version = version + 1 WHERE id = ?", (group_id,))
+        conn.executemany("INSERT INTO member_balances (group_id, user_id, paid_cents, share_cents) VALUES (?, ?, ?, ?)",
+                         [(group_id, int(r.user_id), int(r.paid_cents), int(r.share_cents))
+                          for r in actual.itertuples()])
+        take_snapshot(conn, group_id)  # replays must start from the corrected ledger
+    return diff.reset_index(drop=True)
+
+# Member balances are kept in step by triggers on expenses, splits and settlements, which
+# also append every change to the events log. Membership changes re-split the whole group,
+# so they always snapshot the ledger; other writes snapshot every SNAPSHOT_EVERY events.
+
+def _member_ids(conn, group_id):
+    return [row[0] for row in conn.execute(
+        "SELECT user_id FROM group_members WHERE group_id = ? ORDER BY user_id", (group_id,))]
+
+def _insert_splits(conn, expense_ids, amounts_cents, member_ids):
+    # Equal sharing among all current members, the payer included. The offset rotates which
+    # member absorbs the leftover pennies from one expense to the next.
+    if not len(expense_ids):
+        return
+    expense_ids = np.asarray(expense_ids, dtype=np.int64)
+    shares = split_equally_many(amounts_cents, len(member_ids), offsets=expense_ids)
+    conn.executemany("INSERT INTO splits (expense_id, user_id, owed_cents) VALUES (?, ?, ?)",
+                     zip(np.repeat(expense_ids, len(member_ids)).tolist(),
+                         np.tile(member_ids, len(expense_ids)).tolist(),
+                         shares.ravel().tolist()))
+
+def _resplit_group(conn, group_id):
+    member_ids = _member_ids(conn, group_id)
+    conn.execute("DELETE FROM splits WHERE expense_id IN (SELECT id FROM expenses WHERE group_id = ?)", (group_id,))
+    rows = conn.execute("SELECT id, amount_cents FROM expenses WHERE group_id = ?", (group_id,)).fetchall()
+    if rows:
+        expense_ids, amounts = zip(*rows)
+        _insert_splits(conn, expense_ids, amounts, member_ids)
+
+INVITE_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+INVITE_CODE_LENGTH = 8  # 36^8 ~ 2.8e12 codes
+INVITE_ATTEMPTS = 5
+
+def new_invite_code():
+    return "".join(secrets.choice(INVITE_ALPHABET) for _ in range(INVITE_CODE_LENGTH))
+
+@_queued
+def create_group(conn, name, creator_id, invite_code=None):
+    """Create a group with its creator as the first member; returns the new group's id.
+
+    Without an `invite_code` a random one is generated, retrying if it is already taken.
+    """
+    attempts = 1 if invite_code else INVITE_ATTEMPTS
+    for attempt in range(attempts):
+        code = invite_code or new_invite_code()
+        try:
+            group_id = conn.execute("INSERT INTO groups (name, creator_id, invite_code) VALUES (?, ?, ?)",
+                                    (name, creator_id, code)).lastrowid
+            break
+        except sqlite3.IntegrityError as e:
+            if "invite_code" not in str(e) or attempt == attempts - 1:
+                raise
+    conn.execute("INSERT INTO group_members (group_id, user_id) VALUES (?, ?)", (group_id, creator_id))
+    if shards():
+        # The shard's copy commits first: if it fails, so does this job, and the group never existed
+        submit_to(group_path(group_id), _create_in_shard, group_id, name, creator_id, code,
+                  _user_row(conn, creator_id)).result()
+    else:
+        take_snapshot(conn, group_id)
+    return group_id
+
+def _user_row(conn, user_id):
+    return conn.execute("SELECT id, username, name FROM users WHERE id = ?", (user_id,)).fetchone()
+
+def _mirror_user(conn, user):
+    # Shards keep the (id, username, name) of the users their rows refer to, never credentials
+    conn.execute("INSERT OR IGNORE INTO users (id, username, name) VALUES (?, ?, ?)", user)
+
+def _create_in_shard(conn, group_id, name, creator_id, invite_code, creator):
+    _mirror_user(conn, creator)
+    conn.execute("INSERT INTO groups (id, name, creator_id, invite_code) VALUES (?, ?, ?, ?)",
+                 (group_id, name, creator_id, invite_code))
+    conn.execute("INSERT INTO group_members (group_id, user_id) VALUES (?, ?)", (group_id, creator_id))
+    take_snapshot(conn, group_id)
+
+def _add_member(conn, group_id, user_id):
+    added = conn.execute("INSERT OR IGNORE INTO group_members (group_id, user_id) VALUES (?, ?)",
+                         (group_id, user_id)).rowcount
+    if added:
+        # Sharing is retroactive: a new member takes an equal share of existing expenses too
+        _resplit_group(conn, group_id)
+        take_snapshot(conn, group_id)
+    return bool(added)
+
+def _join_shard(conn, group_id, user):
+    _mirror_user(conn, user)
+    return _add_member(conn, group_id, user[0])
+
+def _join(conn, group_id, user_id):
+    if not shards():
+        return _add_member(conn, group_id, user_id)
+    added = conn.execute("INSERT OR IGNORE INTO group_members (group_id, user_id) VALUES (?, ?)",
+                         (group_id, user_id)).rowcount
+    # Idempotent on both sides, so joining again mends a join whose directory commit failed
+    joined = submit_to(group_path(group_id), _join_shard, group_id, _user_row(conn, user_id)).result()
+    return bool(added or joined)
+
+@_queued
+def join_group(conn, group_id, user_id):
+    """Add a member; returns False if they already belonged to the group."""
+    return _join(conn, group_id, user_id)
+
+@_queued
+def join_group_by_code(conn, invite_code, user_id):
+    """Look up an invite code and join in one transaction. Returns (group_id, name, added), or None."""
+    row = conn.execute("SELECT id, name FROM groups WHERE invite_code = ?", (invite_code,)).fetchone()
+    if row is None:
+        return None
+    return row[0], row[1], _join(conn, row[0], user_id)
+
+@_group_queued
+def add_expense(conn, group_id, description, amount_cents, payer_id, date):
+    expense_id = conn.execute("""
+        INSERT INTO expenses (group_id, description, amount_cents, payer_id, date)
+        VALUES (?, ?, ?, ?, ?)
+    """, (group_id, description, amount_cents, payer_id, date)).lastrowid
+    _insert_splits(conn, [expense_id], [amount_cents], _member_ids(conn, group_id))
+    maybe_snapshot(conn, group_id)
+    return expense_id
+
+@_group_queued
+def add_expenses_bulk(conn, group_id, chunks):
+    """Insert many expenses in one transaction; returns how many were written.
+
+    `chunks` is an iterable of frames with description, amount_cents, payer_id and date
+    columns. It is consumed on the writer thread inside the write transaction, so pass frames
+    that are already built (a list), never a generator that parses or validates. Ids are assigned up front (we hold the write lock), which lets every chunk's splits be
+    computed in one vectorized call and written with executemany.
+    """
+    written = 0
+    member_ids = _member_ids(conn, group_id)
+    next_id = conn.execute("""
+        SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'expenses'), 0),
+                   COALESCE((SELECT MAX(id) FROM expenses), 0)) + 1
+    """).fetchone()[0]
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        ids = np.arange(next_id, next_id + len(chunk), dtype=np.int64)
+        amounts = chunk["amount_cents"].to_numpy(dtype=np.int64)
+        conn.executemany("""
+            INSERT INTO expenses (id, group_id, description, amount_cents, payer_id, date)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, zip(ids.tolist(), repeat(group_id), chunk["description"].tolist(), amounts.tolist(),
+                 chunk["payer_id"].astype("int64").tolist(), chunk["date"].tolist()))
+        _insert_splits(conn, ids, amounts, member_ids)
+        next_id += len(chunk)
+        written += len(chunk)
+    maybe_snapshot(conn, group_id)
+    return written
+
+@_group_queued
+def update_expense(conn, group_id, expense_id, description, amount_cents, payer_id, date):
+    updated = conn.execute("""
+        UPDATE expenses
+        SET description = ?, amount_cents = ?, payer_id = ?, date = ?
+        WHERE id = ? AND group_id = ?
+    """, (description, amount_cents, payer_id, date, expense_id, group_id)).rowcount
+    if not updated:
+        return
+    conn.execute("DELETE FROM splits WHERE expense_id = ?", (expense_id,))
+    _insert_splits(conn, [expense_id], [amount_cents], _member_ids(conn, group_id))
+    maybe_snapshot(conn, group_id)
+
+@_group_queued
+def delete_expense(conn, group_id, expense_id):
+    deleted = conn.execute("DELETE FROM expenses WHERE id = ? AND group_id = ?",  # its splits go with it
+                           (expense_id, group_id)).rowcount
+    if deleted:
+        maybe_snapshot(conn, group_id)
+
+def _record_settlements(conn, transfers, date):
+    conn.executemany("""
+        INSERT INTO settlements (group_id, payer_id, receiver_id, amount_cents, date)
+        VALUES (?, ?, ?, ?, ?)
+    """, [(int(g), int(payer), int(receiver), int(cents), date)
+          for g, payer, receiver, cents in transfers if cents])
+    for group_id in {int(g) for g, *_ in transfers}:
+        maybe_snapshot(conn, group_id)
+
+@traced("write")
+def record_settlements(transfers, date):
+    """Record (group_id, payer_id, receiver_id, cents) payments, in one transaction per database file."""
+    by_path = {}
+    for transfer in transfers:
+        by_path.setdefault(group_path(transfer[0]), []).append(transfer)
+    futures = [submit_to(path, _record_settlements, batch, date) for path, batch in by_path.items()]
+    for future in futures:
+        future.result()
@@ -0,0 +1,118 @@
+import json
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from connection import connection, group_path
+from splitting import split_equally_many
+
+# Every write to a group's expenses, settlements and membership is appended to `events` by
+# triggers (migrations._event_triggers); rows are never updated or deleted, so the table is
+# the group's audit trail. A balance snapshot copies the group's ledger as of one event, and
+# replaying the events after the latest snapshot rebuilds the ledger at any later point
+# without reading the whole history.
+#
+# Sharing is retroactive, so a membership change re-splits every expense and cannot be
+# replayed from the event alone. Joins therefore always take a snapshot (see database.py).
+
+SNAPSHOT_EVERY = 500  # events in a group between automatic snapshots
+
+
+def _last_event_id(conn, group_id):
+    return conn.execute("SELECT COALESCE(MAX(id), 0) FROM events WHERE group_id = ?", (group_id,)).fetchone()[0]
+
+
+def take_snapshot(conn, group_id):
+    """Snapshot the group's ledger as of its latest event, inside the caller's write transaction."""
+    event_id = _last_event_id(conn, group_id)
+    conn.execute("""
+        INSERT OR REPLACE INTO balance_snapshots (group_id, event_id, user_id, paid_cents, share_cents, is_member)
+        SELECT mb.group_id, ?, mb.user_id, mb.paid_cents, mb.share_cents, gm.user_id IS NOT NULL
+        FROM member_balances mb
+        LEFT JOIN group_members gm ON gm.group_id = mb.group_id AND gm.user_id = mb.user_id
+        WHERE mb.group_id = ?
+    """, (event_id, group_id))
+    return event_id
+
+
+def maybe_snapshot(conn, group_id):
+    """Take a snapshot if SNAPSHOT_EVERY events have been written since the last one."""
+    since = conn.execute("SELECT COALESCE(MAX(event_id), 0) FROM balance_snapshots WHERE group_id = ?",
+                         (group_id,)).fetchone()[0]
+    pending = conn.execute("SELECT COUNT(*) FROM events WHERE group_id = ? AND id > ?", (group_id, since)).fetchone()[0]
+    if pending >= SNAPSHOT_EVERY:
+        take_snapshot(conn, group_id)
+
+
+def get_group_events(group_id, limit=50, before=None):
+    """Newest events first, with the JSON payload decoded into a `data` column."""
+    where = "group_id = ?" if before is None else "group_id = ? AND id < ?"
+    params = (group_id,) if before is None else (group_id, before)
+    with connection(group_path(group_id)) as conn:
+        events = pd.read_sql(f"SELECT id, kind, payload, created_at FROM events WHERE {where} ORDER BY id DESC LIMIT ?",
+                             conn, params=params + (limit,))
+    events["data"] = events.pop("payload").map(json.loads)
+    return events
+
+
+def replay(group_id, as_of=None):
+    """The group's ledger as of event `as_of` (default: its latest event).
+
+    Starts from the latest snapshot at or before `as_of` and applies the events after it.
+    Returns user_id, paid_cents, share_cents and balance_cents, like member_balances.
+    """
+    with connection(group_path(group_id)) as conn:
+        if as_of is None:
+            as_of = _last_event_id(conn, group_id)
+        base = conn.execute("SELECT MAX(event_id) FROM balance_snapshots WHERE group_id = ? AND event_id <= ?",
+                            (group_id, as_of)).fetchone()[0]
+        if base is None:
+            raise LookupError(f"group {group_id} has no snapshot at or before event {as_of}")
+        snapshot = conn.execute("""SELECT user_id, paid_cents, share_cents, is_member FROM balance_snapshots
+                                   WHERE group_id = ? AND event_id = ?""", (group_id, base)).fetchall()
+        tail = conn.execute("SELECT id, kind, payload FROM events WHERE group_id = ? AND id > ? AND id <= ? ORDER BY id",
+                            (group_id, base, as_of)).fetchall()
+
+    paid, share = defaultdict(int), defaultdict(int)
+    members = []
+    for user_id, paid_cents, share_cents, is_member in snapshot:
+        paid[user_id] += paid_cents
+        share[user_id] += share_cents
+        if is_member:
+            members.append(user_id)
+    members.sort()
+
+    # Expense shares only depend on (id, amount) and the member list, which is fixed over the
+    # tail, so they are collected here and split in one vectorized call at the end.
+    expense_ids, amounts, signs = [], [], []
+    for event_id, kind, payload in tail:
+        data = json.loads(payload)
+        if kind in ("expense_added", "expense_deleted", "expense_edited"):
+            if kind == "expense_edited":
+                changes = [(-1, data["old"]), (1, data["new"])]
+            else:
+                changes = [(1 if kind == "expense_added" else -1, data)]
+            for sign, expense in changes:
+                paid[expense["payer_id"]] += sign * expense["amount_cents"]
+                expense_ids.append(expense["id"])
+                amounts.append(expense["amount_cents"])
+                signs.append(sign)
+        elif kind in ("settlement_recorded", "settlement_deleted"):
+            sign = 1 if kind == "settlement_recorded" else -1
+            paid[data["payer_id"]] += sign * data["amount_cents"]
+            share[data["receiver_id"]] += sign * data["amount_cents"]
+        else:
+            raise ValueError(f"event {event_id} ({kind}) changed the members without a snapshot after it")
+
+    if expense_ids:
+        shares = split_equally_many(amounts, len(members), offsets=expense_ids)
+        for user_id, cents in zip(members, (shares * np.array(signs)[:, None]).sum(axis=0).tolist()):
+            share[user_id] += cents
+
+    users = sorted(set(paid) | set(share))
+    ledger = pd.DataFrame({"user_id": users,
+                           "paid_cents": [paid[u] for u in users],
+                           "share_cents": [share[u] for u in users]}, dtype="int64")
+    ledger["balance_cents"] = ledger["paid_cents"] - ledger["share_cents"]
+    return ledger
@@ -0,0 +1,232 @@
+"""Stream the ledger of a group, a user or the whole database to CSV, JSON lines or Parquet.
+
+    python export.py --group 12 -o trip.csv
+    python export.py --user 7 --format jsonl -o -
+    python export.py --all --format parquet -o ledger-2025-06.parquet
+"""
+import argparse
+import csv
+import heapq
+import io
+import json
+import sys
+import time
+from contextlib import ExitStack
+
+from connection import configure, connection, get_pool, group_path
+
+# Rows come off fetchmany() cursors in chunks and are encoded chunk by chunk, so memory stays
+# at one chunk however long the ledger is. The export reads on one pooled connection per
+# database file (just the one unless sharded), each holding a read transaction, so under WAL
+# every file is a consistent snapshot even while writes go on.
+#
+# Groups are exported one after another. Within a group, expenses come in (date, id) order
+# straight off idx_expenses_history and are merged with the group's settlements (sorted by
+# SQLite; there are few of them). importer.py understands the date, description, amount and
+# paid_by columns, so a CSV export can be imported into another group (settlements included,
+# as expenses, unless their rows are removed first).
+
+CHUNK_ROWS = 10_000
+
+COLUMNS = ["group_id", "group", "type", "id", "date", "description", "paid_by", "paid_to",
+           "amount", "amount_cents"]
+USER_COLUMNS = COLUMNS + ["your_share_cents"]  # user scope: the user's split of each expense
+INT_COLUMNS = {"group_id", "id", "amount_cents", "your_share_cents"}
+
+FORMATS = {  # format: (label, file extension, MIME type)
+    "csv": ("CSV", "csv", "text/csv"),
+    "jsonl": ("JSON lines", "jsonl", "application/x-ndjson"),
+    "parquet": ("Parquet", "parquet", "application/vnd.apache.parquet"),
+}
+
+_AMOUNT = "printf('%d.%02d', {0} / 100, {0} % 100)"  # exact cents -> "12.34"
+
+
+def _groups(conn, scope, key):
+    if scope == "group":
+        return conn.execute("SELECT id, name FROM groups WHERE id = ?", (key,)).fetchall()
+    if scope == "user":
+        return conn.execute("""
+            SELECT g.id, g.name FROM group_members gm JOIN groups g ON g.id = gm.group_id
+            WHERE gm.user_id = ? ORDER BY g.id
+        """, (key,)).fetchall()
+    if scope == "all":
+        return conn.execute("SELECT id, name FROM groups ORDER BY id")  # streamed too
+    raise ValueError(f"unknown export scope: {scope!r}")
+
+
+def _fetch(cursor, chunk_rows):
+    while True:
+        rows = cursor.fetchmany(chunk_rows)
+        if not rows:
+            return
+        yield from rows
+
+
+def _group_rows(conn, group_id, group_name, user_id, chunk_rows):
+    share = "s.owed_cents" if user_id is not None else "NULL"
+    expenses = conn.execute(f"""
+        SELECT e.date, 0, e.id, e.description, p.name, NULL, {_AMOUNT.format('e.amount_cents')},
+               e.amount_cents, {share}
+        FROM expenses e
+        JOIN users p ON p.id = e.payer_id
+        LEFT JOIN splits s ON s.expense_id = e.id AND s.user_id = ?
+        WHERE e.group_id = ?
+        ORDER BY e.date, e.id
+    """, (user_id, group_id))
+    settlements = conn.execute(f"""
+        SELECT s.date, 1, s.id, 'Settlement', p.name, r.name, {_AMOUNT.format('s.amount_cents')},
+               s.amount_cents, NULL
+        FROM settlements s
+        JOIN users p ON p.id = s.payer_id
+        JOIN users r ON r.id = s.receiver_id
+        WHERE s.group_id = ?
+        ORDER BY s.date, s.id
+    """, (group_id,))
+    for date, kind, id_, description, paid_by, paid_to, amount, cents, your_share in heapq.merge(
+            _fetch(expenses, chunk_rows), _fetch(settlements, chunk_rows)):
+        row = (group_id, group_name, "settlement" if kind else "expense", id_, date, description,
+               paid_by, paid_to, amount, cents)
+        yield row + (your_share,) if user_id is not None else row
+
+
+def ledger_chunks(scope, key=None, chunk_rows=CHUNK_ROWS):
+    """Yield the ledger of `scope` ("group", "user" or "all"; `key` is the group or user id) as lists of row tuples."""
+    user_id = key if scope == "user" else None
+    with ExitStack() as stack:
+        snapshots = {}
+
+        def snapshot(path=None):
+            path = path or get_pool().path
+            if path not in snapshots:
+                conn = snapshots[path] = stack.enter_context(connection(path))
+                conn.execute("BEGIN")  # one snapshot for every query of the export on this file
+                stack.callback(conn.execute, "COMMIT")
+            return snapshots[path]
+
+        chunk = []
+        for group_id, group_name in _groups(snapshot(), scope, key):
+            for row in _group_rows(snapshot(group_path(group_id)), group_id, group_name, user_id, chunk_rows):
+                chunk.append(row)
+                if len(chunk) == chunk_rows:
+                    yield chunk
+                    chunk = []
+        if chunk:
+            yield chunk
+
+
+def _csv(columns, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    for chunk in chunks:
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()  # header of an empty export
+
+
+def _jsonl(columns, chunks):
+    for chunk in chunks:
+        yield "".join(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n" for row in chunk).encode()
+
+
+class _Drain(io.RawIOBase):
+    # Write-only file that hands over what has been written so far; tell() keeps counting,
+    # which the Parquet footer's offsets rely on
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self):
+        data = b"".join(self.parts)
+        self.parts.clear()
+        return data
+
+
+def _parquet(columns, chunks):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)") from None
+    schema = pa.schema([(name, pa.int64() if name in INT_COLUMNS else pa.string()) for name in columns])
+    sink = _Drain()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        for chunk in chunks:  # one row group per chunk
+            arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*chunk), schema)]
+            writer.write_batch(pa.record_batch(arrays, schema=schema))
+            yield sink.take()
+    finally:
+        writer.close()
+    yield sink.take()  # footer
+
+
+def stream(scope, key=None, fmt="csv", chunk_rows=CHUNK_ROWS):
+    """Yield the export of `scope` encoded as `fmt` (a FORMATS key), as bytes chunks."""
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown export format: {fmt!r}")
+    columns = USER_COLUMNS if scope == "user" else COLUMNS
+    encode = {"csv": _csv, "jsonl": _jsonl, "parquet": _parquet}[fmt]
+    return encode(columns, ledger_chunks(scope, key, chunk_rows))
+
+
+def write(out, scope, key=None, fmt="csv", chunk_rows=CHUNK_ROWS):
+    """Write the export to the binary file `out`; returns the number of bytes written."""
+    written = 0
+    for data in stream(scope, key, fmt, chunk_rows):
+        out.write(data)
+        written += len(data)
+    return written
+
+
+def file_name(name, fmt):
+    """Download file name for an export of `name`, e.g. "Trip to Rome" -> "trip-to-rome-ledger.csv"."""
+    slug = "-".join("".join(c if c.isalnum() else " " for c in name.lower()).split()) or "splitfree"
+    return f"{slug}-ledger.{FORMATS[fmt][1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    scope = parser.add_mutually_exclusive_group(required=True)
+    scope.add_argument("--group", type=int, metavar="ID", help="one group's ledger")
+    scope.add_argument("--user", type=int, metavar="ID", help="every group the user belongs to")
+    scope.add_argument("--all", action="store_true", help="every group in the database")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("-o", "--output", default="-", help="file to write, - for stdout (default)")
+    parser.add_argument("--db", help="database file (default: connection.DB_FILE)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    if args.db:
+        configure(args.db)
+    from migrations import init_db
+    init_db()
+
+    key = args.group if args.group is not None else args.user
+    kind = "group" if args.group is not None else "user" if args.user is not None else "all"
+    start = time.perf_counter()
+    if args.output == "-":
+        written = write(sys.stdout.buffer, kind, key, args.format, args.chunk_rows)
+    else:
+        with open(args.output, "wb") as out:
+            written = write(out, kind, key, args.format, args.chunk_rows)
+    print(f"{written / 2**20:,.1f} MB in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import time
+from collections import namedtuple
+
+import pandas as pd
+
+from database import add_expenses_bulk, get_group_members
+from splitting import to_cents
+
+# Bulk expense import from CSV exports (other bill-splitting apps, bank statements).
+# The file is read in chunks and each chunk is validated with vectorized pandas operations
+# on the caller's thread; only the validated rows go to the writer, in a single transaction.
+
+CHUNK_SIZE = 20_000
+
+# Accepted header names (lower-cased) for each field we need
+COLUMN_ALIASES = {
+    "date": ["date", "transaction date", "posted date", "posting date"],
+    "description": ["description", "expense", "details", "memo", "payee", "name"],
+    "amount": ["amount", "cost", "total", "debit", "value"],
+    "payer": ["payer", "paid by", "who paid", "paid_by"],
+}
+
+ImportPreview = namedtuple("ImportPreview", ["rows", "valid", "errors", "sample"])
+ImportResult = namedtuple("ImportResult", ["rows", "imported", "errors", "seconds"])
+
+
+def _rename_columns(raw):
+    lookup = {column.strip().lower(): column for column in raw.columns}
+    renames = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in lookup:
+                renames[lookup[alias]] = field
+                break
+    frame = raw.rename(columns=renames)
+    missing = [field for field in ("date", "description", "amount") if field not in frame.columns]
+    if missing:
+        raise ValueError(f"CSV is missing column(s): {', '.join(missing)}")
+    return frame
+
+
+def _parse_cents(text):
+    try:
+        return to_cents(text)
+    except (ArithmeticError, ValueError):  # decimal.InvalidOperation, NaN, blanks
+        return None
+
+
+def normalize(raw, name_to_id, default_payer_id):
+    """Validate one chunk. Returns (rows ready for add_expenses_bulk, rejected rows with a reason)."""
+    frame = _rename_columns(raw)
+    description = frame["description"].fillna("").astype(str).str.strip()
+
+    # "$1,234.50" -> 123450, rounded half up like amounts entered by hand. Negative amounts are
+    # refunds or credits, which are not expenses: those rows are rejected, not flipped.
+    cleaned = frame["amount"].fillna("").astype(str).str.replace(r"[$,\s]", "", regex=True)
+    amount_cents = pd.to_numeric(cleaned.map(_parse_cents), errors="coerce")
+
+    date = pd.to_datetime(frame["date"], errors="coerce", format="mixed")
+
+    if "payer" in frame.columns:
+        payer = frame["payer"].fillna("").astype(str).str.strip().str.lower()
+        payer_id = payer.map(name_to_id).mask(payer == "", default_payer_id)
+    else:
+        payer_id = pd.Series(default_payer_id, index=frame.index)
+
+    reason = pd.Series("", index=frame.index)
+    reason = reason.mask(payer_id.isna(), "unknown payer")
+    reason = reason.mask(date.isna(), "invalid date")
+    reason = reason.mask(amount_cents.isna() | (amount_cents == 0), "invalid amount")
+    reason = reason.mask(amount_cents < 0, "negative amount (refund or credit)")
+    reason = reason.mask(description == "", "missing description")
+    ok = reason == ""
+
+    valid = pd.DataFrame({
+        "date": date[ok].dt.strftime("%Y-%m-%d"),
+        "description": description[ok],
+        "amount_cents": amount_cents[ok].astype("int64"),
+        "payer_id": payer_id[ok].astype("int64"),
+    })
+    errors = raw[~ok].assign(error=reason[~ok])
+    return valid, errors
+
+
+def _chunks(source, group_id, default_payer_id, chunksize):
+    members = get_group_members(group_id)
+    name_to_id = dict(zip(members["name"].str.strip().str.lower(), members["id"]))
+    if hasattr(source, "seek"):
+        source.seek(0)
+    for raw in pd.read_csv(source, dtype=str, chunksize=chunksize, skipinitialspace=True):
+        yield raw, *normalize(raw, name_to_id, default_payer_id)
+
+
+def preview_import(source, group_id, default_payer_id, sample_size=20, chunksize=CHUNK_SIZE):
+    """Dry run: validate the whole file without writing anything."""
+    rows = valid = 0
+    errors, sample = [], []
+    for raw, ok, bad in _chunks(source, group_id, default_payer_id, chunksize):
+        rows += len(raw)
+        valid += len(ok)
+        if sum(map(len, errors)) < 1000:  # enough to show the user what to fix
+            errors.append(bad)
+        if sum(map(len, sample)) < sample_size:
+            sample.append(ok.head(sample_size))
+    return ImportPreview(rows, valid,
+                         pd.concat(errors) if errors else pd.DataFrame(),
+                         pd.concat(sample).head(sample_size) if sample else pd.DataFrame())
+
+
+def import_csv(source, group_id, default_payer_id, chunksize=CHUNK_SIZE):
+    """Import every valid row of the file in one transaction; invalid rows are skipped and returned."""
+    start = time.perf_counter()
+    rows = 0
+    ready, errors = [], []
+    # Parse and validate here: the writer thread holds the write lock for everyone while it runs
+    for raw, ok, bad in _chunks(source, group_id, default_payer_id, chunksize):
+        rows += len(raw)
+        ready.append(ok)
+        errors.append(bad)
+
+    imported = add_expenses_bulk(group_id, ready)
+    return ImportResult(rows, imported, pd.concat(errors) if errors else pd.DataFrame(),
+                        time.perf_counter() - start)
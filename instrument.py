@@ -0,0 +1,273 @@
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Opt-in profiling of page reruns. Set SPLITFREE_PROFILE=1 (or call enable() before database
+# is imported) and every rerun of a page that calls start_page() records:
+#
+#   - a span per database.py read ("read") and write ("write"), per utils / settlement
+#     computation ("compute") and per auth call ("auth"), with its duration and row count;
+#   - every SQL statement run inside a span, with its duration and row count, including
+#     the statements a write runs on the writer thread;
+#   - EXPLAIN QUERY PLAN for any statement slower than SLOW_MS.
+#
+# Whatever is left of the rerun's wall time is "render". debug_panel() shows the rerun in
+# the sidebar and appends it to the SPLITFREE_PROFILE_LOG file as one JSON line. A rerun cut
+# short by st.stop(), st.rerun() or st.switch_page() is logged when the session next reruns.
+#
+# Whether to instrument is decided once, at import: when disabled, traced() returns the
+# function itself and connections are plain sqlite3 connections, so there is no cost.
+
+SLOW_MS = float(os.environ.get("SPLITFREE_SLOW_MS", 100))
+LOG_PATH = os.environ.get("SPLITFREE_PROFILE_LOG")  # JSON lines; None to skip the log
+
+_enabled = os.environ.get("SPLITFREE_PROFILE", "") not in ("", "0")
+_local = threading.local()  # .run: the rerun being recorded, .stack: open spans
+_log_lock = threading.Lock()
+_EXPLAINED = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+def enabled():
+    return _enabled
+
+
+def enable(log_path=None, slow_ms=None):
+    """Turn profiling on. Only functions decorated and connections opened afterwards are covered."""
+    global _enabled, LOG_PATH, SLOW_MS
+    _enabled = True
+    LOG_PATH = log_path or LOG_PATH
+    SLOW_MS = SLOW_MS if slow_ms is None else slow_ms
+    import connection
+    connection.set_connection_class(_Connection)
+
+
+class _Cursor(sqlite3.Cursor):
+    # Times execute plus every fetch, and counts the rows, into the statement's record
+    _record = None
+
+    def _start(self, sql, params):
+        stack = getattr(_local, "stack", None)
+        if not stack or getattr(_local, "explaining", False):
+            self._record = None
+            return
+        self._record = {"sql": sql, "params": params, "ms": 0.0, "rows": 0}
+        stack[-1]["statements"].append(self._record)
+
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            if self._record is not None:
+                self._record["ms"] += (time.perf_counter() - start) * 1000
+
+    def execute(self, sql, params=()):
+        self._start(sql, params)
+        result = self._timed(super().execute, sql, params)
+        if self._record is not None and self.rowcount > 0:
+            self._record["rows"] = self.rowcount
+        return result
+
+    def executemany(self, sql, seq_of_params):
+        self._start(sql, None)
+        result = self._timed(super().executemany, sql, seq_of_params)
+        if self._record is not None:
+            self._record["rows"] = max(self.rowcount, 0)
+        return result
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if self._record is not None and row is not None:
+            self._record["rows"] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(super().fetchmany, self.arraysize if size is None else size)
+        if self._record is not None:
+            self._record["rows"] += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        if self._record is not None:
+            self._record["rows"] += len(rows)
+        return rows
+
+    def __next__(self):
+        row = self._timed(super().__next__)
+        if self._record is not None:
+            self._record["rows"] += 1
+        return row
+
+
+class _Connection(sqlite3.Connection):
+    # sqlite3.Connection.execute does not go through Cursor.execute, so route it explicitly
+    def cursor(self, factory=_Cursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+
+def traced(kind, name=None):
+    """Decorator recording each call as a `kind` span of the current rerun (no-op when disabled)."""
+    def decorator(fn):
+        if not _enabled:
+            return fn
+        label = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if getattr(_local, "run", None) is None:
+                return fn(*args, **kwargs)
+            with span(kind, label) as current:
+                result = fn(*args, **kwargs)
+                if hasattr(result, "__len__") and not isinstance(result, (str, bytes)):
+                    current["rows"] = len(result)
+                return result
+        return wrapper
+    return decorator
+
+
+class span:
+    """Context manager for a span of the current rerun; nests under any open span."""
+
+    def __init__(self, kind, name):
+        self.record = {"kind": kind, "name": name, "ms": 0.0, "self_ms": 0.0, "rows": None, "statements": []}
+
+    def __enter__(self):
+        run = getattr(_local, "run", None)
+        if run is not None:
+            self.record["depth"] = len(_local.stack)
+            run["spans"].append(self.record)
+            _local.stack.append(self.record)
+        self._start = time.perf_counter()
+        return self.record
+
+    def __exit__(self, *exc):
+        record = self.record
+        record["ms"] = (time.perf_counter() - self._start) * 1000
+        record["self_ms"] += record["ms"]
+        if getattr(_local, "run", None) is not None and _local.stack and _local.stack[-1] is record:
+            _local.run["end"] = time.perf_counter()
+            _local.stack.pop()
+            if _local.stack:
+                _local.stack[-1]["self_ms"] -= record["ms"]
+            _explain_slow(record)
+        return False
+
+
+def bind(fn):
+    """Wrap `fn` so that, run on another thread (the writer), its statements land in the caller's span."""
+    if not _enabled or not getattr(_local, "stack", None):
+        return fn
+    run, owner = _local.run, _local.stack[-1]
+
+    @functools.wraps(fn)
+    def bound(*args, **kwargs):
+        saved = getattr(_local, "run", None), getattr(_local, "stack", None)
+        _local.run, _local.stack = run, [owner]
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _local.run, _local.stack = saved
+    return bound
+
+
+def _explain_slow(record):
+    for statement in record["statements"]:
+        if statement["ms"] < SLOW_MS or "plan" in statement:
+            continue
+        sql = statement["sql"].lstrip()
+        if not sql.upper().startswith(_EXPLAINED) or statement["params"] is None:
+            continue
+        import connection
+        _local.explaining = True
+        try:
+            with connection.connection() as conn:
+                rows = conn.execute("EXPLAIN QUERY PLAN " + sql, statement["params"]).fetchall()
+            statement["plan"] = [row[-1] for row in rows]
+        except sqlite3.Error as e:
+            statement["plan"] = [f"EXPLAIN failed: {e}"]
+        finally:
+            _local.explaining = False
+        _local.run["slow"].append(statement)
+
+
+def start_page(page):
+    """Begin recording this rerun of `page` on the current thread (no-op when disabled).
+
+    A previous rerun of the session that never reached debug_panel() is logged first,
+    marked cut_short and timed up to its last span.
+    """
+    if not _enabled:
+        return
+    import streamlit as st
+    previous = st.session_state.get("_profile_run")
+    if previous is not None and "total_ms" not in previous:
+        _finish(previous, previous["end"], cut_short=True)
+    now = time.perf_counter()
+    _local.run = {"page": page, "ts": time.time(), "start": now, "end": now, "spans": [], "slow": []}
+    _local.stack = []
+    st.session_state["_profile_run"] = _local.run
+
+
+def finish_page():
+    """Stop recording and return the rerun as a dict, also appended to LOG_PATH; None if nothing was recorded."""
+    run = getattr(_local, "run", None)
+    if run is None:
+        return None
+    _local.run, _local.stack = None, []
+    return _finish(run, time.perf_counter())
+
+
+def _finish(run, end, cut_short=False):
+    total_ms = (end - run.pop("start")) * 1000
+    del run["end"]
+    by_kind = {}
+    for record in run["spans"]:
+        by_kind[record["kind"]] = by_kind.get(record["kind"], 0.0) + record["self_ms"]
+    by_kind["render"] = max(0.0, total_ms - sum(by_kind.values()))
+    run.update(total_ms=total_ms, breakdown=by_kind, cut_short=cut_short)
+    for record in run["spans"]:
+        for statement in record["statements"]:
+            statement["sql"] = " ".join(statement["sql"].split())
+            statement.pop("params", None)
+    if LOG_PATH:
+        line = json.dumps(run, default=str)
+        with _log_lock, open(LOG_PATH, "a") as f:
+            f.write(line + "\n")
+    return run
+
+
+def debug_panel():
+    """Finish the rerun and, if the user opts in, show it in the sidebar (no-op when disabled)."""
+    if not _enabled:
+        return
+    import pandas as pd
+    import streamlit as st
+    run = finish_page()
+    if run is None or not st.sidebar.checkbox("🛠️ Profile this page", key="debug_panel"):
+        return
+    with st.sidebar.expander(f"{run['total_ms']:.0f} ms this rerun", expanded=True):
+        st.write(" · ".join(f"{kind} {ms:.0f} ms" for kind, ms in run["breakdown"].items()))
+        st.dataframe(pd.DataFrame([{
+            "span": "  " * r["depth"] + r["name"], "kind": r["kind"], "ms": round(r["ms"], 1),
+            "rows": r["rows"], "sql": len(r["statements"]),
+        } for r in run["spans"]]), hide_index=True)
+        statements = [dict(s, span=r["name"]) for r in run["spans"] for s in r["statements"]]
+        if statements:
+            st.dataframe(pd.DataFrame(statements)[["span", "ms", "rows", "sql"]].round({"ms": 2}), hide_index=True)
+        for statement in run["slow"]:
+            st.caption(f"Slow ({statement['ms']:.0f} ms): {statement['sql'][:200]}")
+            st.code("\n".join(statement["plan"]), language=None)
+
+
+if _enabled:
+    enable()
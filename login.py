@@ -1,6 +1,6 @@
 import streamlit as st
-from auth import register, login
-from database import init_db
+from auth import register, login, Busy
+from instrument import start_page, debug_panel
 
 # --- MUST BE FIRST STREAMLIT COMMAND ---
 st.set_page_config(
@@ -25,11 +25,10 @@ meta_tags = """
 st.markdown(meta_tags, unsafe_allow_html=True)
 # === END META ===
 
-init_db()  # Ensure DB ready
-
 if "user_id" in st.session_state:
     st.switch_page("pages/1_📊_Dashboard.py")  # Redirect if already logged in
 
+start_page("Login")
 st.title("💸 SplitFree")
 st.subheader("Split expenses with friends/roommates — free forever!")
 
@@ -40,15 +39,19 @@ with tab1:
         username = st.text_input("Username")
         password = st.text_input("Password", type="password")
         if st.form_submit_button("Login"):
-            user = login(username, password)
-            if user:
-                st.session_state.user_id = user[0]
-                st.session_state.name = user[1]
-                st.session_state.username = username
-                st.success(f"Welcome, {user[1]}!")
-                st.switch_page("pages/1_📊_Dashboard.py")
+            try:
+                user = login(username, password)
+            except Busy:
+                st.warning("Lots of people are signing in right now — please try again in a moment.")
             else:
-                st.error("Invalid username/password")
+                if user:
+                    st.session_state.user_id = user[0]
+                    st.session_state.name = user[1]
+                    st.session_state.username = username
+                    st.success(f"Welcome, {user[1]}!")
+                    st.switch_page("pages/1_📊_Dashboard.py")
+                else:
+                    st.error("Invalid username/password")
 
 with tab2:
     with st.form("register_form"):
@@ -59,12 +62,15 @@ with tab2:
         if st.form_submit_button("Register"):
             if not new_name.strip() or not new_username.strip() or not new_email.strip() or not new_password:
                 st.error("All fields are required!")
-            elif register(new_username, new_name, new_email, new_password):
-                st.success("Registered successfully! Please login.")
             else:
+                try:
+                    registered = register(new_username, new_name, new_email, new_password)
+                except Busy:
+                    st.warning("Lots of people are signing up right now — please try again in a moment.")
+                else:
+                    if registered:
+                        st.success("Registered successfully! Please login.")
+                    else:
+                        st.error("Username or email already taken")
 
-                st.error("Username or email already taken")
-
-
-
-
+debug_panel()
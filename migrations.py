@@ -0,0 +1,564 @@
+import os
+import threading
+import backup
+from connection import connection, get_pool, set_shards
+
+# Schema history, applied in order. The database's PRAGMA user_version records how many have run,
+# so each step runs exactly once per database file and startup costs a single PRAGMA read.
+
+def _initial_schema(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS users
+             (id INTEGER PRIMARY KEY AUTOINCREMENT,
+              username TEXT UNIQUE,
+              name TEXT,
+              email TEXT UNIQUE,   -- Added email, unique for invites
+              password TEXT)''')
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS groups
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  name TEXT,
+                  creator_id INTEGER,
+                  invite_code TEXT UNIQUE)''')
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS group_members
+                 (group_id INTEGER,
+                  user_id INTEGER,
+                  PRIMARY KEY (group_id, user_id))''')
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS expenses
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  group_id INTEGER,
+                  description TEXT,
+                  amount REAL,
+                  payer_id INTEGER,
+                  date TEXT)''')
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS splits
+                 (expense_id INTEGER,
+                  user_id INTEGER,
+                  owed REAL,
+                  PRIMARY KEY (expense_id, user_id))''')
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS settlements
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  group_id INTEGER,
+                  payer_id INTEGER,
+                  receiver_id INTEGER,
+                  amount REAL,
+                  date TEXT)''')
+
+
+def _repair_blob_ids(conn):
+    # Pages used to bind numpy.int64 group ids straight from pandas, which sqlite3 stores as
+    # 8-byte BLOBs that never match the integer ids in `groups`. Decode them back to integers.
+    for table, column in (("expenses", "group_id"), ("group_members", "group_id"),
+                          ("settlements", "group_id")):
+        blobs = conn.execute(f"SELECT DISTINCT {column} FROM {table} WHERE typeof({column}) = 'blob'").fetchall()
+        for (blob,) in blobs:
+            value = int.from_bytes(blob, "little", signed=True)
+            conn.execute(f"UPDATE OR IGNORE {table} SET {column} = ? WHERE {column} = ?", (value, blob))
+        # Rows left behind collided with an existing integer row (duplicate membership)
+        conn.execute(f"DELETE FROM {table} WHERE typeof({column}) = 'blob'")
+
+
+def _read_path_indexes(conn):
+    # splits(expense_id) and group_members(group_id) are already served by their primary keys.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_group_members_user ON group_members (user_id, group_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_expenses_group ON expenses (group_id, payer_id, amount)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_settlements_group ON settlements (group_id)")
+
+
+def _member_balances(conn):
+    # Every current member now carries a split row for every expense in the group, the payer
+    # included, so the sum of a member's splits is their (retroactive) equal share.
+    members = {}
+    for group_id, user_id in conn.execute("SELECT group_id, user_id FROM group_members ORDER BY group_id, user_id"):
+        members.setdefault(group_id, []).append(user_id)
+    conn.execute("DELETE FROM splits")
+    expenses = conn.execute("SELECT id, group_id, amount FROM expenses").fetchall()
+    if expenses:
+        # numpy; a brand-new database has no expenses and keeps it off the login path
+        from splitting import split_equally
+    rows = []
+    for expense_id, group_id, amount in expenses:
+        ids = members.get(group_id, [])
+        if ids:
+            shares = split_equally(round(amount * 100), len(ids), offset=expense_id)
+            rows.extend((expense_id, user_id, cents / 100) for user_id, cents in zip(ids, shares))
+    conn.executemany("INSERT INTO splits (expense_id, user_id, owed) VALUES (?, ?, ?)", rows)
+
+    conn.execute("""CREATE TABLE member_balances
+                    (group_id INTEGER,
+                     user_id INTEGER,
+                     paid_cents INTEGER NOT NULL DEFAULT 0,   -- expenses paid + settlements sent
+                     share_cents INTEGER NOT NULL DEFAULT 0,  -- expense shares + settlements received
+                     PRIMARY KEY (group_id, user_id)) WITHOUT ROWID""")
+    conn.execute("""
+        INSERT INTO member_balances (group_id, user_id, paid_cents, share_cents)
+        SELECT group_id, user_id, SUM(paid), SUM(share) FROM (
+            SELECT group_id, user_id, 0 AS paid, 0 AS share FROM group_members
+            UNION ALL
+            SELECT group_id, payer_id, CAST(ROUND(amount * 100) AS INTEGER), 0 FROM expenses
+            UNION ALL
+            SELECT e.group_id, s.user_id, 0, CAST(ROUND(s.owed * 100) AS INTEGER)
+            FROM splits s JOIN expenses e ON e.id = s.expense_id
+            UNION ALL
+            SELECT group_id, payer_id, CAST(ROUND(amount * 100) AS INTEGER), 0 FROM settlements
+            UNION ALL
+            SELECT group_id, receiver_id, 0, CAST(ROUND(amount * 100) AS INTEGER) FROM settlements
+        )
+        GROUP BY group_id, user_id
+    """)
+    for trigger in _balance_triggers("amount", "owed", to_cents="CAST(ROUND({} * 100) AS INTEGER)"):
+        conn.execute(trigger)
+
+
+_PAY = """INSERT INTO member_balances (group_id, user_id, paid_cents) VALUES ({group}, {user}, {cents})
+          ON CONFLICT (group_id, user_id) DO UPDATE SET paid_cents = paid_cents + excluded.paid_cents;"""
+_SHARE = """INSERT INTO member_balances (group_id, user_id, share_cents) VALUES ({group}, {user}, {cents})
+            ON CONFLICT (group_id, user_id) DO UPDATE SET share_cents = share_cents + excluded.share_cents;"""
+_SPLIT_GROUP = "(SELECT group_id FROM expenses WHERE id = {}.expense_id)"
+
+
+def _balance_triggers(amount_column, owed_column, to_cents="{}"):
+    """Ledger triggers for the given money columns; `to_cents` converts a column value to cents."""
+    amount = to_cents.replace("{}", "{}." + amount_column)  # e.g. amount.format("NEW")
+    owed = to_cents.replace("{}", "{}." + owed_column)
+    return [
+        f"""CREATE TRIGGER trg_expenses_insert_balance AFTER INSERT ON expenses BEGIN
+            {_PAY.format(group="NEW.group_id", user="NEW.payer_id", cents=amount.format("NEW"))}
+        END""",
+        f"""CREATE TRIGGER trg_expenses_update_balance AFTER UPDATE OF group_id, payer_id, {amount_column} ON expenses BEGIN
+            {_PAY.format(group="OLD.group_id", user="OLD.payer_id", cents="-" + amount.format("OLD"))}
+            {_PAY.format(group="NEW.group_id", user="NEW.payer_id", cents=amount.format("NEW"))}
+        END""",
+        f"""CREATE TRIGGER trg_expenses_delete_balance AFTER DELETE ON expenses BEGIN
+            {_PAY.format(group="OLD.group_id", user="OLD.payer_id", cents="-" + amount.format("OLD"))}
+        END""",
+        # Split triggers look up the expense's group, so splits must be deleted before their expense.
+        f"""CREATE TRIGGER trg_splits_insert_balance AFTER INSERT ON splits BEGIN
+            {_SHARE.format(group=_SPLIT_GROUP.format("NEW"), user="NEW.user_id", cents=owed.format("NEW"))}
+        END""",
+        f"""CREATE TRIGGER trg_splits_update_balance AFTER UPDATE OF expense_id, user_id, {owed_column} ON splits BEGIN
+            {_SHARE.format(group=_SPLIT_GROUP.format("OLD"), user="OLD.user_id", cents="-" + owed.format("OLD"))}
+            {_SHARE.format(group=_SPLIT_GROUP.format("NEW"), user="NEW.user_id", cents=owed.format("NEW"))}
+        END""",
+        f"""CREATE TRIGGER trg_splits_delete_balance AFTER DELETE ON splits BEGIN
+            {_SHARE.format(group=_SPLIT_GROUP.format("OLD"), user="OLD.user_id", cents="-" + owed.format("OLD"))}
+        END""",
+        # A settlement moves money from payer to receiver: it counts as paid for one, owed by the other.
+        f"""CREATE TRIGGER trg_settlements_insert_balance AFTER INSERT ON settlements BEGIN
+            {_PAY.format(group="NEW.group_id", user="NEW.payer_id", cents=amount.format("NEW"))}
+            {_SHARE.format(group="NEW.group_id", user="NEW.receiver_id", cents=amount.format("NEW"))}
+        END""",
+        f"""CREATE TRIGGER trg_settlements_delete_balance AFTER DELETE ON settlements BEGIN
+            {_PAY.format(group="OLD.group_id", user="OLD.payer_id", cents="-" + amount.format("OLD"))}
+            {_SHARE.format(group="OLD.group_id", user="OLD.receiver_id", cents="-" + amount.format("OLD"))}
+        END""",
+        """CREATE TRIGGER trg_group_members_insert_balance AFTER INSERT ON group_members BEGIN
+            INSERT OR IGNORE INTO member_balances (group_id, user_id) VALUES (NEW.group_id, NEW.user_id);
+        END""",
+    ]
+
+
+def _group_versions(conn):
+    # Bumped by every write that changes what a group's pages show; cached reads key on it.
+    # Splits always change together with an expense or a membership, so they need no trigger.
+    conn.execute("ALTER TABLE groups ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+    for trigger in _version_triggers():
+        conn.execute(trigger)
+
+
+def _version_triggers():
+    triggers = []
+    for table, events in (("expenses", ("INSERT", "UPDATE", "DELETE")),
+                          ("settlements", ("INSERT", "UPDATE", "DELETE")),
+                          ("group_members", ("INSERT", "DELETE"))):
+        for event in events:
+            rows = ("NEW",) if event == "INSERT" else ("OLD",) if event == "DELETE" else ("OLD", "NEW")
+            bumps = "".join(f"UPDATE groups SET version = version + 1 WHERE id = {row}.group_id;" for row in rows)
+            triggers.append(f"""CREATE TRIGGER trg_{table}_{event.lower()}_version AFTER {event} ON {table}
+                                BEGIN {bumps} END""")
+    return triggers
+
+
+def _integer_cents(conn):
+    # Money columns become INTEGER cents: amount -> amount_cents, owed -> owed_cents.
+    # SQLite cannot change a column's type in place, so each table is rebuilt and renamed.
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'").fetchall():
+        conn.execute(f"DROP TRIGGER {name}")
+
+    rebuilds = {
+        "expenses": ("""(id INTEGER PRIMARY KEY AUTOINCREMENT,
+                         group_id INTEGER,
+                         description TEXT,
+                         amount_cents INTEGER NOT NULL,
+                         payer_id INTEGER,
+                         date TEXT)""",
+                     "id, group_id, description, CAST(ROUND(amount * 100) AS INTEGER), payer_id, date"),
+        "splits": ("""(expense_id INTEGER,
+                       user_id INTEGER,
+                       owed_cents INTEGER NOT NULL,
+                       PRIMARY KEY (expense_id, user_id))""",
+                   "expense_id, user_id, CAST(ROUND(owed * 100) AS INTEGER)"),
+        "settlements": ("""(id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            group_id INTEGER,
+                            payer_id INTEGER,
+                            receiver_id INTEGER,
+                            amount_cents INTEGER NOT NULL,
+                            date TEXT)""",
+                        "id, group_id, payer_id, receiver_id, CAST(ROUND(amount * 100) AS INTEGER), date"),
+    }
+    for table, (columns, select) in rebuilds.items():
+        seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)).fetchone()
+        conn.execute(f"CREATE TABLE {table}_new {columns}")
+        conn.execute(f"INSERT INTO {table}_new SELECT {select} FROM {table}")
+        conn.execute(f"DROP TABLE {table}")
+        conn.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+        if seq:
+            conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = ?", (seq[0], table))
+
+    conn.execute("CREATE INDEX idx_expenses_group ON expenses (group_id, payer_id, amount_cents)")
+    conn.execute("CREATE INDEX idx_settlements_group ON settlements (group_id)")
+    for trigger in _balance_triggers("amount_cents", "owed_cents") + _version_triggers():
+        conn.execute(trigger)
+
+
+def _expense_history_index(conn):
+    # Keyset pagination of a group's history walks (date, id) newest first.
+    conn.execute("CREATE INDEX idx_expenses_history ON expenses (group_id, date DESC, id DESC)")
+
+
+def _event_log(conn):
+    # Append-only history of every group write, filled by triggers, plus ledger snapshots to
+    # replay it from (see events.py). Existing groups get a snapshot at event 0.
+    conn.execute("""CREATE TABLE events
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     group_id INTEGER NOT NULL,
+                     kind TEXT NOT NULL,
+                     payload TEXT NOT NULL,  -- JSON
+                     created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP)""")
+    conn.execute("CREATE INDEX idx_events_group ON events (group_id, id)")
+    conn.execute("""CREATE TABLE balance_snapshots
+                    (group_id INTEGER,
+                     event_id INTEGER,        -- last event of the group included in the snapshot
+                     user_id INTEGER,
+                     paid_cents INTEGER NOT NULL,
+                     share_cents INTEGER NOT NULL,
+                     is_member INTEGER NOT NULL,
+                     PRIMARY KEY (group_id, event_id, user_id)) WITHOUT ROWID""")
+    conn.execute("""
+        INSERT INTO balance_snapshots (group_id, event_id, user_id, paid_cents, share_cents, is_member)
+        SELECT mb.group_id, 0, mb.user_id, mb.paid_cents, mb.share_cents, gm.user_id IS NOT NULL
+        FROM member_balances mb
+        LEFT JOIN group_members gm ON gm.group_id = mb.group_id AND gm.user_id = mb.user_id
+    """)
+    for trigger in _event_triggers():
+        conn.execute(trigger)
+
+
+_EXPENSE_JSON = ("json_object('id', {0}.id, 'description', {0}.description, 'amount_cents', {0}.amount_cents, "
+                 "'payer_id', {0}.payer_id, 'date', {0}.date)")
+_SETTLEMENT_JSON = ("json_object('id', {0}.id, 'payer_id', {0}.payer_id, 'receiver_id', {0}.receiver_id, "
+                    "'amount_cents', {0}.amount_cents, 'date', {0}.date)")
+
+
+def _event_triggers():
+    events = [
+        ("expenses", "INSERT", "expense_added", "NEW", _EXPENSE_JSON.format("NEW")),
+        ("expenses", "UPDATE", "expense_edited", "NEW",
+         f"json_object('old', {_EXPENSE_JSON.format('OLD')}, 'new', {_EXPENSE_JSON.format('NEW')})"),
+        ("expenses", "DELETE", "expense_deleted", "OLD", _EXPENSE_JSON.format("OLD")),
+        ("settlements", "INSERT", "settlement_recorded", "NEW", _SETTLEMENT_JSON.format("NEW")),
+        ("settlements", "DELETE", "settlement_deleted", "OLD", _SETTLEMENT_JSON.format("OLD")),
+        ("group_members", "INSERT", "member_joined", "NEW", "json_object('user_id', NEW.user_id)"),
+        ("group_members", "DELETE", "member_left", "OLD", "json_object('user_id', OLD.user_id)"),
+    ]
+    return [f"""CREATE TRIGGER trg_{table}_{event.lower()}_event AFTER {event} ON {table} BEGIN
+                INSERT INTO events (group_id, kind, payload) VALUES ({row}.group_id, '{kind}', {payload});
+            END""" for table, event, kind, row, payload in events]
+
+
+def _settlement_pair_index(conn):
+    # Payments between two members are looked up by (group, payer, receiver); the group prefix
+    # still serves the per-group scans the old index was for.
+    conn.execute("DROP INDEX IF EXISTS idx_settlements_group")
+    conn.execute("CREATE INDEX idx_settlements_pair ON settlements (group_id, payer_id, receiver_id)")
+
+
+def _foreign_keys(conn):
+    # Memberships, expenses, splits and settlements reference their group and users, so rows
+    # can no longer point at a group or user that does not exist. Deleting a group removes
+    # everything in it; deleting a user removes their memberships and shares, but not while
+    # they still have expenses or payments on record. Rows that were already orphaned are
+    # dropped, and the ledger is recomputed from what is left.
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'").fetchall():
+        conn.execute(f"DROP TRIGGER {name}")
+
+    rebuilds = {  # parents before the tables that reference them
+        "group_members": ("""(group_id INTEGER REFERENCES groups (id) ON DELETE CASCADE,
+                              user_id INTEGER REFERENCES users (id) ON DELETE CASCADE,
+                              PRIMARY KEY (group_id, user_id))""",
+                          "group_id IN (SELECT id FROM groups) AND user_id IN (SELECT id FROM users)"),
+        "expenses": ("""(id INTEGER PRIMARY KEY AUTOINCREMENT,
+                         group_id INTEGER NOT NULL REFERENCES groups (id) ON DELETE CASCADE,
+                         description TEXT,
+                         amount_cents INTEGER NOT NULL,
+                         payer_id INTEGER NOT NULL REFERENCES users (id),
+                         date TEXT)""",
+                     "group_id IN (SELECT id FROM groups) AND payer_id IN (SELECT id FROM users)"),
+        "splits": ("""(expense_id INTEGER REFERENCES expenses (id) ON DELETE CASCADE,
+                       user_id INTEGER REFERENCES users (id) ON DELETE CASCADE,
+                       owed_cents INTEGER NOT NULL,
+                       PRIMARY KEY (expense_id, user_id))""",
+                   "expense_id IN (SELECT id FROM expenses) AND user_id IN (SELECT id FROM users)"),
+        "settlements": ("""(id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            group_id INTEGER NOT NULL REFERENCES groups (id) ON DELETE CASCADE,
+                            payer_id INTEGER NOT NULL REFERENCES users (id),
+                            receiver_id INTEGER NOT NULL REFERENCES users (id),
+                            amount_cents INTEGER NOT NULL,
+                            date TEXT)""",
+                        "group_id IN (SELECT id FROM groups) AND payer_id IN (SELECT id FROM users) "
+                        "AND receiver_id IN (SELECT id FROM users)"),
+    }
+    for table, (columns, keep) in rebuilds.items():
+        seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)).fetchone()
+        conn.execute(f"CREATE TABLE {table}_new {columns}")
+        conn.execute(f"INSERT INTO {table}_new SELECT * FROM {table} WHERE {keep}")
+        conn.execute(f"DROP TABLE {table}")
+        conn.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+        if seq:
+            conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = ?", (seq[0], table))
+
+    conn.execute("CREATE INDEX idx_group_members_user ON group_members (user_id, group_id)")
+    conn.execute("CREATE INDEX idx_expenses_group ON expenses (group_id, payer_id, amount_cents)")
+    conn.execute("CREATE INDEX idx_expenses_history ON expenses (group_id, date DESC, id DESC)")
+    conn.execute("CREATE INDEX idx_settlements_pair ON settlements (group_id, payer_id, receiver_id)")
+
+    conn.execute("DELETE FROM member_balances")
+    conn.execute("""
+        INSERT INTO member_balances (group_id, user_id, paid_cents, share_cents)
+        SELECT group_id, user_id, SUM(paid), SUM(share) FROM (
+            SELECT group_id, user_id, 0 AS paid, 0 AS share FROM group_members
+            UNION ALL
+            SELECT group_id, payer_id, amount_cents, 0 FROM expenses
+            UNION ALL
+            SELECT e.group_id, s.user_id, 0, s.owed_cents FROM splits s JOIN expenses e ON e.id = s.expense_id
+            UNION ALL
+            SELECT group_id, payer_id, amount_cents, 0 FROM settlements
+            UNION ALL
+            SELECT group_id, receiver_id, 0, amount_cents FROM settlements
+        )
+        GROUP BY group_id, user_id
+    """)
+    conn.execute("""
+        INSERT OR REPLACE INTO balance_snapshots (group_id, event_id, user_id, paid_cents, share_cents, is_member)
+        SELECT mb.group_id, (SELECT COALESCE(MAX(id), 0) FROM events WHERE group_id = mb.group_id),
+               mb.user_id, mb.paid_cents, mb.share_cents, gm.user_id IS NOT NULL
+        FROM member_balances mb
+        LEFT JOIN group_members gm ON gm.group_id = mb.group_id AND gm.user_id = mb.user_id
+    """)
+
+    for trigger in (_balance_triggers("amount_cents", "owed_cents") + _version_triggers()
+                    + _event_triggers() + _cascade_triggers()):
+        conn.execute(trigger)
+
+
+def _cascade_triggers():
+    # Cascaded child rows are deleted after their parent is gone, when the split triggers could
+    # no longer find the expense's group. Removing an expense's splits first keeps the ledger
+    # right whichever way the expense goes; a deleted group's ledger rows go last.
+    return [
+        """CREATE TRIGGER trg_expenses_delete_splits BEFORE DELETE ON expenses BEGIN
+            DELETE FROM splits WHERE expense_id = OLD.id;
+        END""",
+        """CREATE TRIGGER trg_groups_delete_balances AFTER DELETE ON groups BEGIN
+            DELETE FROM member_balances WHERE group_id = OLD.id;
+        END""",
+    ]
+
+
+def _expense_search(conn):
+    # Full-text index over expense descriptions. It reads its content from `expenses` and
+    # also indexes group_id as a token, so "this group AND these words" is answered inside
+    # FTS instead of matching every group's expenses and filtering afterwards.
+    conn.execute("""CREATE VIRTUAL TABLE expenses_fts USING fts5
+                    (description, group_id, content='expenses', content_rowid='id',
+                     prefix='2 3', tokenize='unicode61 remove_diacritics 2')""")
+    conn.execute("INSERT INTO expenses_fts (expenses_fts) VALUES ('rebuild')")
+    for trigger in _search_triggers(("description", "group_id")):
+        conn.execute(trigger)
+
+
+def _search_triggers(columns=("description",)):
+    """Triggers keeping expenses_fts in step with `columns` of expenses."""
+    names = ", ".join(columns)
+    delete = (f"INSERT INTO expenses_fts (expenses_fts, rowid, {names}) "
+              f"VALUES ('delete', OLD.id, {', '.join('OLD.' + c for c in columns)});")
+    insert = f"INSERT INTO expenses_fts (rowid, {names}) VALUES (NEW.id, {', '.join('NEW.' + c for c in columns)});"
+    return [
+        f"CREATE TRIGGER trg_expenses_insert_search AFTER INSERT ON expenses BEGIN {insert} END",
+        f"CREATE TRIGGER trg_expenses_update_search AFTER UPDATE OF {names} ON expenses BEGIN {delete} {insert} END",
+        f"CREATE TRIGGER trg_expenses_delete_search AFTER DELETE ON expenses BEGIN {delete} END",
+    ]
+
+
+def _monthly_spending(conn):
+    # What each member paid per calendar month, kept up to date by triggers so analytics never
+    # rescan the history. The month key is cut from the ISO date once, when the row is written.
+    conn.execute("""CREATE TABLE monthly_spending
+                    (group_id INTEGER,
+                     user_id INTEGER,
+                     month TEXT,                              -- 'YYYY-MM'
+                     total_cents INTEGER NOT NULL DEFAULT 0,
+                     count INTEGER NOT NULL DEFAULT 0,
+                     PRIMARY KEY (group_id, month, user_id)) WITHOUT ROWID""")
+    conn.execute("""
+        INSERT INTO monthly_spending (group_id, user_id, month, total_cents, count)
+        SELECT group_id, payer_id, substr(date, 1, 7), SUM(amount_cents), COUNT(*)
+        FROM expenses
+        GROUP BY group_id, payer_id, substr(date, 1, 7)
+    """)
+    for trigger in _spending_triggers():
+        conn.execute(trigger)
+
+
+_SPEND = """INSERT INTO monthly_spending (group_id, user_id, month, total_cents, count)
+            VALUES ({row}.group_id, {row}.payer_id, substr({row}.date, 1, 7), {sign}{row}.amount_cents, {sign}1)
+            ON CONFLICT (group_id, month, user_id) DO UPDATE
+            SET total_cents = total_cents + excluded.total_cents, count = count + excluded.count;"""
+_UNSPEND = _SPEND.format(row="OLD", sign="-") + """
+            DELETE FROM monthly_spending
+            WHERE group_id = OLD.group_id AND month = substr(OLD.date, 1, 7) AND user_id = OLD.payer_id AND count = 0;"""
+
+
+def _spending_triggers():
+    return [
+        f"""CREATE TRIGGER trg_expenses_insert_spending AFTER INSERT ON expenses BEGIN
+            {_SPEND.format(row="NEW", sign="")}
+        END""",
+        f"""CREATE TRIGGER trg_expenses_update_spending AFTER UPDATE OF group_id, payer_id, amount_cents, date
+            ON expenses BEGIN
+            {_UNSPEND}
+            {_SPEND.format(row="NEW", sign="")}
+        END""",
+        f"""CREATE TRIGGER trg_expenses_delete_spending AFTER DELETE ON expenses BEGIN
+            {_UNSPEND}
+        END""",
+        """CREATE TRIGGER trg_groups_delete_spending AFTER DELETE ON groups BEGIN
+            DELETE FROM monthly_spending WHERE group_id = OLD.id;
+        END""",
+    ]
+
+
+def _search_without_group_token(conn):
+    # Matching "group_id : N AND words" intersected the words with every row of the group, so
+    # common words cost a pass over a large group's whole posting list. Searches now join the
+    # index's matches to expenses by rowid instead (see database.search_expenses), and the
+    # group_id column goes. expenses_fts_vocab exposes per-term document counts, which tell
+    # the search how much an index lookup would read before it runs one.
+    for trigger in ("insert", "update", "delete"):
+        conn.execute(f"DROP TRIGGER trg_expenses_{trigger}_search")
+    conn.execute("DROP TABLE expenses_fts")
+    conn.execute("""CREATE VIRTUAL TABLE expenses_fts USING fts5
+                    (description, content='expenses', content_rowid='id',
+                     prefix='2 3', tokenize='unicode61 remove_diacritics 2')""")
+    conn.execute("INSERT INTO expenses_fts (expenses_fts) VALUES ('rebuild')")
+    conn.execute("CREATE VIRTUAL TABLE expenses_fts_vocab USING fts5vocab (expenses_fts, 'row')")
+    for trigger in _search_triggers():
+        conn.execute(trigger)
+
+
+def _shard_directory(conn):
+    # Files holding the groups' rows in sharded mode, written by reshard.py; empty (the
+    # default) means everything is in this file. Paths are relative to this file's directory.
+    conn.execute("""CREATE TABLE shards
+                    (shard INTEGER PRIMARY KEY,
+                     path TEXT NOT NULL)""")
+
+
+def _directory_membership_triggers(conn):
+    # In sharded mode the main file's group_members is only the directory: the ledger and event
+    # rows of a membership belong in the group's shard, whose own triggers write them. The main
+    # file's membership triggers therefore stand down while it lists shards, and the rows they
+    # already left there are dropped. Shard files have an empty `shards` table, so theirs still fire.
+    directory_only = "WHEN NOT EXISTS (SELECT 1 FROM shards)"
+    conn.execute("DROP TRIGGER trg_group_members_insert_balance")
+    conn.execute(f"""CREATE TRIGGER trg_group_members_insert_balance AFTER INSERT ON group_members {directory_only} BEGIN
+        INSERT OR IGNORE INTO member_balances (group_id, user_id) VALUES (NEW.group_id, NEW.user_id);
+    END""")
+    for trigger in _event_triggers():
+        name = trigger.split()[2]
+        if name.startswith("trg_group_members_"):
+            conn.execute(f"DROP TRIGGER {name}")
+            conn.execute(trigger.replace(" BEGIN", f" {directory_only} BEGIN", 1))
+    conn.execute("DELETE FROM member_balances WHERE EXISTS (SELECT 1 FROM shards)")
+    conn.execute("DELETE FROM events WHERE EXISTS (SELECT 1 FROM shards)")
+
+
+MIGRATIONS = [
+    _initial_schema,
+    _repair_blob_ids,
+    _read_path_indexes,
+    _member_balances,
+    _group_versions,
+    _integer_cents,
+    _expense_history_index,
+    _event_log,
+    _settlement_pair_index,
+    _foreign_keys,
+    _expense_search,
+    _monthly_spending,
+    _shard_directory,
+    _directory_membership_triggers,
+    _search_without_group_token,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate(conn, target=SCHEMA_VERSION):
+    """Apply pending migrations up to `target` on an autocommit connection. Returns the new version."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    while version < target:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have migrated while we waited for the write lock
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < target:
+                MIGRATIONS[version](conn)
+                version += 1
+                conn.execute(f"PRAGMA user_version = {version}")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    return version
+
+
+_migrated = set()
+_lock = threading.Lock()
+
+
+def ensure_schema(conn, path):
+    """Migrate `path` the first time this process touches it; later calls are free."""
+    if path in _migrated:
+        return
+    with _lock:
+        if path not in _migrated:
+            migrate(conn)
+            _migrated.add(path)
+
+
+def init_db():
+    # Pure sqlite3: login.py runs this through auth without loading pandas
+    pool = get_pool()
+    with connection() as conn:
+        ensure_schema(conn, pool.path)
+        names = [row[0] for row in conn.execute("SELECT path FROM shards ORDER BY shard")]
+    paths = [os.path.join(os.path.dirname(os.path.abspath(pool.path)), name) for name in names]
+    for path in paths:
+        with connection(path) as conn:
+            ensure_schema(conn, path)
+    set_shards(paths)
+    backup.schedule()  # no-op unless SPLITFREE_BACKUP_DIR is set
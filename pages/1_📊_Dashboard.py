@@ -1,6 +1,9 @@
 import streamlit as st
-from database import get_user_groups
-from utils import calculate_balances
+from datetime import date
+from database import record_settlements
+from utils import calculate_balances_for_user, cross_group_plan
+import export
+from instrument import start_page, debug_panel
 
 # Security: Redirect to login if not logged in
 if "user_id" not in st.session_state:
@@ -13,39 +16,37 @@ if st.sidebar.button("Logout"):
     st.session_state.clear()
     st.switch_page("login.py")
 
+start_page("Dashboard")
 st.title("📊 Dashboard")
 
-# Fetch user's groups
-groups = get_user_groups(st.session_state.user_id)
+# Balances for every member of every group the user is in, from a single query
+all_balances = calculate_balances_for_user(st.session_state.user_id)
 
-if groups.empty:
+if all_balances.empty:
     st.info("👋 Welcome! You don't have any groups yet.")
     st.write("Go to the **Groups** page to create your first group or join one with an invite code.")
 else:
-    st.success(f"You are in {len(groups)} group(s)!")
-    total_balance = 0.0
-
-    for _, group in groups.iterrows():
-        with st.expander(f"🏠 {group['name']}", expanded=False):
-            balances = calculate_balances(group['id'])
-            if balances.empty:
-                st.write("No expenses yet in this group.")
-            else:
-                # Show balances table
-                styled = balances.style.format({"balance": "${:.2f}"})
-                st.dataframe(styled)
-
-                # Your personal balance in this group
-                your_row = balances[balances['name'] == st.session_state.name]
-                if not your_row.empty:
-                    your_balance = your_row['balance'].iloc[0]
-                    total_balance += your_balance
-                    if your_balance > 0:
-                        st.success(f"You are owed ${your_balance:.2f} in this group")
-                    elif your_balance < 0:
-                        st.error(f"You owe ${abs(your_balance):.2f} in this group")
-                    else:
-                        st.info("You're all settled in this group!")
+    yours = all_balances[all_balances['user_id'] == st.session_state.user_id]
+    st.success(f"You are in {len(yours)} group(s)!")
+    total_balance = yours['balance_cents'].sum() / 100
+    your_balances = dict(zip(yours['group_id'], yours['balance']))
+
+    for (group_id, group_name), balances in all_balances.groupby(['group_id', 'group_name'], sort=False):
+        with st.expander(f"🏠 {group_name}", expanded=False):
+            # Show balances table
+            balances = balances[['member', 'balance']].rename(columns={'member': 'name'})
+            styled = balances.style.format({"balance": "${:.2f}"})
+            st.dataframe(styled)
+
+            # Your personal balance in this group
+            if group_id in your_balances:
+                your_balance = your_balances[group_id]
+                if your_balance > 0:
+                    st.success(f"You are owed ${your_balance:.2f} in this group")
+                elif your_balance < 0:
+                    st.error(f"You owe ${abs(your_balance):.2f} in this group")
+                else:
+                    st.info("You're all settled in this group!")
 
     # Overall total
     st.markdown("---")
@@ -57,5 +58,34 @@ else:
         st.balloons()
         st.success("🎊 You're perfectly settled across all groups!")
 
+    # One payment per person instead of one per person per group
+    plan = cross_group_plan(st.session_state.user_id)
+    if plan:
+        names = dict(zip(all_balances['user_id'], all_balances['member']))
+        group_names = dict(zip(all_balances['group_id'], all_balances['group_name']))
+        with st.expander("💸 Settle up across all groups at once"):
+            for payment in plan:
+                if payment.cents == 0:
+                    st.info(f"↔ Your debts with **{names[payment.payer if payment.payer != st.session_state.user_id else payment.receiver]}** cancel out")
+                else:
+                    st.warning(f"→ **{names[payment.payer]}** pays **{names[payment.receiver]}** ${payment.cents / 100:.2f}")
+                st.caption(" · ".join(f"{group_names[t.group_id]}: {names[t.payer]} → {names[t.receiver]} ${t.cents / 100:.2f}"
+                                      for t in payment.allocations))
+            if st.button("Record these payments in every group"):
+                record_settlements([t for payment in plan for t in payment.allocations], date.today().isoformat())
+                st.success("Payments recorded!")
+                st.rerun()
+
+    with st.expander("📤 Download your history"):
+        st.caption("Every expense and settlement in all your groups, with your share of each expense.")
+        export_format = st.radio("Format", list(export.FORMATS), horizontal=True, key="export_user_format",
+                                 format_func=lambda f: export.FORMATS[f][0])
+        st.download_button("📤 Download",
+                           data=lambda u=st.session_state.user_id, f=export_format: b"".join(export.stream("user", u, f)),
+                           file_name=export.file_name(st.session_state.username, export_format),
+                           mime=export.FORMATS[export_format][2], on_click="ignore")
+
 st.markdown("---")
-st.caption("Next steps: Create a group → Invite friends → Add expenses → Settle up!")
\ No newline at end of file
+st.caption("Next steps: Create a group → Invite friends → Add expenses → Settle up!")
+
+debug_panel()
@@ -1,13 +1,11 @@
 import streamlit as st
-import sqlite3
-import random
-import string
-import pandas as pd
-from database import DB_FILE, get_user_groups
+from database import get_user_groups, create_group, join_group_by_code
+from instrument import start_page, debug_panel
 
 if "user_id" not in st.session_state:
     st.switch_page("login.py")
 
+start_page("Groups")
 st.title("👥 Groups")
 
 col1, col2 = st.columns(2)
@@ -20,16 +18,8 @@ with col1:
             if not group_name.strip():
                 st.error("Enter a name!")
             else:
-                invite_code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
-                conn = sqlite3.connect(DB_FILE)
-                c = conn.cursor()
-                c.execute("INSERT INTO groups (name, creator_id, invite_code) VALUES (?, ?, ?)",
-                          (group_name, st.session_state.user_id, invite_code))
-                group_id = c.lastrowid
-                c.execute("INSERT OR IGNORE INTO group_members (group_id, user_id) VALUES (?, ?)",
-                          (group_id, st.session_state.user_id))
-                conn.commit()
-                conn.close()
+                group_id = create_group(group_name, st.session_state.user_id)
+                invite_code = get_user_groups(st.session_state.user_id).set_index("id").at[group_id, "invite_code"]
                 st.success(f"Created **{group_name}**!")
                 st.info(f"Invite Code: `{invite_code}`")
                 st.balloons()
@@ -43,23 +33,16 @@ with col2:
             if not invite_code:
                 st.error("Enter code")
             else:
-                conn = sqlite3.connect(DB_FILE)
-                c = conn.cursor()
-                c.execute("SELECT id, name FROM groups WHERE invite_code = ?", (invite_code,))
-                row = c.fetchone()
-                if row:
-                    group_id, g_name = row
-                    try:
-                        c.execute("INSERT OR IGNORE INTO group_members (group_id, user_id) VALUES (?, ?)",
-                                  (group_id, st.session_state.user_id))
-                        conn.commit()
+                joined = join_group_by_code(invite_code, st.session_state.user_id)
+                if joined:
+                    group_id, g_name, added = joined
+                    if added:
                         st.success(f"Joined **{g_name}**!")
                         st.rerun()
-                    except sqlite3.IntegrityError:
+                    else:
                         st.info("Already in this group")
                 else:
                     st.error("Invalid code")
-                conn.close()
 
 # --- Your Groups with Group Code ---
 st.markdown("---")
@@ -70,16 +53,8 @@ groups = get_user_groups(st.session_state.user_id)
 if groups.empty:
     st.info("No groups yet — create one or join using a code!")
 else:
-    # Fetch invite codes
-    conn = sqlite3.connect(DB_FILE)
-    codes_df = pd.read_sql("SELECT id, invite_code FROM groups", conn)
-    conn.close()
-
-    # Merge with groups
-    groups_with_code = groups.merge(codes_df, on="id", how="left")
-
-    # Display table
-    display_df = groups_with_code[["name", "invite_code"]].copy()
+    # Invite codes come with the user's groups, from the same indexed query
+    display_df = groups[["name", "invite_code"]].copy()
     display_df = display_df.rename(columns={
         "name": "Group Name",
         "invite_code": "Group Code"
@@ -92,11 +67,10 @@ st.markdown("---")
 st.subheader("📩 Invite Members to a Group")
 
 if not groups.empty:
-    # Use the same groups_with_code DataFrame for consistency
-    selected_group_name = st.selectbox("Choose group to invite to", groups_with_code["name"], key="invite_group_select")
+    selected_group_name = st.selectbox("Choose group to invite to", groups["name"], key="invite_group_select")
     
     # Get the row for the selected group
-    selected_row = groups_with_code[groups_with_code["name"] == selected_group_name].iloc[0]
+    selected_row = groups[groups["name"] == selected_group_name].iloc[0]
     current_invite_code = selected_row["invite_code"]
 
     # Show code
@@ -116,4 +90,6 @@ if not groups.empty:
 else:
     st.info("Create a group first to start inviting members!")
 
-st.caption("Group codes are permanent and unique — safe to share freely!")
\ No newline at end of file
+st.caption("Group codes are permanent and unique — safe to share freely!")
+
+debug_panel()
@@ -1,13 +1,19 @@
 import streamlit as st
-import sqlite3
 from datetime import date
 import pandas as pd
-from database import DB_FILE, get_user_groups, get_group_members, get_group_expenses
+import numpy as np
+from splitting import to_cents
+from importer import preview_import, import_csv
+import export
+from database import (get_user_groups, get_group_members, get_expense_page, search_expenses, get_group_balances,
+                      EXPENSE_PAGE_SIZE, add_expense, update_expense, delete_expense)
+from instrument import start_page, debug_panel
 
 # Security
 if "user_id" not in st.session_state:
     st.switch_page("login.py")
 
+start_page("Add Expense")
 st.title("➕ Add Expense")
 
 groups = get_user_groups(st.session_state.user_id)
@@ -17,14 +23,7 @@ if groups.empty:
 
 # Select group
 group_name = st.selectbox("Select Group", options=groups["name"].tolist())
-group_id = groups[groups["name"] == group_name]["id"].iloc[0]
-
-# Safety net: Ensure current user is member
-conn = sqlite3.connect(DB_FILE)
-conn.execute("INSERT OR IGNORE INTO group_members (group_id, user_id) VALUES (?, ?)",
-             (group_id, st.session_state.user_id))
-conn.commit()
-conn.close()
+group_id = int(groups[groups["name"] == group_name]["id"].iloc[0])
 
 # Get current members
 members = get_group_members(group_id)
@@ -57,155 +56,182 @@ with st.form("add_expense_form", clear_on_submit=True):
             st.error("Amount must be positive")
         else:
             payer_id = name_to_id[payer_name]
-            conn = sqlite3.connect(DB_FILE)
-            c = conn.cursor()
-            c.execute("""
-                INSERT INTO expenses (group_id, description, amount, payer_id, date)
-                VALUES (?, ?, ?, ?, ?)
-            """, (group_id, description, amount, payer_id, expense_date.isoformat()))
-            expense_id = c.lastrowid
-            num_members = len(members)
-            if num_members > 1:
-                share = round(amount / num_members, 2)
-                for _, member in members.iterrows():
-                    if member["id"] != payer_id:
-                        c.execute("INSERT INTO splits (expense_id, user_id, owed) VALUES (?, ?, ?)",
-                                  (expense_id, member["id"], share))
-            conn.commit()
-            conn.close()
+            add_expense(group_id, description, to_cents(amount), payer_id, expense_date.isoformat())
             st.success(f"Added **{description}** – ${amount:.2f}")
             st.balloons()
             st.rerun()
 
+# BULK IMPORT
+with st.expander("📥 Import expenses from CSV"):
+    st.caption("Columns: Date, Description, Amount and optionally Paid By (a member's name). "
+               "Rows without a payer are recorded as paid by you.")
+    upload = st.file_uploader("CSV file", type=["csv"], key="import_file")
+    if upload is not None:
+        col_preview, col_import = st.columns(2)
+        try:
+            if col_preview.button("🔍 Preview (dry run)", use_container_width=True):
+                preview = preview_import(upload, group_id, st.session_state.user_id)
+                st.write(f"**{preview.valid:,}** of {preview.rows:,} rows are ready to import.")
+                if not preview.sample.empty:
+                    sample = preview.sample.assign(paid_by=preview.sample['payer_id'].map(id_to_name),
+                                                   amount=preview.sample['amount_cents'] / 100)
+                    st.dataframe(sample[['date', 'description', 'amount', 'paid_by']],
+                                 hide_index=True, use_container_width=True)
+                if not preview.errors.empty:
+                    st.warning(f"{len(preview.errors):,} rows will be skipped:")
+                    st.dataframe(preview.errors, hide_index=True, use_container_width=True)
+            if col_import.button("📥 Import", type="primary", use_container_width=True):
+                with st.spinner("Importing..."):
+                    result = import_csv(upload, group_id, st.session_state.user_id)
+                st.success(f"Imported **{result.imported:,}** expenses in {result.seconds:.1f}s "
+                           f"({result.rows - result.imported:,} rows skipped)")
+        except ValueError as e:
+            st.error(str(e))
+
+# EXPORT: built from a streaming cursor only when the button is clicked, not on every rerun
+with st.expander("📤 Export this group's history"):
+    st.caption("Every expense and settlement, oldest first. CSV exports can be imported into another group.")
+    export_format = st.radio("Format", list(export.FORMATS), horizontal=True, key="export_group_format",
+                             format_func=lambda f: export.FORMATS[f][0])
+    st.download_button("📤 Download", data=lambda g=group_id, f=export_format: b"".join(export.stream("group", g, f)),
+                       file_name=export.file_name(group_name, export_format), mime=export.FORMATS[export_format][2],
+                       on_click="ignore")
+
 # EXPENSES HISTORY TABLE
 st.markdown("---")
 st.subheader(f"📜 Expenses in **{group_name}** (Equal Sharing Among All Current Members)")
 
-expenses_df = get_group_expenses(group_id)
-if expenses_df.empty:
-    st.info("No expenses yet. Add one above!")
+# SEARCH: text matches descriptions (any word prefix), filters narrow it down
+search_text = st.text_input("🔎 Search expenses", placeholder="e.g. uber march, dinner", key=f"search_{group_id}").strip()
+with st.expander("Filters"):
+    fcol1, fcol2 = st.columns(2)
+    date_range = fcol1.date_input("Date range", value=(), key=f"search_dates_{group_id}")
+    payer_filter = fcol2.selectbox("Paid by", options=[None] + sorted(id_to_name), key=f"search_payer_{group_id}",
+                                   format_func=lambda m: "Anyone" if m is None else id_to_name[m])
+    fcol3, fcol4 = st.columns(2)
+    min_amount = fcol3.number_input("Min amount ($)", min_value=0.0, value=None, step=1.0, key=f"search_min_{group_id}")
+    max_amount = fcol4.number_input("Max amount ($)", min_value=0.0, value=None, step=1.0, key=f"search_max_{group_id}")
+
+filters = {
+    "text": search_text,
+    "start": date_range[0].isoformat() if len(date_range) == 2 else None,
+    "end": date_range[1].isoformat() if len(date_range) == 2 else None,
+    "payer_id": payer_filter,
+    "min_cents": to_cents(min_amount) if min_amount is not None else None,
+    "max_cents": to_cents(max_amount) if max_amount is not None else None,
+}
+searching = any(value for value in filters.values())
+
+if searching:
+    # Ranked results page by offset; a new search starts again from the top
+    offset_key = f"search_offset_{group_id}"
+    if st.session_state.get(f"search_filters_{group_id}") != filters:
+        st.session_state[f"search_filters_{group_id}"] = filters
+        st.session_state[offset_key] = 0
+    offset = st.session_state[offset_key]
+    page_df = search_expenses(group_id, st.session_state.user_id, limit=EXPENSE_PAGE_SIZE, offset=offset, **filters)
+    first_page, page_number = offset == 0, offset // EXPENSE_PAGE_SIZE + 1
 else:
-    # One row per expense
-    expenses_clean = expenses_df.groupby('id').agg({
-        'date': 'first',
-        'description': 'first',
-        'amount': 'first',
-        'payer_id': 'first'
-    }).reset_index()
-
-    expenses_clean['paid_by'] = expenses_clean['payer_id'].map(id_to_name)
-
-    current_num_members = len(members)
-    expenses_clean['fair_share'] = (expenses_clean['amount'] / current_num_members).round(2)
-
-    current_user_id = st.session_state.user_id
-    expenses_clean['your_fair_net'] = expenses_clean.apply(
-        lambda row: row['amount'] - row['fair_share'] if row['payer_id'] == current_user_id else -row['fair_share'],
-        axis=1
-    )
-
-    display_df = expenses_clean[['date', 'description', 'amount', 'paid_by', 'your_fair_net']].copy()
-    display_df = display_df.rename(columns={
-        'date': 'Date',
-        'description': 'Expense',
-        'amount': 'Total Spent',
-        'paid_by': 'Paid By',
-        'your_fair_net': 'Your Fair Share'
+    # Keyset pagination: the (date, id) of the last row of every page seen so far
+    cursor_key = f"history_cursors_{group_id}"
+    cursors = st.session_state.setdefault(cursor_key, [None])
+    page_df = get_expense_page(group_id, st.session_state.user_id, cursors[-1])
+    if page_df.empty and len(cursors) > 1:  # the page emptied under us (deletes), go back to the start
+        cursors[:] = [None]
+        page_df = get_expense_page(group_id, st.session_state.user_id)
+    first_page, page_number = len(cursors) == 1, len(cursors)
+
+if page_df.empty:
+    st.info("No expenses match your search." if searching else "No expenses yet. Add one above!")
+else:
+    paid_by_you = (page_df['payer_id'] == st.session_state.user_id).to_numpy()
+    net = (page_df['amount_cents'].to_numpy() * paid_by_you - page_df['share_cents'].to_numpy()) / 100
+    net_text = pd.Series(net).abs().map("${:.2f}".format)
+
+    display_df = pd.DataFrame({
+        'Date': page_df['date'].str[5:7] + '/' + page_df['date'].str[8:10] + '/' + page_df['date'].str[:4],  # ISO text
+        'Expense': page_df['description'],
+        'Total Spent': (page_df['amount_cents'] / 100).map("${:.2f}".format),
+        'Paid By': page_df['payer_id'].map(id_to_name),
+        'Your Fair Share': np.select([net > 0, net < 0],
+                                     ["**+" + net_text + "** (Lent)", "**-" + net_text + "** (Borrowed)"],
+                                     "$0.00"),
     })
-    display_df['Total Spent'] = display_df['Total Spent'].map("${:.2f}".format)
-    display_df['Your Fair Share'] = display_df['Your Fair Share'].map(
-        lambda x: f"**+${x:.2f}** (Lent)" if x > 0 else f"**${x:.2f}** (Borrowed)" if x < 0 else "$0.00"
-    )
-    display_df['Date'] = pd.to_datetime(display_df['Date']).dt.strftime('%m/%d/%Y')
-    display_df = display_df.sort_values("Date", ascending=False)
-
-    def color_share(val):
-        if "(Lent)" in val:
-            return "color: green; font-weight: bold"
-        elif "(Borrowed)" in val:
-            return "color: red; font-weight: bold"
-        return ""
-
-    styled = display_df.style.applymap(color_share, subset=['Your Fair Share'])
+    share_colors = np.select([net > 0, net < 0],
+                             ["color: green; font-weight: bold", "color: red; font-weight: bold"], "")
+    styled = display_df.style.apply(lambda _: share_colors, subset=['Your Fair Share'])
     st.dataframe(styled, use_container_width=True, hide_index=True)
 
+    col_newer, col_page, col_older = st.columns([1, 2, 1])
+    if col_newer.button("← Previous" if searching else "← Newer", disabled=first_page, use_container_width=True):
+        if searching:
+            st.session_state[offset_key] -= EXPENSE_PAGE_SIZE
+        else:
+            cursors.pop()
+        st.rerun()
+    col_page.caption(f"{'Results page' if searching else 'Page'} {page_number}")
+    if col_older.button("Next →" if searching else "Older →", disabled=len(page_df) < EXPENSE_PAGE_SIZE,
+                        use_container_width=True):
+        if searching:
+            st.session_state[offset_key] += EXPENSE_PAGE_SIZE
+        else:
+            last = page_df.iloc[-1]
+            cursors.append((last['date'], int(last['id'])))
+        st.rerun()
+
     # === ACTIONS SECTION BELOW THE TABLE ===
-    st.markdown("---")
-    st.subheader("✏️ Actions (Edit / Delete)")
-
-    # Show each expense with edit/delete buttons if user is the payer
-    for _, exp in expenses_clean.iterrows():
-        expense_id = exp['id']
-        if exp['payer_id'] == st.session_state.user_id:  # Only payer can act
-            with st.expander(f"📝 {exp['description']} – ${exp['amount']:.2f} (Paid by you on {exp['date']})"):
-                col_edit, col_delete = st.columns([3, 1])
-
-                with col_edit:
-                    with st.form(key=f"edit_form_{expense_id}"):
-                        col1, col2 = st.columns([2, 1])
-                        with col1:
-                            new_desc = st.text_input("Description", value=exp['description'])
-                        with col2:
-                            new_amount = st.number_input("Amount ($)", min_value=0.01, step=0.01,
-                                              value=float(exp['amount']), format="%.2f")
-                        col3, col4 = st.columns(2)
-                        with col3:
-                            new_payer_name = st.selectbox("Who paid?", options=member_names,
-                                                          index=member_names.index(id_to_name[exp['payer_id']]))
-                        with col4:
-                            new_date = st.date_input("Date", value=pd.to_datetime(exp['date']))
-
-                        if st.form_submit_button("💾 Save Changes", use_container_width=True):
-                            if not new_desc.strip():
-                                st.error("Description required")
-                            elif new_amount <= 0:
-                                st.error("Amount must be positive")
-                            else:
-                                new_payer_id = name_to_id[new_payer_name]
-                                conn = sqlite3.connect(DB_FILE)
-                                c = conn.cursor()
-                                # Update expense
-                                c.execute("""
-                                    UPDATE expenses 
-                                    SET description = ?, amount = ?, payer_id = ?, date = ?
-                                    WHERE id = ?
-                                """, (new_desc, new_amount, new_payer_id, new_date.isoformat(), expense_id))
-                                # Delete old splits
-                                c.execute("DELETE FROM splits WHERE expense_id = ?", (expense_id,))
-                                # Recreate splits (equal among current members)
-                                num_members = len(members)
-                                if num_members > 1:
-                                    share = round(new_amount / num_members, 2)
-                                    for _, member in members.iterrows():
-                                        if member["id"] != new_payer_id:
-                                            c.execute("INSERT INTO splits (expense_id, user_id, owed) VALUES (?, ?, ?)",
-                                                      (expense_id, member["id"], share))
-                                conn.commit()
-                                conn.close()
-                                st.success("Expense updated!")
-                                st.rerun()
-
-                with col_delete:
-                    st.write("")  # spacing
-                    if st.button("🗑️ Delete", key=f"delete_btn_{expense_id}", type="primary"):
-                        st.warning("Are you sure you want to delete this expense?")
-                        if st.button("Yes, delete permanently", key=f"confirm_delete_{expense_id}"):
-                            conn = sqlite3.connect(DB_FILE)
-                            c = conn.cursor()
-                            c.execute("DELETE FROM splits WHERE expense_id = ?", (expense_id,))
-                            c.execute("DELETE FROM expenses WHERE id = ?", (expense_id,))
-                            conn.commit()
-                            conn.close()
-                            st.success("Expense deleted")
+    # Only the payer can act, and only the expense picked here gets an edit form
+    yours = page_df[paid_by_you]
+    if not yours.empty:
+        st.markdown("---")
+        st.subheader("✏️ Actions (Edit / Delete)")
+        labels = dict(zip(yours['id'], yours['description'] + " – $" + (yours['amount_cents'] / 100).map("{:.2f}".format)
+                          + " (Paid by you on " + yours['date'] + ")"))
+        expense_id = st.selectbox("Expense to edit", options=list(labels), index=None,
+                                  format_func=labels.get, placeholder="Pick one of your expenses on this page")
+        if expense_id is not None:
+            exp = yours[yours['id'] == expense_id].iloc[0]
+            col_edit, col_delete = st.columns([3, 1])
+
+            with col_edit:
+                with st.form(key=f"edit_form_{expense_id}"):
+                    col1, col2 = st.columns([2, 1])
+                    with col1:
+                        new_desc = st.text_input("Description", value=exp['description'])
+                    with col2:
+                        new_amount = st.number_input("Amount ($)", min_value=0.01, step=0.01,
+                                          value=exp['amount_cents'] / 100, format="%.2f")
+                    col3, col4 = st.columns(2)
+                    with col3:
+                        new_payer_name = st.selectbox("Who paid?", options=member_names,
+                                                      index=member_names.index(id_to_name[exp['payer_id']]))
+                    with col4:
+                        new_date = st.date_input("Date", value=date.fromisoformat(exp['date']))
+
+                    if st.form_submit_button("💾 Save Changes", use_container_width=True):
+                        if not new_desc.strip():
+                            st.error("Description required")
+                        elif new_amount <= 0:
+                            st.error("Amount must be positive")
+                        else:
+                            new_payer_id = name_to_id[new_payer_name]
+                            # Splits are recreated equally among current members
+                            update_expense(group_id, int(expense_id), new_desc, to_cents(new_amount), new_payer_id, new_date.isoformat())
+                            st.success("Expense updated!")
                             st.rerun()
 
+            with col_delete:
+                st.write("")  # spacing
+                confirm = st.checkbox("Confirm delete", key=f"confirm_delete_{expense_id}")
+                if st.button("🗑️ Delete", key=f"delete_btn_{expense_id}", type="primary", disabled=not confirm):
+                    delete_expense(group_id, int(expense_id))
+                    st.success("Expense deleted")
+                    st.rerun()
+
 # Overall fair balance summary
-if not expenses_df.empty:
-    total_spent = expenses_clean['amount'].sum()
-    current_num_members = len(members)
-    fair_share = total_spent / current_num_members
-    user_paid = expenses_clean[expenses_clean['payer_id'] == st.session_state.user_id]['amount'].sum()
-    your_balance = round(user_paid - fair_share, 2)
+if not page_df.empty:
+    balances = get_group_balances(group_id)
+    your_balance = balances.loc[balances['id'] == st.session_state.user_id, 'balance_cents'].sum() / 100
 
     if your_balance > 0:
         st.success(f"Overall: You are owed ${your_balance:.2f} in this group")
@@ -214,3 +240,5 @@ if not expenses_df.empty:
     else:
         st.success("🎉 All settled — perfect equal sharing! You owe nothing.")
         
+
+debug_panel()
@@ -1,10 +1,12 @@
 import streamlit as st
 import pandas as pd
-from database import get_user_groups, get_group_expenses, get_group_members
+from database import get_user_groups, get_group_balances, get_group_paid_totals, get_group_owed_totals
+from instrument import start_page, debug_panel
 
 if "user_id" not in st.session_state:
     st.switch_page("login.py")
 
+start_page("Balances")
 st.title("⚖️ Group Balances")
 
 groups = get_user_groups(st.session_state.user_id)
@@ -14,49 +16,29 @@ if groups.empty:
     st.stop()
 
 group_name = st.selectbox("Select Group", groups["name"])
-group_id = groups[groups["name"] == group_name]["id"].iloc[0]
+group_id = int(groups[groups["name"] == group_name]["id"].iloc[0])
 
-# Get all expenses in the group
-expenses_df = get_group_expenses(group_id)
+# Settlements count towards the ledger too, so ask the expenses whether there are any
+paid_totals = get_group_paid_totals(group_id)
 
-if expenses_df.empty:
+if paid_totals.empty:
     st.info("No expenses in this group yet — add some on the Add Expense page!")
     st.stop()
 
-# Get unique expenses (groupby to avoid duplicates from splits)
-unique_expenses = expenses_df.groupby('id').agg({
-    'amount': 'first',
-    'payer_id': 'first'
-}).reset_index()
-
-# Total spent
-total_spent = unique_expenses['amount'].sum()
-
-# Current number of members
-members = get_group_members(group_id)
-num_members = len(members)
-
-fair_share = total_spent / num_members if num_members > 0 else 0
-
-# How much each person paid (using unique)
-paid_by = unique_expenses.groupby('payer_id')['amount'].sum().to_dict()
-
-# Build balances for all members
-balance_data = []
-for _, member in members.iterrows():
-    user_id = member['id']
-    name = member['name']
-    paid = paid_by.get(user_id, 0.0)
-    net = paid - fair_share
-    rounded_net = round(net, 2)
-    balance_data.append({
-        "Member": name,
-        "Paid": f"${round(paid, 2):.2f}",
-        "Fair Share": f"${round(fair_share, 2):.2f}",
-        "Net Balance": rounded_net
-    })
-
-balances_df = pd.DataFrame(balance_data)
+# Per-member totals straight from the balance ledger (one row per member)
+ledger = get_group_balances(group_id)
+num_members = len(ledger)
+
+# The ledger's paid/share totals include settlements; Paid and Fair Share are expenses only
+paid = ledger["id"].map(paid_totals.set_index("user_id")["paid_cents"]).fillna(0)
+share = ledger["id"].map(get_group_owed_totals(group_id).set_index("user_id")["owed_cents"]).fillna(0)
+
+balances_df = pd.DataFrame({
+    "Member": ledger["name"],
+    "Paid": (paid / 100).map("${:.2f}".format),
+    "Fair Share": (share / 100).map("${:.2f}".format),
+    "Net Balance": ledger["balance_cents"] / 100,
+})
 
 # Display styled table
 st.subheader(f"Balances in **{group_name}** (Equal Sharing Among All {num_members} Members)")
@@ -84,4 +66,6 @@ if not your_row.empty:
     else:
         st.success("You're all settled in this group!")
 
-st.caption("All balances are calculated with true equal sharing — everyone contributes the same total amount, regardless of when they joined.")
\ No newline at end of file
+st.caption("All balances are calculated with true equal sharing — everyone contributes the same total amount, regardless of when they joined.")
+
+debug_panel()
@@ -1,12 +1,15 @@
 import streamlit as st
-import sqlite3
 from datetime import date
 import pandas as pd
-from database import DB_FILE, get_user_groups, get_group_members, get_group_expenses
+from splitting import to_cents
+from database import (get_user_groups, get_group_balances, get_group_settlements, get_settled_between,
+                      get_settlement_plan, record_settlements)
+from instrument import start_page, debug_panel
 
 if "user_id" not in st.session_state:
     st.switch_page("login.py")
 
+start_page("Settle Up")
 st.title("💰 Settle Up")
 
 st.write("See who needs to pay whom to make everything even — based on true equal sharing among all current members.")
@@ -18,40 +21,22 @@ if groups.empty:
     st.stop()
 
 group_name = st.selectbox("Select Group", groups["name"])
-group_id = groups[groups["name"] == group_name]["id"].iloc[0]
+group_id = int(groups[groups["name"] == group_name]["id"].iloc[0])
 
-# Get members and expenses
-members = get_group_members(group_id)
-if members.empty:
+# Net for each member comes from the balance ledger
+ledger = get_group_balances(group_id)
+if ledger.empty:
     st.error("No members in group.")
     st.stop()
 
-expenses_df = get_group_expenses(group_id)
-if expenses_df.empty:
+if ledger["paid_cents"].sum() == 0:
     st.info("No expenses yet — nothing to settle!")
     st.stop()
 
-# Unique expenses for accurate totals
-unique_expenses = expenses_df.groupby('id').agg({
-    'amount': 'first',
-    'payer_id': 'first'
-}).reset_index()
-
-total_spent = unique_expenses['amount'].sum()
-num_members = len(members)
-fair_share = total_spent / num_members
-
-# Calculate net for each member
-paid_by = unique_expenses.groupby('payer_id')['amount'].sum().to_dict()
-
-balances = []
-for _, member in members.iterrows():
-    user_id = member['id']
-    name = member['name']
-    paid = paid_by.get(user_id, 0.0)
-    net = paid - fair_share
-    rounded_net = round(net, 2)
-    balances.append({"name": name, "net": rounded_net})
+# Nets are integer cents, so they add up to exactly zero and compare exactly
+balances = [{"name": name, "net": int(net)} for name, net in zip(ledger["name"], ledger["balance_cents"])]
+nets = dict(zip(ledger["id"], ledger["balance_cents"].astype(int)))
+id_to_name = dict(zip(ledger["id"], ledger["name"]))
 
 # Separate debtors (owe) and creditors (owed)
 debtors = [b for b in balances if b["net"] < 0]
@@ -73,13 +58,13 @@ else:
     if debtors:
         st.write("🔴 **Owes:**")
         for d in debtors:
-            st.error(f"**{d['name']}** owes ${abs(d['net']):.2f}")
+            st.error(f"**{d['name']}** owes ${abs(d['net']) / 100:.2f}")
 
     # Show who is owed (creditors)
     if creditors:
         st.write("🟢 **Owed:**")
         for c in creditors:
-            st.success(f"**{c['name']}** is owed ${c['net']:.2f}")
+            st.success(f"**{c['name']}** is owed ${c['net'] / 100:.2f}")
 
 # Suggested Settlements (Minimize transfers)
 st.markdown("---")
@@ -88,28 +73,65 @@ st.subheader("💡 Suggested Settlements")
 if not debtors or not creditors:
     st.info("No settlements needed — all even!")
 else:
-    # Simple one-to-one suggestion (can be expanded later)
     st.write("To make everything even:")
 
-    # Sort for consistent suggestion
-    debtors.sort(key=lambda x: x["net"])
-    creditors.sort(key=lambda x: x["net"], reverse=True)
-
-    i = 0  # debtor index
-    j = 0  # creditor index
-    while i < len(debtors) and j < len(creditors):
-        debtor = debtors[i]
-        creditor = creditors[j]
-        amount = min(abs(debtor["net"]), creditor["net"])
+    # Fewest possible transfers for normal-sized groups, a fast approximation for huge ones;
+    # cached until the group next changes
+    plan = list(get_settlement_plan(group_id).itertuples(index=False))
+    for transfer in plan:
+        st.warning(f"→ **{id_to_name[transfer.payer]}** pays **{id_to_name[transfer.receiver]}** ${transfer.cents / 100:.2f}")
 
-        st.warning(f"→ **{debtor['name']}** pays **{creditor['name']}** ${amount:.2f}")
-
-        # Update remaining
-        debtors[i]["net"] += amount
-        creditors[j]["net"] -= amount
-
-        if abs(debtors[i]["net"]) < 0.01:
-            i += 1
-        if abs(creditors[j]["net"]) < 0.01:
-            j += 1
+    # All of the plan in one transaction, so the group is never left half-settled
+    if st.button("✅ Record all suggested payments", use_container_width=True):
+        record_settlements([(group_id, t.payer, t.receiver, t.cents) for t in plan], date.today().isoformat())
+        st.success("All payments recorded — everyone is even!")
+        st.rerun()
 
+# RECORD A PAYMENT
+st.markdown("---")
+st.subheader("💸 Record a Payment")
+
+member_ids = ledger["id"].tolist()
+you = st.session_state.user_id
+col1, col2 = st.columns(2)
+with col1:
+    payer_id = st.selectbox("Who paid?", options=member_ids, format_func=id_to_name.get,
+                            index=member_ids.index(you) if you in member_ids else 0, key="payment_payer")
+with col2:
+    # Default to whoever is owed the most
+    receivers = [int(m) for m in ledger.sort_values("balance_cents", ascending=False)["id"] if m != payer_id]
+    receiver_id = st.selectbox("Paid to", options=receivers, format_func=id_to_name.get, key="payment_receiver")
+
+if receiver_id is not None:
+    owed = min(-nets[payer_id], nets[receiver_id])
+    col3, col4 = st.columns(2)
+    with col3:
+        amount = st.number_input("Amount ($)", min_value=0.01, step=0.01, format="%.2f",
+                                 value=max(owed, 1) / 100, key=f"payment_amount_{payer_id}_{receiver_id}")
+    with col4:
+        payment_date = st.date_input("Date", value=date.today(), key="payment_date")
+
+    already = get_settled_between(group_id, payer_id, receiver_id).iloc[0]
+    if already["payments"]:
+        st.caption(f"{id_to_name[payer_id]} has paid {id_to_name[receiver_id]} ${already['amount_cents'] / 100:.2f} "
+                   f"over {already['payments']} payment(s) in this group so far.")
+
+    if st.button("💸 Record Payment", type="primary", use_container_width=True):
+        record_settlements([(group_id, payer_id, receiver_id, to_cents(amount))], payment_date.isoformat())
+        st.success(f"Recorded: {id_to_name[payer_id]} paid {id_to_name[receiver_id]} ${amount:.2f}")
+        st.rerun()
+
+# PAYMENT HISTORY
+payments = get_group_settlements(group_id)
+if not payments.empty:
+    st.markdown("---")
+    st.subheader("🧾 Recent Payments")
+    recent = payments.head(20)
+    st.dataframe(pd.DataFrame({
+        "Date": recent["date"],
+        "From": recent["payer_id"].map(id_to_name),
+        "To": recent["receiver_id"].map(id_to_name),
+        "Amount": (recent["amount_cents"] / 100).map("${:.2f}".format),
+    }), use_container_width=True, hide_index=True)
+
+debug_panel()
@@ -0,0 +1,73 @@
+import streamlit as st
+import pandas as pd
+from datetime import date
+from analytics import monthly_totals, resample_spending, top_spenders
+from database import get_user_groups, get_group_members, get_monthly_spending, get_expenses_between
+from instrument import start_page, debug_panel
+
+if "user_id" not in st.session_state:
+    st.switch_page("login.py")
+
+start_page("Analytics")
+st.title("📈 Spending Analytics")
+
+groups = get_user_groups(st.session_state.user_id)
+
+if groups.empty:
+    st.info("You haven't joined any groups yet.")
+    st.stop()
+
+group_name = st.selectbox("Select Group", groups["name"])
+group_id = int(groups[groups["name"] == group_name]["id"].iloc[0])
+
+# Everything down to the custom range reads the monthly rollups (one row per member per month)
+rollups = get_monthly_spending(group_id)
+
+if rollups.empty:
+    st.info("No expenses in this group yet — add some on the Add Expense page!")
+    st.stop()
+
+monthly = monthly_totals(rollups)
+totals = monthly.sum(axis=1)
+months = list(monthly.index)
+
+col1, col2, col3 = st.columns(3)
+col1.metric(f"Spent in {months[-1]}", f"${totals.iloc[-1]:,.2f}",
+            delta=f"{totals.iloc[-1] - totals.iloc[-2]:+,.2f}" if len(totals) > 1 else None,
+            delta_color="inverse")
+col2.metric("Monthly average", f"${totals.mean():,.2f}")
+col3.metric("All time", f"${totals.sum():,.2f}")
+
+st.subheader("Monthly spending")
+st.bar_chart(monthly)
+
+st.subheader("Top spenders")
+since = st.selectbox("Since", months, index=max(0, len(months) - 12))
+top = top_spenders(rollups, since)
+st.dataframe(pd.DataFrame({
+    "Member": top["name"],
+    "Paid": (top["total_cents"] / 100).map("${:,.2f}".format),
+    "Expenses": top["count"],
+    "Share of Spending": top["share"].map("{:.0%}".format),
+}), use_container_width=True, hide_index=True)
+
+# Finer-grained or arbitrary ranges have no rollup: resample the raw expenses of the range
+with st.expander("🔍 Custom range"):
+    default_start = date.fromisoformat(months[max(0, len(months) - 3)] + "-01")
+    default_end = pd.Period(months[-1], freq="M").end_time.date()
+    selected = st.date_input("Dates", value=(default_start, default_end))
+    granularity = st.radio("Granularity", ["Daily", "Weekly", "Monthly"], index=1, horizontal=True)
+    if len(selected) == 2:
+        expenses = get_expenses_between(group_id, selected[0].isoformat(), selected[1].isoformat())
+        if expenses.empty:
+            st.info("No expenses in this range.")
+        else:
+            freq = {"Daily": "D", "Weekly": "W", "Monthly": "MS"}[granularity]
+            members = get_group_members(group_id)
+            table = resample_spending(expenses, freq, by_payer=True)
+            table = table.rename(columns=dict(zip(members["id"], members["name"])))
+            table.index = table.index.strftime("%Y-%m-%d")
+            st.bar_chart(table)
+            st.caption(f"{len(expenses)} expenses, ${expenses['amount_cents'].sum() / 100:,.2f} in total")
+
+debug_panel()
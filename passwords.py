@@ -0,0 +1,146 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# Password hashing. Stored hashes are self-describing strings, so cost settings can be
+# raised at any time: a login that verifies against older parameters (or a legacy
+# plaintext row) gets its hash upgraded.
+#
+#   scrypt$<n>$<r>$<p>$<salt>$<hash>
+#   pbkdf2_sha256$<iterations>$<salt>$<hash>
+#
+# A KDF deliberately burns tens of ms of CPU, so hashing runs on a small bounded pool of
+# worker threads (hashlib releases the GIL while it works) and callers wait on a Future
+# instead of holding up every other session in the process. When more than MAX_PENDING
+# hashes are queued, new ones are refused with Busy rather than piling up.
+
+HashParams = namedtuple("HashParams", ["scheme", "cost", "r", "p"], defaults=(8, 1))
+
+COST_SETTINGS = {
+    "fast": HashParams("scrypt", 2 ** 12),
+    "default": HashParams("scrypt", 2 ** 14),
+    "strong": HashParams("scrypt", 2 ** 15),
+    "pbkdf2": HashParams("pbkdf2_sha256", 600_000),
+}
+PARAMS = COST_SETTINGS["default"]
+
+WORKERS = min(4, os.cpu_count() or 1)
+MAX_PENDING = 32  # queued + running hashes before new requests are refused
+
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+
+class Busy(Exception):
+    """Too many password hashes are already queued."""
+
+
+def _b64(data):
+    return base64.b64encode(data).decode()
+
+
+def _derive(password, salt, params):
+    if params.scheme == "scrypt":
+        return hashlib.scrypt(password.encode(), salt=salt, n=params.cost, r=params.r, p=params.p,
+                              maxmem=256 * params.cost * params.r, dklen=KEY_BYTES)
+    if params.scheme == "pbkdf2_sha256":
+        return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, params.cost, dklen=KEY_BYTES)
+    raise ValueError(f"unknown password scheme {params.scheme!r}")
+
+
+def _parse(stored):
+    """(params, salt, key) of a stored hash, or None for a legacy plaintext password."""
+    parts = stored.split("$")
+    try:
+        if parts[0] == "scrypt" and len(parts) == 6:
+            params = HashParams("scrypt", int(parts[1]), int(parts[2]), int(parts[3]))
+        elif parts[0] == "pbkdf2_sha256" and len(parts) == 4:
+            params = HashParams("pbkdf2_sha256", int(parts[1]))
+        else:
+            return None
+        return params, base64.b64decode(parts[-2], validate=True), base64.b64decode(parts[-1], validate=True)
+    except (ValueError, binascii.Error):
+        return None  # a plaintext password that merely looks like a hash
+
+
+def hash_password(password, params=None):
+    params = params or PARAMS
+    salt = secrets.token_bytes(SALT_BYTES)
+    key = _derive(password, salt, params)
+    if params.scheme == "scrypt":
+        return f"scrypt${params.cost}${params.r}${params.p}${_b64(salt)}${_b64(key)}"
+    return f"pbkdf2_sha256${params.cost}${_b64(salt)}${_b64(key)}"
+
+
+def verify_password(password, stored):
+    """(matches, needs_rehash). Legacy plaintext rows always need a rehash."""
+    parsed = _parse(stored)
+    if parsed is None:
+        return hmac.compare_digest(password.encode(), stored.encode()), True
+    params, salt, key = parsed
+    matches = hmac.compare_digest(_derive(password, salt, params), key)
+    return matches, params != PARAMS
+
+
+# A real hash to verify against when the username does not exist, so that a miss takes as
+# long as a wrong password and does not reveal which usernames are registered.
+_DUMMY_HASH = None
+
+
+def dummy_verify(password):
+    global _DUMMY_HASH
+    if _DUMMY_HASH is None:
+        _DUMMY_HASH = hash_password(secrets.token_hex(8))
+    verify_password(password, _DUMMY_HASH)
+    return False, False
+
+
+# --- Worker pool ---
+
+_executor = None
+_slots = threading.BoundedSemaphore(MAX_PENDING)
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="kdf")
+    return _executor
+
+
+def submit(fn, *args):
+    """Run a hashing function on the pool; raises Busy when MAX_PENDING are already queued."""
+    if not _slots.acquire(blocking=False):
+        raise Busy(f"more than {MAX_PENDING} password hashes queued")
+    try:
+        future = _get_executor().submit(fn, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future
+
+
+def configure(params=None, workers=None, max_pending=None):
+    """Change cost settings or pool size (used by benchmarks); waits for running hashes."""
+    global PARAMS, WORKERS, MAX_PENDING, _executor, _slots
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+        if params is not None:
+            PARAMS = COST_SETTINGS.get(params, params)
+        if workers is not None:
+            WORKERS = workers
+        if max_pending is not None:
+            MAX_PENDING = max_pending
+            _slots = threading.BoundedSemaphore(MAX_PENDING)
@@ -0,0 +1,241 @@
+"""Split a database's groups across N shard files, or gather them back into a single file.
+
+    python reshard.py --shards 8 --db users.db
+    python reshard.py --shards 16 --db users.db    # from 8 shards to 16
+    python reshard.py --shards 0 --db users.db     # back to one file
+
+Stop the app first: writes made while this runs are not copied.
+"""
+import argparse
+import os
+import time
+
+import backup
+from connection import DB_FILE, connect, shard_index
+from migrations import migrate
+
+# A group's rows (the group itself, its members, expenses, splits, settlements, ledger,
+# events, snapshots and monthly rollups) are copied with INSERT ... SELECT from the file that
+# holds them, ATTACHed to the new one, ids included. Triggers are dropped for the copy and put
+# back in the same transaction, so the ledger and event log are copied as they are rather than
+# replayed; the search index is rebuilt once a file is complete. Each shard also gets the
+# (id, username, name) of every user its rows refer to.
+#
+# Expense, settlement and event ids must stay unique across shards, or groups could not be
+# moved again. Each new shard's AUTOINCREMENT therefore starts a range of ID_STRIDE ids of its
+# own, above the highest id in any current file; a group's ids keep increasing.
+#
+# New shard files have names of their own (users.shard03-of-08.db) and are only used once the
+# main file's `shards` table lists them, which happens in one transaction with the removal of
+# the copies the main file no longer serves. Until then the old layout is untouched, and an
+# interrupted run can simply be started again. Old shard files are left on disk.
+
+GROUP_TABLES = {  # table: rows of the groups in temp.moving, parents before children
+    "groups": "id IN (SELECT id FROM moving)",
+    "group_members": "group_id IN (SELECT id FROM moving)",
+    "expenses": "group_id IN (SELECT id FROM moving)",
+    "splits": "expense_id IN (SELECT id FROM src.expenses WHERE group_id IN (SELECT id FROM moving))",
+    "settlements": "group_id IN (SELECT id FROM moving)",
+    "member_balances": "group_id IN (SELECT id FROM moving)",
+    "monthly_spending": "group_id IN (SELECT id FROM moving)",
+    "events": "group_id IN (SELECT id FROM moving)",
+    "balance_snapshots": "group_id IN (SELECT id FROM moving)",
+}
+DIRECTORY_TABLES = {"groups", "group_members"}  # kept in the main file in every layout
+ID_TABLES = ["expenses", "settlements", "events"]  # AUTOINCREMENT ids, assigned in the shards
+ID_STRIDE = 1 << 32
+
+_REFERENCED_USERS = """
+    SELECT user_id FROM src.group_members WHERE group_id IN (SELECT id FROM moving)
+    UNION SELECT payer_id FROM src.expenses WHERE group_id IN (SELECT id FROM moving)
+    UNION SELECT user_id FROM src.splits
+          WHERE expense_id IN (SELECT id FROM src.expenses WHERE group_id IN (SELECT id FROM moving))
+    UNION SELECT payer_id FROM src.settlements WHERE group_id IN (SELECT id FROM moving)
+    UNION SELECT receiver_id FROM src.settlements WHERE group_id IN (SELECT id FROM moving)
+"""
+
+
+def shard_file(path, index, count):
+    stem, ext = os.path.splitext(os.path.basename(path))
+    return f"{stem}.shard{index:02d}-of-{count:02d}{ext or '.db'}"
+
+
+def _without_triggers(conn, work):
+    # Runs work() in one write transaction with every trigger dropped and recreated
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        triggers = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'").fetchall()
+        for name, _ in triggers:
+            conn.execute(f"DROP TRIGGER {name}")
+        work()
+        for _, sql in triggers:
+            conn.execute(sql)
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _copy(conn, source, index, count, into_main):
+    """Copy the groups of `source` that belong in shard `index` of `count` (every group when `into_main`)."""
+    conn.execute("ATTACH DATABASE ? AS src", (source,))
+    try:
+        def work():
+            where = "" if into_main else "WHERE shard_of(id) = ?"
+            conn.execute(f"CREATE TEMP TABLE moving AS SELECT id FROM src.groups {where}",
+                         () if into_main else (index,))
+            if into_main:
+                # The directory is already here; bring the groups' version counters along
+                conn.execute("""UPDATE groups SET version = (SELECT version FROM src.groups s WHERE s.id = groups.id)
+                                WHERE id IN (SELECT id FROM moving)""")
+            else:
+                conn.execute(f"INSERT OR IGNORE INTO users (id, username, name) "
+                             f"SELECT id, username, name FROM src.users WHERE id IN ({_REFERENCED_USERS})")
+            for table, rows in GROUP_TABLES.items():
+                if not (into_main and table in DIRECTORY_TABLES):
+                    conn.execute(f"INSERT INTO {table} SELECT * FROM src.{table} WHERE {rows}")
+            conn.execute("DROP TABLE temp.moving")
+
+        conn.create_function("shard_of", 1, lambda group_id: shard_index(group_id, count), deterministic=True)
+        _without_triggers(conn, work)
+    finally:
+        conn.execute("DETACH DATABASE src")
+
+
+def _clear(conn, keep_directory=True):
+    # Drop the group rows a file no longer serves; triggers are dropped by the caller
+    for table in reversed(list(GROUP_TABLES)):
+        if not (keep_directory and table in DIRECTORY_TABLES):
+            conn.execute(f"DELETE FROM {table}")
+    conn.execute("INSERT INTO expenses_fts (expenses_fts) VALUES ('rebuild')")
+
+
+def _next_ids(paths):
+    # First id above every id (and sequence) of each ID_TABLES table in `paths`
+    base = dict.fromkeys(ID_TABLES, 1)
+    for path in paths:
+        conn = connect(path)
+        try:
+            for table in ID_TABLES:
+                used = conn.execute(f"""SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = '{table}'), 0),
+                                                   COALESCE((SELECT MAX(id) FROM {table}), 0))""").fetchone()[0]
+                base[table] = max(base[table], used + 1)
+        finally:
+            conn.close()
+    return base
+
+
+def _counts(paths, tables):
+    totals = dict.fromkeys(tables, 0)
+    for path in paths:
+        conn = connect(path)
+        try:
+            for table in tables:
+                totals[table] += conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        finally:
+            conn.close()
+    return totals
+
+
+def reshard(path=DB_FILE, count=0, backup_dir=None):
+    """Move the groups of the database at `path` into `count` new shard files (0: into `path` itself).
+
+    Returns {"shards": new shard paths, "old": shard files no longer used, "rows": {table: (before, after)}}.
+    With `backup_dir`, the main file and its current shards are snapshotted there first.
+    """
+    path = os.path.abspath(path)
+    directory = os.path.dirname(path)
+    main = connect(path)
+    try:
+        migrate(main)
+        old = [os.path.join(directory, name) for (name,) in main.execute("SELECT path FROM shards ORDER BY shard")]
+    finally:
+        main.close()
+    new = [os.path.join(directory, shard_file(path, index, count)) for index in range(count)]
+    if not old and not new:
+        raise ValueError(f"{path} is not sharded")
+    if old == new:
+        raise ValueError(f"{path} is already split into {count} shards")
+    if backup_dir:
+        for source in [path, *old]:
+            backup.take(backup_dir, source)
+    sources = old or [path]
+    before = _counts(sources, GROUP_TABLES)
+    next_ids = _next_ids([path, *old])
+
+    for index, target in enumerate(new):
+        for leftover in (target, target + "-wal", target + "-shm"):  # from an interrupted run
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        conn = connect(target)
+        try:
+            migrate(conn)
+            for source in sources:
+                _copy(conn, source, index, count, into_main=False)
+            conn.execute("INSERT INTO expenses_fts (expenses_fts) VALUES ('rebuild')")
+            conn.execute("BEGIN")
+            for table, first in next_ids.items():
+                conn.execute("DELETE FROM sqlite_sequence WHERE name = ?", (table,))
+                conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)",
+                             (table, first - 1 + index * ID_STRIDE))
+            conn.execute("COMMIT")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        finally:
+            conn.close()
+
+    main = connect(path)
+    try:
+        if not new:
+            _without_triggers(main, lambda: _clear(main))  # rows left over from the sharded layout
+            for source in old:
+                _copy(main, source, 0, 0, into_main=True)
+
+        def switch():
+            if not old:
+                _clear(main)
+            else:
+                main.execute("INSERT INTO expenses_fts (expenses_fts) VALUES ('rebuild')")
+            if not new:
+                # The rows gathered back keep the shards' ids; new ids must start above all of them
+                for table, first in next_ids.items():
+                    main.execute("DELETE FROM sqlite_sequence WHERE name = ?", (table,))
+                    main.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table, first - 1))
+            main.execute("DELETE FROM shards")
+            main.executemany("INSERT INTO shards (shard, path) VALUES (?, ?)",
+                             [(index, os.path.basename(target)) for index, target in enumerate(new)])
+        _without_triggers(main, switch)
+    finally:
+        main.close()
+
+    after = _counts(new or [path], GROUP_TABLES)
+    return {"shards": new, "old": old, "rows": {table: (before[table], after[table]) for table in GROUP_TABLES}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shards", type=int, required=True, help="number of shard files, 0 for a single file")
+    parser.add_argument("--db", default=DB_FILE, help="main database file (default: connection.DB_FILE)")
+    parser.add_argument("--backup-dir", default=backup.BACKUP_DIR or "backups",
+                        help="snapshot the current files here first")
+    parser.add_argument("--no-backup", action="store_true")
+    args = parser.parse_args()
+    if args.shards < 0:
+        parser.error("--shards must be 0 or more")
+
+    start = time.perf_counter()
+    try:
+        result = reshard(args.db, args.shards, None if args.no_backup else args.backup_dir)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    for table, (before, after) in result["rows"].items():
+        print(f"{table:<18} {before:>12,} -> {after:>12,}{'' if before == after else '  MISMATCH'}")
+    layout = f"{len(result['shards'])} shards" if result["shards"] else "a single file"
+    print(f"{args.db} now uses {layout} ({time.perf_counter() - start:.1f}s)")
+    if result["old"]:
+        print("no longer used, delete when satisfied: " + " ".join(result["old"]))
+    if any(before != after for before, after in result["rows"].values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
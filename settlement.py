@@ -0,0 +1,217 @@
+import time
+from collections import defaultdict, namedtuple
+
+import numpy as np
+
+from instrument import traced
+
+# Turning a group's net balances (integer cents, positive = is owed) into a list of payments.
+#
+# Any set of n non-zero balances can be settled with n - 1 transfers. Fewer are possible
+# only when the members split into k subsets that each sum to zero: each subset settles
+# internally with (size - 1) transfers, for n - k in total. So minimising transfers means
+# maximising the number of disjoint zero-sum subsets, which is NP-hard in general.
+
+Transfer = namedtuple("Transfer", ["payer", "receiver", "cents"])
+GroupTransfer = namedtuple("GroupTransfer", ["group_id", "payer", "receiver", "cents"])
+Payment = namedtuple("Payment", ["payer", "receiver", "cents", "allocations"])
+
+EXACT_LIMIT = 20  # largest number of non-zero balances the exact solver will take on
+AUTO_EXACT_LIMIT = 15  # "auto" stays exact up to here (~10 ms); at 20 the DP takes ~250 ms
+
+
+def _nonzero(balances):
+    items = [(member, int(cents)) for member, cents in balances.items() if cents]
+    if sum(cents for _, cents in items) != 0:
+        raise ValueError("balances must sum to zero")
+    return items
+
+
+def greedy(balances):
+    """Match the largest debtor with the largest creditor until everyone is even.
+
+    Never more than n - 1 transfers, but it does not look for zero-sum subsets.
+    """
+    items = _nonzero(balances)
+    debtors = sorted(([m, -c] for m, c in items if c < 0), key=lambda d: -d[1])
+    creditors = sorted(([m, c] for m, c in items if c > 0), key=lambda c: -c[1])
+    transfers = []
+    i = j = 0
+    while i < len(debtors) and j < len(creditors):
+        amount = min(debtors[i][1], creditors[j][1])
+        transfers.append(Transfer(debtors[i][0], creditors[j][0], amount))
+        debtors[i][1] -= amount
+        creditors[j][1] -= amount
+        if debtors[i][1] == 0:
+            i += 1
+        if creditors[j][1] == 0:
+            j += 1
+    return transfers
+
+
+def _subset_sums(values):
+    sums = np.zeros(1 << len(values), dtype=np.int64)
+    for i, value in enumerate(values):
+        sums[1 << i:1 << (i + 1)] = sums[:1 << i] + value
+    return sums
+
+
+def exact(balances):
+    """Minimum number of transfers, by bitmask DP over subsets of the non-zero balances.
+
+    dp[mask] is the largest number of disjoint zero-sum subsets that `mask` can be carved
+    into, filled a popcount layer at a time with NumPy. Cost is O(2^n * n) for n non-zero
+    balances, so it is limited to EXACT_LIMIT of them.
+    """
+    items = _nonzero(balances)
+    n = len(items)
+    if n > EXACT_LIMIT:
+        raise ValueError(f"exact solver supports at most {EXACT_LIMIT} non-zero balances, got {n}")
+    if n == 0:
+        return []
+
+    sums = _subset_sums([c for _, c in items])
+    masks = np.arange(1 << n, dtype=np.int64)
+    popcount = np.zeros(1 << n, dtype=np.int8)
+    for i in range(n):
+        popcount += (masks >> i) & 1
+    zero = (sums == 0).astype(np.int8)
+    dp = np.zeros(1 << n, dtype=np.int8)
+    for layer in range(1, n + 1):
+        layer_masks = masks[popcount == layer]
+        best = np.zeros(len(layer_masks), dtype=np.int8)
+        for i in range(n):
+            has_bit = (layer_masks >> i) & 1 == 1
+            candidate = dp[layer_masks[has_bit] ^ (1 << i)]
+            best[has_bit] = np.maximum(best[has_bit], candidate)
+        dp[layer_masks] = best + zero[layer_masks]
+
+    # Walk back down from the full set; every zero-sum mask on the way closes a subset.
+    groups, current = [], []
+    mask = (1 << n) - 1
+    while mask:
+        for i in range(n):
+            bit = 1 << i
+            if mask & bit and dp[mask ^ bit] + zero[mask] == dp[mask]:
+                break
+        if zero[mask] and current:
+            groups.append(current)
+            current = []
+        current.append(i)
+        mask ^= bit
+    groups.append(current)
+
+    transfers = []
+    for group in groups:
+        transfers.extend(greedy({items[i][0]: items[i][1] for i in group}))
+    return transfers
+
+
+def heuristic(balances, time_limit=0.05):
+    """Bounded-time approximation for large groups.
+
+    Peels off zero-sum pairs (a debt that exactly matches a credit), then zero-sum triples
+    until `time_limit` seconds have passed, and settles whatever is left greedily.
+    """
+    deadline = time.perf_counter() + time_limit
+    remaining = dict(_nonzero(balances))
+    transfers = []
+
+    def settle_subset(members):
+        transfers.extend(greedy({m: remaining.pop(m) for m in members}))
+
+    # Pairs: a debtor owing exactly what some creditor is owed
+    creditors_by_amount = {}
+    for member, cents in remaining.items():
+        if cents > 0:
+            creditors_by_amount.setdefault(cents, []).append(member)
+    for member, cents in list(remaining.items()):
+        if cents < 0 and creditors_by_amount.get(-cents):
+            settle_subset([member, creditors_by_amount[-cents].pop()])
+
+    # Triples: two members of one sign whose sum is matched by one member of the other
+    by_amount = {}
+    for member, cents in remaining.items():
+        by_amount.setdefault(cents, set()).add(member)
+    members = sorted(remaining, key=lambda m: remaining[m])
+    for a_index, a in enumerate(members):
+        if time.perf_counter() > deadline:
+            break
+        if a not in remaining:
+            continue
+        for b in members[a_index + 1:]:
+            if a not in remaining:
+                break
+            if b not in remaining or (remaining[a] > 0) != (remaining[b] > 0):
+                continue
+            target = -(remaining[a] + remaining[b])
+            candidates = by_amount.get(target, set()) - {a, b}
+            if candidates:
+                c = candidates.pop()
+                for member in (a, b, c):
+                    by_amount[remaining[member]].discard(member)
+                settle_subset([a, b, c])
+
+    transfers.extend(greedy(remaining))
+    return transfers
+
+
+STRATEGIES = {
+    "greedy": greedy,
+    "exact": exact,
+    "heuristic": heuristic,
+}
+
+
+@traced("compute")
+def settle(balances, strategy="auto"):
+    """Payments that bring every balance to zero.
+
+    `balances` maps any member key to net integer cents (positive = is owed). "auto" uses
+    the exact solver up to AUTO_EXACT_LIMIT non-zero balances and the heuristic above that.
+    """
+    if strategy == "auto":
+        nonzero = sum(1 for cents in balances.values() if cents)
+        strategy = "exact" if nonzero <= AUTO_EXACT_LIMIT else "heuristic"
+    return STRATEGIES[strategy](balances)
+
+
+def plan_across_groups(user, balances_by_group):
+    """Net one user's debts over all their groups into at most one payment per person.
+
+    `balances_by_group` maps group id -> {member: net cents} for every group `user` is in.
+    In each group the user's balance is matched against opposite-signed members, preferring
+    people the user already owes (or is owed by) in the other direction elsewhere, so that
+    opposite debts cancel. The per-group edges are then netted per counterparty.
+
+    Returns one Payment per counterparty; each carries the GroupTransfers to record in
+    each group's settlements so that every group ends up with the user at zero.
+    """
+    net = defaultdict(int)   # > 0: the counterparty owes the user overall
+    edges = defaultdict(list)
+    groups = sorted(balances_by_group.items(), key=lambda item: -abs(item[1].get(user, 0)))
+    for group_id, balances in groups:
+        mine = int(balances.get(user, 0))
+        if not mine:
+            continue
+        sign = 1 if mine > 0 else -1   # +1: user collects from debtors, -1: user pays creditors
+        others = [(m, -sign * int(c)) for m, c in balances.items() if m != user and -sign * c > 0]
+        # Prefer counterparties whose running net points the other way, then the largest amounts
+        others.sort(key=lambda item: (-(sign * -net.get(item[0], 0) > 0), -abs(net.get(item[0], 0)), -item[1]))
+        remaining = abs(mine)
+        for member, available in others:
+            if not remaining:
+                break
+            cents = min(remaining, available)
+            remaining -= cents
+            net[member] += sign * cents
+            payer, receiver = (member, user) if sign > 0 else (user, member)
+            edges[member].append(GroupTransfer(group_id, payer, receiver, cents))
+
+    # A counterparty can net to zero: nothing changes hands, but the group settlements
+    # still have to be recorded to clear the balances on both sides.
+    payments = []
+    for member, cents in net.items():
+        payer, receiver = (member, user) if cents > 0 else (user, member)
+        payments.append(Payment(payer, receiver, abs(cents), edges[member]))
+    return sorted(payments, key=lambda p: -p.cents)
@@ -0,0 +1,53 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+
+# Money is held as integer cents everywhere below the UI. These helpers turn amounts into
+# per-member shares that always add back up to the exact total.
+
+
+def to_cents(amount):
+    """Dollar amount (float, str or Decimal) to integer cents, rounding half away from zero."""
+    return int((Decimal(str(amount)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def allocate(totals, weights, offsets=0):
+    """Split each of `totals` (cents) in proportion to `weights` by largest remainder.
+
+    totals:  k totals, or a single total.
+    weights: n integer weights shared by every total, or a (k, n) array of per-total weights.
+    offsets: scalar or k values; among shares with equal remainders the leftover pennies
+             go first to position `offset`, then `offset + 1`, ... (mod n). Rotating the
+             offset per expense keeps the same member from always paying the extra cent.
+
+    Returns a (k, n) int64 array whose rows sum exactly to `totals`.
+    """
+    totals = np.atleast_1d(np.asarray(totals, dtype=np.int64))
+    weights = np.asarray(weights, dtype=np.int64)
+    if weights.ndim == 1:
+        weights = np.broadcast_to(weights, (len(totals), len(weights)))
+    k, n = weights.shape
+    if n == 0:
+        raise ValueError("cannot split among zero members")
+
+    scaled = totals[:, None] * weights
+    weight_sums = weights.sum(axis=1, keepdims=True)
+    shares, remainders = np.divmod(scaled, weight_sums)
+    leftover = totals - shares.sum(axis=1)
+
+    rotation = (np.arange(n) - np.asarray(offsets, dtype=np.int64).reshape(-1, 1)) % n
+    rotation = np.broadcast_to(rotation, (k, n))
+    order = np.lexsort((rotation, -remainders), axis=-1)   # biggest remainder first, then rotation
+    rank = np.empty_like(order)
+    np.put_along_axis(rank, order, np.arange(n)[None, :].repeat(k, axis=0), axis=-1)
+    return shares + (rank < leftover[:, None])
+
+
+def split_equally(total_cents, n, offset=0):
+    """Equal split of one total among `n` members, as a list of ints."""
+    return allocate(total_cents, np.ones(n, dtype=np.int64), offset)[0].tolist()
+
+
+def split_equally_many(totals, n, offsets=0):
+    """Equal split of many totals among the same `n` members: a (len(totals), n) int64 array."""
+    return allocate(totals, np.ones(n, dtype=np.int64), offsets)
@@ -0,0 +1,13 @@
+import passwords
+
+
+def test_plaintext_that_looks_like_a_hash_is_legacy():
+    for stored in ("scrypt$a$b$c$d$e", "pbkdf2_sha256$x$salt$key", "pbkdf2_sha256$1000$not*base64$key"):
+        assert passwords.verify_password(stored, stored) == (True, True)
+        assert passwords.verify_password("other", stored) == (False, True)
+
+
+def test_hash_round_trip():
+    stored = passwords.hash_password("secret", passwords.HashParams("pbkdf2_sha256", 1000))
+    assert passwords.verify_password("secret", stored)[0]
+    assert not passwords.verify_password("wrong", stored)[0]
@@ -0,0 +1,33 @@
+import os
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("pandas")
+
+REPO = Path(__file__).resolve().parent.parent
+
+# database.py opens users.db in the working directory and reads SPLITFREE_PROFILE at import,
+# so each scenario runs in a fresh interpreter inside a temporary directory.
+
+def run(tmp_path, script, **env):
+    result = subprocess.run([sys.executable, "-c", textwrap.dedent(script)], cwd=tmp_path,
+                            env={**os.environ, "PYTHONPATH": str(REPO), **env},
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+def test_join_by_code_with_profiling(tmp_path):
+    out = run(tmp_path, """
+        import auth, database
+        assert auth.register("a", "A", "a@example.com", "pw")
+        assert auth.register("b", "B", "b@example.com", "pw")
+        group_id = database.create_group("Trip", 1, invite_code="CODE1234")
+        print(database.join_group_by_code("CODE1234", 2) == (group_id, "Trip", True))
+        print(database.join_group.__wrapped__.__code__.co_varnames[0])
+    """, SPLITFREE_PROFILE="1")
+    assert out.split() == ["True", "conn"]
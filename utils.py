@@ -1,33 +1,31 @@
 import pandas as pd
-from database import get_group_members, get_group_expenses, get_group_settlements
+from database import get_group_balances, get_user_group_balances
+from instrument import traced
+from settlement import plan_across_groups
 
+@traced("compute")
 def calculate_balances(group_id):
-    members = get_group_members(group_id)
-    if members.empty:
+    # Read from the member_balances ledger: O(members), no matter how many expenses the group has
+    balances = get_group_balances(group_id)
+    if balances.empty:
         return pd.DataFrame(columns=["name", "balance"])
 
-    expenses = get_group_expenses(group_id)
-
-    # Total spent in the group (all expenses)
-    total_spent = expenses['amount'].sum()
-
-    # Current number of members
-    num_members = len(members)
-    if num_members == 0:
-        return pd.DataFrame(columns=["name", "balance"])
-
-    # Fair share per person (retroactive)
-    fair_share = total_spent / num_members
-
-    # How much each person actually paid
-    paid_by = expenses.groupby('payer_id')['amount'].sum().to_dict()
-
-    balance_data = []
-    for _, member in members.iterrows():
-        user_id = member['id']
-        name = member['name']
-        paid = paid_by.get(user_id, 0.0)
-        net = paid - fair_share
-        balance_data.append({"name": name, "balance": round(net, 2)})
-
-    return pd.DataFrame(balance_data)
+    # All arithmetic happens on int64 cents; dollars only for display
+    balances["balance"] = balances["balance_cents"] / 100
+    return balances[["name", "balance"]]
+
+@traced("compute")
+def calculate_balances_for_user(user_id):
+    """Long-form balances (group_id, group_name, user_id, member, balance_cents, balance) for all of a user's groups."""
+    balances = get_user_group_balances(user_id)
+    balances["balance"] = balances["balance_cents"] / 100
+    return balances
+
+@traced("compute")
+def cross_group_plan(user_id):
+    """One netted payment per counterparty across all of the user's groups (see settlement.plan_across_groups)."""
+    balances = get_user_group_balances(user_id)
+    by_group = {}
+    for group_id, member, cents in zip(balances["group_id"], balances["user_id"], balances["balance_cents"]):
+        by_group.setdefault(group_id, {})[member] = cents
+    return plan_across_groups(user_id, by_group)
@@ -0,0 +1,141 @@
+import queue
+import threading
+from concurrent.futures import Future
+
+from connection import connect, get_pool
+from instrument import bind
+
+# All writes go through one thread that owns the only write connection. Callers queue a job
+# (a function taking the connection) and get a Future back. The thread takes whatever jobs
+# are waiting, runs them in a single BEGIN IMMEDIATE ... COMMIT and then resolves every
+# Future, so under load many sessions' writes share one commit and nobody contends for the
+# SQLite write lock. Each job runs inside its own savepoint: a failing job is rolled back
+# and gets the exception, the rest of the batch still commits.
+
+MAX_BATCH = 64  # jobs per transaction
+
+
+class Writer:
+    def __init__(self, path, max_batch=MAX_BATCH):
+        self.path = path
+        self.max_batch = max_batch
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._conn = None
+        self._stats = {"jobs": 0, "failed": 0, "batches": 0, "largest_batch": 0}
+        self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue `fn(conn, *args, **kwargs)`; returns a Future resolved after its batch commits."""
+        if threading.current_thread() is self._thread:
+            # A job calling another queued write: run it inline, in the current transaction
+            future = Future()
+            future.set_result(fn(self._conn, *args, **kwargs))
+            return future
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("writer is closed")
+            self._queue.put((future, fn, args, kwargs))
+        return future
+
+    def close(self):
+        """Commit everything already queued, then stop the thread."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+
+    def stats(self):
+        with self._lock:
+            return {"path": self.path, "queued": self._queue.qsize(), **self._stats}
+
+    def _run(self):
+        self._conn = connect(self.path)
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            while batch[-1] is not None and len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                running = False
+                batch.pop()
+            if batch:
+                self._commit(batch)
+        self._conn.close()
+
+    def _commit(self, batch):
+        conn = self._conn
+        jobs = [job for job in batch if job[0].set_running_or_notify_cancel()]
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for future, fn, args, kwargs in jobs:
+                conn.execute("SAVEPOINT job")
+                try:
+                    outcomes.append((fn(conn, *args, **kwargs), None))
+                    conn.execute("RELEASE job")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO job")
+                    conn.execute("RELEASE job")
+                    outcomes.append((None, e))
+            conn.execute("COMMIT")
+        except BaseException as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            outcomes = [(None, e)] * len(jobs)
+
+        with self._lock:
+            self._stats["jobs"] += len(jobs)
+            self._stats["failed"] += sum(1 for _, error in outcomes if error is not None)
+            self._stats["batches"] += 1
+            self._stats["largest_batch"] = max(self._stats["largest_batch"], len(jobs))
+        for (future, *_), (result, error) in zip(jobs, outcomes):
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+_writers = {}  # path: writer, one per database file (the main file and each shard)
+_main = None
+_writer_lock = threading.Lock()
+
+
+def get_writer(path=None):
+    """The writer for `path` (default: the main file); all are restarted when the pool is repointed."""
+    global _main
+    main = get_pool().path
+    path = path or main
+    writer = _writers.get(path)
+    if writer is None or _main != main:
+        with _writer_lock:
+            if _main != main:
+                for old in _writers.values():
+                    old.close()
+                _writers.clear()
+                _main = main
+            writer = _writers.get(path)
+            if writer is None:
+                writer = _writers[path] = Writer(path)
+    return writer
+
+
+def submit(fn, *args, **kwargs):
+    return get_writer().submit(bind(fn), *args, **kwargs)
+
+
+def submit_to(path, fn, *args, **kwargs):
+    """submit() on the writer of the file at `path` (None: the main file)."""
+    return get_writer(path).submit(bind(fn), *args, **kwargs)
+
+
+def writer_stats():
+    return get_writer().stats()